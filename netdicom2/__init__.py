@@ -9,6 +9,8 @@ __version_info__ = __version__.__version__.split('.')
 
 from . import applicationentity
 from . import sopclass
+from . import statuses
+from . import storage
 
 
 _tls = threading.local()
@@ -24,7 +26,8 @@ def _new_msg_id():
         return _tls.msg_id
 
 
-def c_find(remote_ae, local_aet, ds, root=sopclass.PATIENT_ROOT_FIND_SOP_CLASS):
+def c_find(remote_ae, local_aet, ds, root=sopclass.PATIENT_ROOT_FIND_SOP_CLASS,
+           pool=None):
     """Executes Query/Retrieve C-FIND.
 
     For each result generator yields result dataset (None in case of failure
@@ -35,23 +38,25 @@ def c_find(remote_ae, local_aet, ds, root=sopclass.PATIENT_ROOT_FIND_SOP_CLASS):
     :param local_aet: local AE Title (byte-string)
     :param ds: dataset with C-FIND request
     :param root: patient or study root (defaults to patient root SOP Class)
+    :param pool: optional :class:`~netdicom2.associationpool.AssociationPool`.
+                 If provided, query is sent over pooled association, instead
+                 of a new one. AE of the pool should support C-FIND as SCU,
+                 ``local_aet`` is ignored in this case.
     """
-    ae = applicationentity.ClientAE(local_aet).add_scu(sopclass.qr_find_scu)
-    with ae.request_association(remote_ae) as asce:
+    if pool is not None:
+        association = pool.association(remote_ae)
+    else:
+        ae = applicationentity.ClientAE(local_aet)\
+            .add_scu(sopclass.qr_find_scu)
+        association = ae.request_association(remote_ae)
+    with association as asce:
         srv = asce.get_scu(root)
         for result, status in srv(ds, _new_msg_id()):
             yield result, status
 
 
 def _get_storage_file(context, command_set, path):
-    file_name = '{}.dcm'.format(command_set.AffectedSOPInstanceUID)
-    full_name = os.path.join(path, file_name)
-    i = 0
-    while os.path.exists(full_name):
-        i += 1
-        full_name = '{}_{}'.format(full_name, i)
-
-    ds = open(os.path.join(path, file_name), 'w+b')
+    ds = storage.create_file(path, storage.instance_file_name(command_set))
     start = ds.tell()
     try:
         applicationentity.write_meta(ds, command_set, context.supported_ts)
@@ -63,24 +68,97 @@ def _get_storage_file(context, command_set, path):
 
 
 class ClientStorageAE(applicationentity.ClientAE):
+    """Client AE that stores received instances (e.g. with C-GET) in the
+    storage directory.
+
+    :param storage_dir: storage directory
+    :param ae_title: AE title (up to 16 characters)
+    :param supported_ts: list of transfer syntaxes supported by AE
+    :param max_pdu_length: maximum PDU length in bytes (defaults to 64kb).
+    :param layout: storage layout (see :mod:`~netdicom2.storage`), defaults
+                   to :func:`~netdicom2.storage.flat_layout`
+    """
+
     def __init__(self, storage_dir, ae_title, supported_ts=None,
-                 max_pdu_length=65536):
+                 max_pdu_length=65536, layout=storage.flat_layout):
         super(ClientStorageAE, self).__init__(ae_title, supported_ts,
                                               max_pdu_length)
         self.storage_dir = storage_dir
+        self.layout = layout
 
     def get_file(self, context, command_set):
         return _get_storage_file(context, command_set, self.storage_dir)
 
+    def get_sink(self, context, command_set, header):
+        return storage.StorageSink(self, self.storage_dir, self.layout)
+
 
 class StorageAE(applicationentity.AE):
+    """AE that stores received instances in the storage directory.
+
+    Stored instances are recorded in the persistent
+    :class:`~netdicom2.storage.InstanceIndex`. Instance that is already in
+    the index is recognized by SOP Instance UID from the command set, before
+    any data is written, and is handled according to ``duplicates`` policy
+    (see :mod:`~netdicom2.storage`). Sub-classes that override
+    ``on_store_header`` should call base implementation.
+
+    :param storage_dir: storage directory
+    :param ae_title: AE title (up to 16 characters)
+    :param port: port that AE listens on for incoming connection
+    :param supported_ts: list of transfer syntaxes supported by AE
+    :param max_pdu_length: maximum PDU length in bytes (defaults to 64kb).
+    :param layout: storage layout (see :mod:`~netdicom2.storage`), defaults
+                   to :func:`~netdicom2.storage.flat_layout`
+    :param duplicates: duplicate instances policy, defaults to
+                       :data:`~netdicom2.storage.DUPLICATE_DISCARD`
+    :param index_path: path of the index database, defaults to
+                       ``.instances.sqlite`` in the storage directory
+    :param write_behind: :class:`~netdicom2.storage.WriteBehind` instance.
+                         If provided, instances are written by background
+                         writers and C-STORE response is sent after the
+                         instance is flushed to disk. Writer is closed
+                         together with AE.
+    """
+
+    duplicate_status = statuses.C_STORE_ELEMENTS_DISCARDED
+    """Status of the response to duplicate instance with
+    :data:`~netdicom2.storage.DUPLICATE_WARN` policy."""
 
     def __init__(self, storage_dir, ae_title, port, supported_ts=None,
-                 max_pdu_length=65536):
+                 max_pdu_length=65536, layout=storage.flat_layout,
+                 duplicates=storage.DUPLICATE_DISCARD, index_path=None,
+                 write_behind=None):
 
         super(StorageAE, self).__init__(ae_title, port, supported_ts,
                                         max_pdu_length)
         self.storage_dir = storage_dir
+        self.layout = layout
+        self.duplicates = duplicates
+        self.write_behind = write_behind
+        self.index = storage.InstanceIndex(
+            index_path or os.path.join(storage_dir, '.instances.sqlite'))
 
     def get_file(self, context, command_set):
         return _get_storage_file(context, command_set, self.storage_dir)
+
+    def on_store_header(self, context, command_set, header):
+        if self.duplicates in (storage.DUPLICATE_DISCARD,
+                               storage.DUPLICATE_WARN) and \
+                command_set.AffectedSOPInstanceUID in self.index:
+            if self.duplicates == storage.DUPLICATE_WARN:
+                return self.duplicate_status
+            return statuses.SUCCESS
+        return None
+
+    def get_sink(self, context, command_set, header):
+        return storage.StorageSink(
+            self, self.storage_dir, self.layout, self.index,
+            overwrite=self.duplicates == storage.DUPLICATE_OVERWRITE,
+            write_behind=self.write_behind)
+
+    def server_close(self):
+        super(StorageAE, self).server_close()
+        if self.write_behind is not None:
+            self.write_behind.close()
+        self.index.close()
@@ -20,6 +20,7 @@ if dicom.__version_info__ >= ('1', '0', '0'):
     from pydicom import filewriter
     from pydicom import dataset
     from pydicom import sequence
+    from pydicom.datadict import dictionary_VR
 
     from pydicom.filebase import DicomBytesIO as _DicomBytesIO
 
@@ -34,6 +35,7 @@ else:
     from dicom import filewriter
     from dicom import dataset
     from dicom import sequence
+    from dicom.datadict import dictionary_VR
 
     if dicom.__version_info__ >= (0, 9, 8):
         from dicom.filebase import DicomBytesIO as _DicomBytesIO
@@ -47,6 +49,7 @@ ExplicitVRLittleEndian = uid.ExplicitVRLittleEndian
 ImplicitVRLittleEndian = uid.ImplicitVRLittleEndian
 ExplicitVRBigEndian = uid.ExplicitVRBigEndian
 UID = uid.UID
+DeflatedExplicitVRLittleEndian = UID('1.2.840.10008.1.2.1.99')
 
 write_file_meta_info = write_meta
 DicomBytesIO = _DicomBytesIO
@@ -0,0 +1,27 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+"""
+``asyncio`` based association stack.
+
+Package provides the same layers as the threaded implementation:
+
+    * :mod:`netdicom2.aio.dulprovider` - DUL service as ``asyncio`` protocol
+    * :mod:`netdicom2.aio.asceprovider` - associations
+    * :mod:`netdicom2.aio.applicationentity` - application entities
+    * :mod:`netdicom2.aio.sopclass` - service classes
+
+Every association is handled by a single task on the event loop instead of
+two OS threads, so one process can hold thousands of associations.
+
+.. note::
+
+    Package requires Python 3.7 or newer.
+"""
+
+from . import applicationentity
+from . import sopclass
+
+AE = applicationentity.AE
+ClientAE = applicationentity.ClientAE
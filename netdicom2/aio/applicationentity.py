@@ -0,0 +1,187 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+"""
+``asyncio`` application entities.
+
+Application entities share configuration API and event handlers with
+threaded :class:`~netdicom2.applicationentity.AEBase`. Event handlers
+(``on_receive_store``, ``on_receive_find``, etc.) could be either regular
+methods or coroutines. Services should be taken from
+:mod:`netdicom2.aio.sopclass`.
+
+Example::
+
+    from netdicom2.aio import applicationentity, sopclass
+
+    async def main():
+        ae = applicationentity.AE('AET', 104).add_scp(sopclass.verification_scp)
+        async with ae:
+            await ae.serve_forever()
+"""
+
+import asyncio
+import contextlib
+import inspect
+import platform
+
+from .. import applicationentity
+from . import asceprovider
+from . import dulprovider
+
+
+class AEBase(applicationentity.AEBase):
+    """Base ``asyncio`` application entity class.
+
+    Class is intended for sub-classing and should not be used directly.
+    """
+
+    dul_provider = dulprovider.DULServiceProvider
+    """
+    DUL service provider protocol class that is used by associations of this
+    AE.
+    """
+
+    @staticmethod
+    async def call_handler(handler, *args):
+        """Calls event handler and awaits result if handler is a coroutine.
+
+        :param handler: event handler
+        :return: handler result
+        """
+        result = handler(*args)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    @contextlib.asynccontextmanager
+    async def request_association(self, remote_ae):
+        """Requests association to a remote application entity.
+
+        Method is an asynchronous context manager. Remote AE configuration is
+        the same as for
+        :meth:`~netdicom2.applicationentity.AEBase.request_association`.
+
+        :param remote_ae: dictionary that contains remote AE configuration.
+        """
+        loop = asyncio.get_event_loop()
+        timeout = self.connect_timeout
+        if timeout is None:
+            timeout = self.timeout
+        _, dul = await asyncio.wait_for(
+            loop.create_connection(self.dul_provider, remote_ae['address'],
+                                   remote_ae['port']),
+            timeout
+        )
+        assoc = asceprovider.AssociationRequester(self, dul,
+                                                  remote_ae=remote_ae)
+        try:
+            await assoc.request()
+            yield assoc
+            if assoc.association_established:
+                await assoc.release()
+            else:
+                await assoc.kill()
+        except BaseException:
+            if assoc.association_established:
+                await assoc.abort()
+            else:
+                await assoc.kill()
+            raise
+
+
+class ClientAE(AEBase):
+    """Simple SCU-only ``asyncio`` application entity.
+
+    :param ae_title: AE title (up to 16 characters)
+    :param supported_ts: list of supported transfer syntaxes.
+    :param max_pdu_length: maximum PDU length in bytes (defaults to 64kb).
+    """
+
+    def __init__(self, ae_title, supported_ts=None,
+                 max_pdu_length=65536):
+        """Initializes new ClientAE instance"""
+        super(ClientAE, self).__init__(supported_ts, max_pdu_length)
+        self.local_ae = {'address': platform.node(), 'aet': ae_title}
+
+
+class AE(AEBase):
+    """``asyncio`` application entity that can take on both SCU and SCP roles.
+
+    Each incoming association is handled by a task on the event loop, so
+    single process can hold thousands of associations at once.
+    AE supports asynchronous context manager interface: server is started
+    upon entering context and closed on exit.
+
+    :param ae_title: AE title (up to 16 characters)
+    :param port: port that AE listens on for incoming connection
+    :param supported_ts: list of transfer syntaxes supported by AE
+    :param max_pdu_length: maximum PDU length in bytes (defaults to 64kb).
+    :param host: interface that AE listens on (defaults to all interfaces)
+    """
+
+    def __init__(self, ae_title, port, supported_ts=None,
+                 max_pdu_length=65536, host=''):
+        """Initializes new AE instance."""
+        super(AE, self).__init__(supported_ts, max_pdu_length)
+        self.local_ae = {'address': platform.node(), 'port': port,
+                         'aet': ae_title}
+        self.host = host or None
+        self.server = None
+        self.associations = set()
+
+    def add_scp(self, service):
+        """Adds service as SCP to the AE.
+
+        :param service: ``asyncio`` DICOM service.
+        """
+        self.supported_scp.update({
+            uid: service for uid in service.sop_classes
+        })
+        store_in_file = (hasattr(service, 'store_in_file') and
+                         service.store_in_file)
+        self.update_context_def_list(service.sop_classes, store_in_file)
+        return self
+
+    async def start(self):
+        """Starts accepting incoming connections."""
+        loop = asyncio.get_event_loop()
+        self.server = await loop.create_server(
+            self._accept, self.host, self.local_ae['port'],
+            reuse_address=True
+        )
+
+    async def serve_forever(self):
+        """Accepts connections until server is closed."""
+        if self.server is None:
+            await self.start()
+        await self.server.serve_forever()
+
+    async def quit(self):
+        """Stops AE from accepting connections and aborts active
+        associations."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        tasks = list(self.associations)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.quit()
+
+    def _accept(self):
+        dul = self.dul_provider(acceptor=True)
+        assoc = asceprovider.AssociationAcceptor(self, dul)
+        task = asyncio.get_event_loop().create_task(assoc.handle())
+        self.associations.add(task)
+        task.add_done_callback(self.associations.discard)
+        return dul
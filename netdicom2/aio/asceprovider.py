@@ -0,0 +1,243 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+"""
+``asyncio`` association classes.
+
+Classes mirror :class:`~netdicom2.asceprovider.AssociationAcceptor` and
+:class:`~netdicom2.asceprovider.AssociationRequester`, but all methods that
+wait for the remote AE are coroutines. Association negotiation and DIMSE
+message assembly are shared with threaded implementation.
+"""
+
+import asyncio
+import collections
+import functools
+
+from .. import asceprovider
+from .. import exceptions
+from .. import pdu
+
+
+class Association(object):
+    """Base ``asyncio`` association class.
+
+    :param local_ae: local application entity
+    :param dul: :class:`~netdicom2.aio.dulprovider.DULServiceProvider` instance
+    """
+
+    def __init__(self, local_ae, dul):
+        self.dul = dul
+        self.ae = local_ae
+        self.association_established = False
+        self.max_pdu_length = 16000
+        self.max_ops_invoked = 1
+        self.max_ops_performed = 1
+        self.accepted_contexts = {}
+        self.pending_items = collections.deque()
+        self.send_lock = asyncio.Lock()
+
+    async def get_dul_message(self, timeout=None):
+        if timeout is None:
+            timeout = self.ae.dimse_timeout
+        if timeout is None:
+            timeout = self.ae.timeout
+        dul_msg = await self.dul.receive(timeout)
+        return asceprovider.check_dul_message(dul_msg)
+
+    async def send(self, dimse_msg, pc_id):
+        dimse_msg.set_length()
+        asceprovider.deflate_on_context(self, dimse_msg, pc_id)
+        async with self.send_lock:
+            # fragments of different messages should not interleave
+            for p_data in dimse_msg.encode(pc_id, self.max_pdu_length):
+                self.dul.send(p_data)
+                await self.dul.drain()
+
+    async def receive(self):
+        assembler = asceprovider.MessageAssembler(self)
+        try:
+            while True:
+                while self.pending_items:
+                    if assembler.feed(self.pending_items.popleft()):
+                        return assembler.message()
+                p_data = await self.get_dul_message()
+                self.pending_items.extend(p_data.data_value_items)
+        except Exception:
+            assembler.abort()
+            raise
+
+    async def kill(self):
+        """Waits for transport connection to close and stops DUL service.
+
+        If connection is not closed within a second it is closed forcibly.
+        """
+        await self.dul.wait_closed(1)
+        self.dul.kill()
+        self.association_established = False
+
+    async def release(self):
+        """Releases association.
+
+        Requests the release of the association and waits for
+        confirmation
+        """
+        self.dul.send(pdu.AReleaseRqPDU())
+        rsp = await self.dul.receive(self.ae.timeout)
+        await self.kill()
+        return rsp
+
+
+class AssociationAcceptor(Association):
+    """'Server-side' ``asyncio`` association implementation."""
+
+    def __init__(self, local_ae, dul):
+        super(AssociationAcceptor, self).__init__(local_ae, dul)
+        self.sop_classes_as_scp = {}
+        self.remote_ae = b''
+
+    async def abort(self, reason):
+        """Aborts association with specified reason
+
+        :param reason: abort reason
+        """
+        self.dul.send(pdu.AAbortPDU(source=2, reason_diag=reason))
+        await self.kill()
+
+    def reject(self, result, source, diag):
+        """Rejects association with specified parameters
+
+        :param result:
+        :param source:
+        :param diag:
+        """
+        self.dul.send(pdu.AAssociateRjPDU(result, source, diag))
+
+    def accept(self, assoc_req):
+        """Sends association response based on supported SOP Classes and
+        transfer syntaxes."""
+        res, self.max_pdu_length, self.accepted_contexts, \
+            (self.max_ops_invoked, self.max_ops_performed) = \
+            asceprovider.negotiate_association(self.ae, assoc_req)
+        self.sop_classes_as_scp = dict(self.accepted_contexts)
+        self.dul.send(res)
+        self.remote_ae = assoc_req.calling_ae_title
+
+    async def handle(self):
+        """Handles association from request until release or abort."""
+        try:
+            await self._establish()
+            await self._loop()
+        except exceptions.AssociationReleasedError:
+            self.dul.send(pdu.AReleaseRpPDU())
+        except exceptions.AssociationAbortedError:
+            pass
+        except exceptions.TimeoutError:
+            pass
+        finally:
+            await self.kill()
+
+    async def _establish(self):
+        try:
+            assoc_req = await self.dul.receive(self.ae.timeout)
+            await self.ae.call_handler(self.ae.on_association_request,
+                                       assoc_req)
+        except exceptions.AssociationRejectedError as e:
+            self.reject(e.result, e.source, e.diagnostic)
+            raise
+
+        self.accept(assoc_req)
+        self.association_established = True
+
+    async def _loop(self):
+        operations = set()
+        try:
+            while True:
+                dimse_msg, pc_id = await self.receive()
+                uid = dimse_msg.sop_class_uid
+                try:
+                    ctx = self.sop_classes_as_scp[pc_id]
+                    service = self.ae.supported_scp[uid]
+                except KeyError:
+                    raise exceptions.ClassNotSupportedError(
+                        'SOP Class {0} not supported as SCP'.format(uid))
+                if self.max_ops_performed == 1 or \
+                        not getattr(service, 'concurrent_operations', False):
+                    await service(self, ctx, dimse_msg)
+                    continue
+
+                # wait for the slot in the operations window
+                while self.max_ops_performed and \
+                        len(operations) >= self.max_ops_performed:
+                    done, operations = await asyncio.wait(
+                        operations, return_when=asyncio.FIRST_COMPLETED)
+                    for operation in done:
+                        operation.result()
+                operations.add(asyncio.ensure_future(
+                    service(self, ctx, dimse_msg)))
+                done = set(op for op in operations if op.done())
+                for operation in done:
+                    operation.result()
+                operations -= done
+        except asyncio.CancelledError:
+            for operation in operations:
+                operation.cancel()
+            raise
+        finally:
+            if operations:
+                await asyncio.wait(operations)
+
+
+class AssociationRequester(Association):
+    """'Client-side' ``asyncio`` association implementation."""
+
+    def __init__(self, local_ae, dul, remote_ae=None):
+        super(AssociationRequester, self).__init__(local_ae, dul)
+        self.template = local_ae.request_template()
+        self.context_def_list = self.template.context_def_list
+        self.remote_ae = remote_ae
+        self.sop_classes_as_scu = {}
+
+    async def abort(self, reason=0):
+        """Aborts association with specified reason
+
+        :param reason: abort reason
+        """
+        self.dul.send(pdu.AAbortPDU(source=0, reason_diag=reason))
+        await self.kill()
+
+    async def request(self):
+        """Requests an association with a remote AE and waits for association
+        response."""
+        custom_items = self.remote_ae.get('user_data', [])
+        pcdl = self.context_def_list
+        self.max_pdu_length = self.template.max_pdu_length
+        assoc_rq = asceprovider.association_request_from_template(
+            self.template, self.ae.local_ae, self.remote_ae,
+            users_pdu=custom_items
+        )
+        self.dul.send(assoc_rq)
+        response = await self.get_dul_message(self.ae.timeout)
+
+        self.max_pdu_length, self.accepted_contexts = \
+            asceprovider.accepted_contexts_from_response(response, pcdl)
+        self.max_ops_invoked, self.max_ops_performed = \
+            asceprovider.operations_window_from_response(response)
+        self.sop_classes_as_scu = {
+            ctx.sop_class: (pc_id, ctx.supported_ts)
+            for pc_id, ctx in self.accepted_contexts.items()
+        }
+        await self.ae.call_handler(self.ae.on_association_response, response)
+        self.association_established = True
+
+    def get_scu(self, sop_class):
+        try:
+            pc_id, ts = self.sop_classes_as_scu[sop_class]
+            service = self.ae.supported_scu[sop_class]
+        except KeyError:
+            raise exceptions.ClassNotSupportedError(
+                'SOP Class %s not supported as SCU' % sop_class)
+        else:
+            return functools.partial(
+                service, self, asceprovider.PContextDef(pc_id, sop_class, ts))
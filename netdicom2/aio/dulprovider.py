@@ -0,0 +1,288 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+"""
+``asyncio`` implementation of the DUL service provider.
+
+:class:`~netdicom2.aio.dulprovider.DULServiceProvider` is an
+``asyncio.Protocol`` that is driven by the same state machine
+(:doc:`fsm`) and PDU codecs (:doc:`pdu`) as the threaded
+:class:`~netdicom2.dulprovider.DULServiceProvider`. Unlike threaded service,
+it does not need any threads: incoming data is processed by event loop
+callbacks and outgoing PDUs are written to the transport immediately.
+"""
+
+import asyncio
+import struct
+
+from .. import dulprovider
+from .. import exceptions
+from .. import fsm
+from .. import pdu
+
+
+def _connected(provider):
+    """Transport connection is opened before A-ASSOCIATE-RQ is sent."""
+    provider.connect(provider.primitive.called_presentation_address)
+    return fsm.STA4
+
+
+TransitionTable = dict(fsm.TransitionTable)
+TransitionTable[('Evt1', 'Sta1')] = _connected
+Transitions = fsm.compile_table(TransitionTable)
+
+
+class IndicationQueue(object):
+    """Queue of PDUs that are passed to the service user.
+
+    State machine actions put PDUs into the queue synchronously, while service
+    user awaits them. When size of queued PDUs reaches ``high_water`` bytes,
+    ``pause`` is called, ``resume`` is called once service user takes enough
+    PDUs out of the queue.
+    """
+
+    def __init__(self, high_water=None, pause=None, resume=None):
+        self._queue = asyncio.Queue()
+        self.high_water = high_water
+        self.nbytes = 0
+        self._pause = pause
+        self._resume = resume
+        self._paused = False
+
+    def put(self, primitive):
+        self._queue.put_nowait(primitive)
+        self.nbytes += dulprovider.pdu_size(primitive)
+        if not self._paused and self.full():
+            self._paused = True
+            if self._pause is not None:
+                self._pause()
+
+    async def get(self):
+        primitive = await self._queue.get()
+        self.nbytes -= dulprovider.pdu_size(primitive)
+        if self._paused and not self.full():
+            self._paused = False
+            if self._resume is not None:
+                self._resume()
+        return primitive
+
+    def full(self):
+        return self.high_water is not None and \
+            self.nbytes >= self.high_water
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+class Timer(object):
+    """ARTIM timer based on event loop call scheduling.
+
+    When timer expires, ``Evt18`` is issued to the service provider.
+    """
+
+    def __init__(self, provider, max_seconds):
+        self._provider = provider
+        self._max_seconds = max_seconds
+        self._handle = None
+
+    def start(self):
+        loop = asyncio.get_event_loop()
+        self.stop()
+        self._handle = loop.call_later(self._max_seconds, self._expired)
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def _expired(self):
+        self._handle = None
+        self._provider.handle_event(fsm.EVT18)
+
+
+class DULServiceProvider(asyncio.Protocol):
+    """Implements DUL service as ``asyncio`` protocol.
+
+    Service user sends PDUs with
+    :meth:`~netdicom2.aio.dulprovider.DULServiceProvider.send` and awaits
+    incoming PDUs with
+    :meth:`~netdicom2.aio.dulprovider.DULServiceProvider.receive`.
+
+    Transport connection is always opened by the event loop (either by server
+    or by ``create_connection``), so ``Evt1`` only moves state machine to the
+    'transport connection open' state.
+
+    :ivar dul_socket: transport that is used by the service. Attribute is named
+                      after threaded service attribute for state machine
+                      compatibility.
+    """
+
+    header = struct.Struct('>B B I')
+
+    incoming_high_water = dulprovider.DULServiceProvider.incoming_high_water
+    """
+    Maximum size in bytes of received PDUs that are waiting for the service
+    user. Transport stops reading when limit is reached.
+    """
+
+    def __init__(self, acceptor=False, artim_timeout=10):
+        """Initializes DUL service.
+
+        :param acceptor: ``True`` if service handles incoming connection
+        :param artim_timeout: ARTIM timer timeout in seconds
+        """
+        self.acceptor = acceptor
+        self.primitive = None
+        self.dul_socket = None
+        self.to_service_user = IndicationQueue(self.incoming_high_water,
+                                               self._pause_reading,
+                                               self._resume_reading)
+        self.timer = Timer(self, artim_timeout)
+        self.state_machine = fsm.StateMachine(self, Transitions)
+        self._buffer = bytearray()
+        self._can_write = asyncio.Event()
+        self._can_write.set()
+        self._closed = asyncio.Event()
+
+    # asyncio.Protocol interface
+
+    def connection_made(self, transport):
+        self.dul_socket = transport
+        if self.acceptor:
+            self.handle_event(fsm.EVT5)
+
+    def data_received(self, data):
+        self._buffer.extend(data)
+        while len(self._buffer) >= 6:
+            _, _, length = self.header.unpack_from(self._buffer)
+            end = length + 6
+            if len(self._buffer) < end:
+                break
+            raw_pdu = self._buffer[:end]
+            del self._buffer[:end]
+            self._process_pdu(raw_pdu)
+
+    def connection_lost(self, exc):
+        self._can_write.set()
+        self._closed.set()
+        if self.dul_socket is not None:
+            # connection was closed by remote AE
+            self.dul_socket = None
+            self.handle_event(fsm.EVT17)
+
+    def pause_writing(self):
+        self._can_write.clear()
+
+    def resume_writing(self):
+        self._can_write.set()
+
+    # transport interface used by state machine
+
+    def connect(self, address):
+        if self.dul_socket is None:
+            raise exceptions.NetDICOMError(
+                'Transport connection is not established')
+
+    def write_pdu(self, primitive):
+        if isinstance(primitive, pdu.PDataTfPDU):
+            self.dul_socket.writelines(
+                pdu.load_buffers(primitive.encode_buffers()))
+        else:
+            self.dul_socket.write(primitive.encode())
+
+    def close_transport(self):
+        self.dul_socket.close()
+        self.dul_socket = None
+
+    # service user interface
+
+    def send(self, primitive):
+        """Processes outgoing PDU.
+
+        Unlike threaded service, PDU is written to the transport right away.
+
+        :param primitive: outgoing PDU. Possible PDU types are described
+                          in :doc:`pdu`
+        """
+        try:
+            event = dulprovider.PDU_TO_EVENT[primitive.pdu_type]
+        except KeyError:
+            raise exceptions.PDUProcessingError(
+                'Unknown PDU {0} with type {1}'.format(primitive,
+                                                       primitive.pdu_type))
+        self.primitive = primitive
+        self.handle_event(event)
+
+    async def drain(self):
+        """Waits until transport write buffer is below high-water mark."""
+        await self._can_write.wait()
+
+    async def receive(self, timeout):
+        """Waits for incoming PDU.
+
+        :param timeout: the amount of seconds method waits for PDU to appear
+                        in incoming queue
+        :return: PDU instance.
+        :raise exceptions.TimeoutError: If specified timeout is exceeded
+        """
+        try:
+            return await asyncio.wait_for(self.to_service_user.get(), timeout)
+        except asyncio.TimeoutError:
+            raise exceptions.TimeoutError()
+
+    async def wait_closed(self, timeout=None):
+        """Waits for transport connection to close.
+
+        :param timeout: the amount of seconds to wait. If timeout is exceeded
+                        transport connection is closed forcibly.
+        """
+        try:
+            await asyncio.wait_for(self._closed.wait(), timeout)
+        except asyncio.TimeoutError:
+            self.kill()
+
+    def kill(self):
+        """Stops ARTIM timer and closes transport connection."""
+        self.timer.stop()
+        if self.dul_socket is not None:
+            transport = self.dul_socket
+            self.dul_socket = None
+            transport.abort()
+        self.state_machine.state = fsm.STA1
+
+    def handle_event(self, event):
+        """Executes state machine action triggered by event.
+
+        :param event: event code (see :doc:`fsm`)
+        """
+        try:
+            self.state_machine.action(event, self)
+            if self.state_machine.state == fsm.STA4:
+                # transport is already open
+                self.handle_event(fsm.EVT2)
+        except Exception:
+            self.to_service_user.put(pdu.AAbortPDU(source=0, reason_diag=0))
+            self.kill()
+            raise
+
+    def _pause_reading(self):
+        if self.dul_socket is not None:
+            self.dul_socket.pause_reading()
+
+    def _resume_reading(self):
+        if self.dul_socket is not None:
+            self.dul_socket.resume_reading()
+
+    def _process_pdu(self, raw_pdu):
+        try:
+            pdu_type, event = dulprovider.PDU_TYPES[raw_pdu[0]]
+        except KeyError:
+            self.handle_event(fsm.EVT19)
+        else:
+            self.primitive = pdu_type.decode(raw_pdu)
+            self.handle_event(event)
@@ -0,0 +1,573 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+"""
+``asyncio`` implementation of the DICOM service classes.
+
+Services follow the same interface as services in :doc:`sopclasses`, but
+every SCU and SCP role implementation is a coroutine (or an asynchronous
+generator for services that yield several responses)::
+
+    @sop_classes([UID1, UID2, UID3])
+    async def sample_scp(asce, ctx, msg):
+        pass
+
+Services should be added to application entities from
+:mod:`netdicom2.aio.applicationentity`. Event handlers of the application
+entity could be either regular methods or coroutines. C-FIND and C-MOVE
+handlers could return asynchronous iterators as well as regular ones.
+"""
+
+import six
+
+from .. import _dicom
+from .. import dsutils
+from .. import exceptions
+from .. import dimsemessages
+from .. import statuses
+from ..sopclass import sop_classes, store_in_file, concurrent_operations,\
+    MessageDispatcher, FIND_SOP_CLASSES, GET_SOP_CLASSES, MOVE_SOP_CLASSES,\
+    STORAGE_COMMITMENT_PUSH_MODEL_SOP_CLASS, _set_file_data_set,\
+    _sop_class_uid, _abort_sink
+from ..uids import *
+
+
+async def _iterate(iterable):
+    if hasattr(iterable, '__aiter__'):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
+
+
+class MessageDispatcherSCP(MessageDispatcher):
+    """Messages dispatcher for ``asyncio`` service class provider."""
+    async def __call__(self, asce, ctx, msg):
+        method = self.get_method(msg)
+        return await method(asce, ctx, msg)
+
+
+@sop_classes([VERIFICATION_SOP_CLASS])
+async def verification_scu(asce, ctx, msg_id):
+    """Sends verification request and returns it's status result
+
+    :param msg_id: message ID
+    :return: status in response message. `SUCCESS` if verification was
+             successfully completed.
+    """
+    c_echo = dimsemessages.CEchoRQMessage()
+    c_echo.message_id = msg_id
+    c_echo.sop_class_uid = ctx.sop_class
+
+    await asce.send(c_echo, ctx.id)
+
+    response, msg_id = await asce.receive()
+    return statuses.Status(response.status, dimsemessages.CEchoRSPMessage)
+
+
+@concurrent_operations
+@sop_classes([VERIFICATION_SOP_CLASS])
+async def verification_scp(asce, ctx, msg):
+    """Process received C-ECHO.
+
+    :param msg: incoming C-ECHO message
+    """
+    try:
+        status = await asce.ae.call_handler(asce.ae.on_receive_echo, ctx)
+    except exceptions.EventHandlingError:
+        status = statuses.PROCESSING_FAILURE
+
+    rsp = dimsemessages.CEchoRSPMessage()
+    rsp.message_id_being_responded_to = msg.message_id
+    rsp.status = int(status)
+    await asce.send(rsp, ctx.id)
+
+
+@sop_classes([])
+async def storage_scu(asce, ctx, dataset, msg_id):
+    """Simple storage SCU role implementation.
+
+    This implementation provides *no* SOP Class UIDs. When adding this SCU you
+    should provide list of SOP Class UIDs you want to store.
+
+    :param dataset: dataset or filename that should be sent via Storage
+                    service. File in different transfer syntax than
+                    negotiated one is transcoded while it is sent.
+    :param msg_id: message identifier
+    :return: status code when dataset is stored.
+    """
+    c_store = dimsemessages.CStoreRQMessage()
+    c_store.message_id = msg_id
+    c_store.priority = dimsemessages.PRIORITY_MEDIUM
+    c_store.move_originator_aet = asce.ae.local_ae['aet']
+    c_store.move_originator_message_id = msg_id
+    c_store.digest_algorithms = asce.ae.digest_algorithms
+
+    if isinstance(dataset, six.string_types):
+        # Got file name
+        with open(dataset, 'rb') as ds:
+            zero = ds.tell()
+            _dicom.read_preamble(ds, False)
+            meta = _dicom.read_file_meta_info(ds)
+            c_store.sop_class_uid = meta.MediaStorageSOPClassUID
+            try:
+                instance_uid = meta.MediaStorageSOPInstanceUID
+            except AttributeError:
+                start = ds.tell()
+                ds.seek(zero)
+                ds_full = _dicom.read_file(ds, stop_before_pixels=True)
+                instance_uid = ds_full.SOPInstanceUID
+                ds.seek(start)
+
+            c_store.affected_sop_instance_uid = instance_uid
+            _set_file_data_set(c_store, ds, meta.get('TransferSyntaxUID'),
+                               ctx.supported_ts)
+            await asce.send(c_store, ctx.id)
+    else:
+        # Assume it's dataset object
+        c_store.sop_class_uid = dataset.SOPClassUID
+        c_store.affected_sop_instance_uid = dataset.SOPInstanceUID
+        c_store.data_set = dsutils.encode(dataset,
+                                          ctx.supported_ts.is_implicit_VR,
+                                          ctx.supported_ts.is_little_endian)
+        await asce.send(c_store, ctx.id)
+
+    response, _ = await asce.receive()
+    status = statuses.Status(response.status, dimsemessages.CStoreRSPMessage)
+    status.digests = c_store.digests
+    return status
+
+
+@concurrent_operations
+@store_in_file
+@sop_classes(STORAGE_SOP_CLASSES)
+async def storage_scp(asce, ctx, msg):
+    """Storage SCP role implementation.
+
+    Service passes file object from received message to ``on_receive_store``
+    method of the application entity. If dataset was rejected or skipped by
+    ``on_store_header`` service responds with status returned by it. Dataset
+    that was streamed to the sink is completed with sink ``end`` method, sink
+    that fails to complete is aborted.
+
+    :param msg: received message
+    """
+    if msg.early_status is not None:
+        status = msg.early_status
+    elif msg.sink is not None:
+        try:
+            status = await asce.ae.call_handler(msg.sink.end)
+        except Exception as e:
+            status = _abort_sink(msg.sink, e)
+    else:
+        try:
+            status = await asce.ae.call_handler(asce.ae.on_receive_store, ctx,
+                                                msg.data_set)
+        except exceptions.EventHandlingError:
+            status = statuses.C_STORE_CANNON_UNDERSTAND
+        finally:
+            if msg.data_set:
+                msg.data_set.close()
+
+    rsp = dimsemessages.CStoreRSPMessage()
+    rsp.message_id_being_responded_to = msg.message_id
+    rsp.affected_sop_instance_uid = msg.affected_sop_instance_uid
+    rsp.sop_class_uid = msg.sop_class_uid
+    rsp.status = int(status)
+    await asce.send(rsp, ctx.id)
+
+
+@sop_classes(FIND_SOP_CLASSES)
+async def qr_find_scu(asce, ctx, ds, msg_id):
+    """Query/Retrieve find service user role implementation.
+
+    SCU is implemented as asynchronous generator that yields responses
+    (dataset and status) from remote AE.
+
+    :param ds: dataset that is passed to remote AE with C-FIND command
+    :param msg_id: message identifier
+    """
+    c_find = dimsemessages.CFindRQMessage()
+    c_find.message_id = msg_id
+    c_find.sop_class_uid = ctx.sop_class
+    c_find.priority = dimsemessages.PRIORITY_MEDIUM
+    c_find.data_set = dsutils.encode(ds,
+                                     ctx.supported_ts.is_implicit_VR,
+                                     ctx.supported_ts.is_little_endian)
+
+    await asce.send(c_find, ctx.id)
+    while True:
+        response, _ = await asce.receive()
+        if response.data_set:
+            data_set = dsutils.decode(response.data_set,
+                                      ctx.supported_ts.is_implicit_VR,
+                                      ctx.supported_ts.is_little_endian)
+        else:
+            data_set = None
+        status = statuses.Status(response.status, dimsemessages.CFindRSPMessage)
+        yield data_set, status
+        if not status.is_pending:
+            break
+
+
+async def _find_scp(asce, ctx, msg):
+    ds = dsutils.decode(msg.data_set, ctx.supported_ts.is_implicit_VR,
+                        ctx.supported_ts.is_little_endian)
+
+    rsp = dimsemessages.CFindRSPMessage()
+    rsp.message_id_being_responded_to = msg.message_id
+    rsp.sop_class_uid = msg.sop_class_uid
+
+    gen = await asce.ae.call_handler(asce.ae.on_receive_find, ctx, ds)
+    async for data_set, status in _iterate(gen):
+        rsp.status = int(status)
+        rsp.data_set = dsutils.encode(data_set,
+                                      ctx.supported_ts.is_implicit_VR,
+                                      ctx.supported_ts.is_little_endian)
+        await asce.send(rsp, ctx.id)
+
+    rsp = dimsemessages.CFindRSPMessage()
+    rsp.message_id_being_responded_to = msg.message_id
+    rsp.sop_class_uid = msg.sop_class_uid
+    rsp.status = int(statuses.SUCCESS)
+    await asce.send(rsp, ctx.id)
+
+
+@concurrent_operations
+@sop_classes(FIND_SOP_CLASSES)
+async def qr_find_scp(asce, ctx, msg):
+    """Query/Retrieve find SCP role implementation.
+
+    Service calls `on_receive_find` from AE with received C-FIND parameters
+    and expects iterator (or asynchronous iterator) that would yield dataset
+    responses for C-FIND command.
+
+    :param msg: received C-FIND message
+    """
+    await _find_scp(asce, ctx, msg)
+
+
+@sop_classes(GET_SOP_CLASSES)
+async def qr_get_scu(asce, ctx, ds, msg_id):
+    """Query/Retrieve C-GET service implementation.
+
+    Service is an asynchronous generator. Refer to
+    :func:`~netdicom2.sopclass.qr_get_scu` for usage notes.
+
+    :param ds: dataset that contains request parameters.
+    :param msg_id: message ID
+    """
+    def decode_ds(_ds):
+        if not isinstance(_ds, bytes):
+            _ds.seek(0)  # spooled dataset could be read by on_receive_store
+        return dsutils.decode(_ds, ctx.supported_ts.is_implicit_VR,
+                              ctx.supported_ts.is_little_endian)
+
+    c_get = dimsemessages.CGetRQMessage()
+    c_get.message_id = msg_id
+    c_get.sop_class_uid = ctx.sop_class
+    c_get.priority = dimsemessages.PRIORITY_MEDIUM
+    c_get.data_set = dsutils.encode(ds,
+                                    ctx.supported_ts.is_implicit_VR,
+                                    ctx.supported_ts.is_little_endian)
+
+    await asce.send(c_get, ctx.id)
+    while True:
+        msg, pc_id = await asce.receive()
+        if msg.command_field == dimsemessages.CGetRSPMessage.command_field:
+            status = statuses.Status(msg.status, dimsemessages.CGetRSPMessage)
+            if not status.is_pending:
+                break  # last answer
+        elif msg.command_field == dimsemessages.CStoreRQMessage.command_field:
+            store_ctx = asce.ae.context_def_list[pc_id]
+            in_file = store_ctx.sop_class in asce.ae.store_in_file
+
+            rsp = dimsemessages.CStoreRSPMessage()
+            rsp.message_id_being_responded_to = msg.message_id
+            rsp.affected_sop_instance_uid = msg.affected_sop_instance_uid
+            rsp.sop_class_uid = msg.sop_class_uid
+
+            if msg.early_status is not None:
+                # dataset was rejected or skipped by on_store_header
+                status = msg.early_status
+            elif msg.sink is not None:
+                try:
+                    status = await asce.ae.call_handler(msg.sink.end)
+                except Exception as e:
+                    status = _abort_sink(msg.sink, e)
+                else:
+                    yield ctx, msg.sink
+            else:
+                try:
+                    status = await asce.ae.call_handler(
+                        asce.ae.on_receive_store, ctx, msg.data_set)
+                    yield ctx, (msg.data_set if in_file
+                                else decode_ds(msg.data_set))
+                except exceptions.EventHandlingError:
+                    status = statuses.C_GET_UNABLE_TO_PROCESS
+                finally:
+                    if msg.data_set and not isinstance(msg.data_set, bytes):
+                        # file from get_file or spooled dataset
+                        msg.data_set.close()
+
+            rsp.status = int(status)
+            await asce.send(rsp, pc_id)
+
+
+@sop_classes(MOVE_SOP_CLASSES)
+async def qr_move_scu(asce, ctx, ds, dest_ae, msg_id):
+    """Query/Retrieve C-MOVE service implementation.
+
+    Service is an asynchronous generator that yields statuses and response
+    messages.
+
+    :param ds: dataset that contains request parameters.
+    :param dest_ae: C-MOVE destination
+    :param msg_id: message ID.
+    """
+    c_move = dimsemessages.CMoveRQMessage()
+    c_move.message_id = msg_id
+    c_move.sop_class_uid = ctx.sop_class
+    c_move.move_destination = dest_ae
+    c_move.priority = dimsemessages.PRIORITY_MEDIUM
+    c_move.data_set = dsutils.encode(ds,
+                                     ctx.supported_ts.is_implicit_VR,
+                                     ctx.supported_ts.is_little_endian)
+    await asce.send(c_move, ctx.id)
+
+    while True:
+        response, _ = await asce.receive()
+        status = statuses.Status(response.status, dimsemessages.CMoveRSPMessage)
+        if not status.is_pending:
+            break
+        yield status, response
+
+
+@sop_classes(MOVE_SOP_CLASSES)
+async def qr_move_scp(asce, ctx, msg):
+    """Query/Retrieve C-MOVE SCP role implementation.
+
+    :param msg: received C-MOVE message
+    """
+    ds = dsutils.decode(msg.data_set, ctx.supported_ts.is_implicit_VR,
+                        ctx.supported_ts.is_little_endian)
+
+    rsp = dimsemessages.CMoveRSPMessage()
+    rsp.message_id_being_responded_to = msg.message_id
+    rsp.sop_class_uid = msg.sop_class_uid
+    remote_ae, nop, gen = await asce.ae.call_handler(
+        asce.ae.on_receive_move, ctx, ds, msg.move_destination)
+    if not nop:
+        # nothing to move
+        await _send_move_response(asce, ctx, msg, 0, 0, 0, 0)
+        return
+
+    async with asce.ae.request_association(remote_ae) as assoc:
+        failed = 0
+        warning = 0
+        completed = 0
+        async for data_set in _iterate(gen):
+            service = assoc.get_scu(_sop_class_uid(data_set))
+            status = await service(data_set, completed)
+            if status.is_failure:
+                failed += 1
+            if status.is_warning:
+                warning += 1
+            rsp.status = int(statuses.C_MOVE_PENDING)
+            rsp.num_of_remaining_sub_ops = nop - completed
+            rsp.num_of_completed_sub_ops = completed
+            rsp.num_of_failed_sub_ops = failed
+            rsp.num_of_warning_sub_ops = warning
+            completed += 1
+
+            await asce.send(rsp, ctx.id)
+        await _send_move_response(asce, ctx, msg, nop, failed, warning,
+                                  completed)
+
+
+async def _send_move_response(asce, ctx, msg, nop, failed, warning, completed):
+    rsp = dimsemessages.CMoveRSPMessage()
+    rsp.message_id_being_responded_to = msg.message_id
+    rsp.sop_class_uid = msg.sop_class_uid
+    rsp.num_of_remaining_sub_ops = nop - completed
+    rsp.num_of_completed_sub_ops = completed
+    rsp.num_of_failed_sub_ops = failed
+    rsp.num_of_warning_sub_ops = warning
+    rsp.status = int(statuses.SUCCESS)
+    await asce.send(rsp, ctx.id)
+
+
+@sop_classes([MODALITY_WORK_LIST_INFORMATION_FIND_SOP_CLASS])
+async def modality_work_list_scu(asce, ctx, ds, msg_id):
+    """Modality Worklist C-FIND SCU.
+
+    Service is an asynchronous generator that yields status and identifier.
+
+    :param ds: dataset with C-FIND parameters
+    :param msg_id: message ID
+    """
+    c_find = dimsemessages.CFindRQMessage()
+    c_find.message_id = msg_id
+    c_find.sop_class_uid = ctx.sop_class
+    c_find.priority = dimsemessages.PRIORITY_MEDIUM
+    c_find.data_set = dsutils.encode(ds,
+                                     ctx.supported_ts.is_implicit_VR,
+                                     ctx.supported_ts.is_little_endian)
+
+    await asce.send(c_find, ctx.id)
+    while True:
+        response, _ = await asce.receive()
+        d = dsutils.decode(response.data_set,
+                           ctx.supported_ts.is_implicit_VR,
+                           ctx.supported_ts.is_little_endian)
+        status = statuses.Status(response.status, dimsemessages.CFindRSPMessage)
+        yield status, d
+        if not status.is_pending:
+            break
+
+
+@concurrent_operations
+@sop_classes([MODALITY_WORK_LIST_INFORMATION_FIND_SOP_CLASS])
+async def modality_work_list_scp(asce, ctx, msg):
+    """Modality Worklist C-FIND SCP.
+
+    :param msg: received C-FIND message
+    """
+    await _find_scp(asce, ctx, msg)
+
+
+class StorageCommitment(MessageDispatcherSCP):
+    """``asyncio`` Storage Commitment Push Model SCP."""
+    sop_classes = [STORAGE_COMMITMENT_SOP_CLASS]
+
+    PROCESSING_FAILURE = 0x0110
+    NO_SUCH_OBJECT_INSTANCE = 0x0112
+    RESOURCE_LIMITATION = 0x0213
+    REFERENCED_SOP_CLASS_NOT_SUPPORTED = 0x0122
+    CLASS_OR_INSTANCE_CONFLICT = 0x0119
+    DUPLICATE_TRANSACTION_UID = 0x0131
+
+    async def n_event_report(self, asce, ctx, msg):
+        rsp = dimsemessages.NEventReportRSPMessage()
+        rsp.sop_class_uid = ctx.sop_class
+        rsp.status = int(statuses.SUCCESS)
+        rsp.event_type_id = msg.event_type_id
+        rsp.affected_sop_instance_uid = msg.affected_sop_instance_uid
+
+        ds = dsutils.decode(msg.data_set, ctx.supported_ts.is_implicit_VR,
+                            ctx.supported_ts.is_little_endian)
+        transaction_uid = ds.TransactionUID
+        if hasattr(ds, 'ReferencedSOPSequence'):
+            success = ((item.ReferencedSOPClassUID,
+                        item.ReferencedSOPInstanceUID)
+                       for item in ds.ReferencedSOPSequence)
+        else:
+            success = []
+
+        if hasattr(ds, 'FailedSOPSequence'):
+            failure = ((item.ReferencedSOPClassUID,
+                        item.ReferencedSOPInstanceUID,
+                        item.FailureReason)
+                       for item in ds.FailedSOPSequence)
+        else:
+            failure = []
+        try:
+            await asce.ae.call_handler(asce.ae.on_commitment_response,
+                                       transaction_uid, success, failure)
+        except exceptions.EventHandlingError:
+            rsp.status = int(statuses.PROCESSING_FAILURE)
+        else:
+            await asce.send(rsp, ctx.id)
+
+    async def n_action(self, asce, ctx, msg):
+        instance_uid = STORAGE_COMMITMENT_PUSH_MODEL_SOP_CLASS
+        rsp = dimsemessages.NActionRSPMessage()
+        rsp.message_id_being_responded_to = msg.message_id
+        rsp.action_type_id = 1
+        rsp.sop_class_uid = ctx.sop_class
+        rsp.affected_sop_instance_uid = instance_uid
+        ds = dsutils.decode(msg.data_set, ctx.supported_ts.is_implicit_VR,
+                            ctx.supported_ts.is_little_endian)
+        uids = ((item.ReferencedSOPClassUID, item.ReferencedSOPInstanceUID)
+                for item in ds.ReferencedSOPSequence)
+        try:
+            remote_ae, success, failure = await asce.ae.call_handler(
+                asce.ae.on_commitment_request, asce.remote_ae, uids
+            )
+        except exceptions.EventHandlingError:
+            rsp.status = int(statuses.PROCESSING_FAILURE)
+            await asce.send(rsp, ctx.id)
+            return
+
+        rsp.status = int(statuses.SUCCESS)
+        await asce.send(rsp, ctx.id)
+
+        report = dimsemessages.NEventReportRQMessage()
+        report.sop_class_uid = ctx.sop_class
+        report.affected_sop_instance_uid = instance_uid
+        report.event_type_id = 2 if failure else 1
+
+        report_ds = _dicom.Dataset()
+        report_ds.TransactionUID = ds.TransactionUID
+        if success:
+            seq = []
+            for sop_class_uid, sop_instance_uid in success:
+                ref = _dicom.Dataset()
+                ref.ReferencedSOPClassUID = sop_class_uid
+                ref.ReferencedSOPInstanceUID = sop_instance_uid
+                seq.append(ref)
+            report_ds.ReferencedSOPSequence = _dicom.Sequence(seq)
+
+        if failure:
+            seq = []
+            for sop_class_uid, sop_instance_uid, reason in failure:
+                ref = _dicom.Dataset()
+                ref.ReferencedSOPClassUID = sop_class_uid
+                ref.ReferencedSOPInstanceUID = sop_instance_uid
+                ref.FailureReason = reason
+                seq.append(ref)
+            report_ds.FailedSOPSequence = _dicom.Sequence(seq)
+
+        report.data_set = dsutils.encode(report_ds,
+                                         ctx.supported_ts.is_implicit_VR,
+                                         ctx.supported_ts.is_little_endian)
+
+        async with asce.ae.request_association(remote_ae) as assoc:
+            await assoc.send(report, ctx.id)
+            await assoc.receive()  # response is ignored
+
+
+@sop_classes([STORAGE_COMMITMENT_SOP_CLASS])
+async def storage_commitment_scu(asce, ctx, transaction_uid, uids, msg_id):
+    """Sends Storage Commitment request.
+
+    :param transaction_uid: Transaction UID
+    :param uids: iterable of tuples (SOP Class UID, SOP Instance UID)
+    :param msg_id: message ID
+    :return: status in response message
+    """
+    rq = dimsemessages.NActionRQMessage()
+    rq.message_id = msg_id
+    rq.action_type_id = 1
+    rq.sop_class_uid = ctx.sop_class
+    rq.requested_sop_instance_uid = STORAGE_COMMITMENT_PUSH_MODEL_SOP_CLASS
+
+    ds = _dicom.Dataset()
+    ds.TransactionUID = transaction_uid
+    seq = []
+    for sop_class_uid, sop_instance_uid in uids:
+        ref = _dicom.Dataset()
+        ref.ReferencedSOPClassUID = sop_class_uid
+        ref.ReferencedSOPInstanceUID = sop_instance_uid
+        seq.append(ref)
+
+    ds.ReferencedSOPSequence = _dicom.Sequence(seq)
+
+    rq.data_set = dsutils.encode(ds, ctx.supported_ts.is_implicit_VR,
+                                 ctx.supported_ts.is_little_endian)
+    await asce.send(rq, ctx.id)
+
+    rsp, _ = await asce.receive()
+    return statuses.Status(rsp.status, dimsemessages.NActionRSPMessage)
@@ -7,22 +7,33 @@
 from __future__ import absolute_import, unicode_literals
 
 import threading
-import tempfile
 import platform
+import select
+import socket
+import struct
 import copy
 import contextlib
 
 from itertools import count
 from threading import Lock
 
-from six.moves import socketserver, zip
+from six.moves import queue, socketserver, zip
+
+try:
+    import selectors
+except ImportError:  # Python 2.7
+    selectors = None
 
 
 from . import _dicom
 from . import sopclass
 from . import asceprovider
+from . import dsutils
+from . import dulprovider
 from . import exceptions
+from . import pdu
 from . import statuses
+from . import timer
 
 
 # current implementation UID. Generated by pydicom
@@ -67,7 +78,26 @@ class AEBase(object):
                          application entity. This attribute defaults to
                          :attr:`~netdicom2.applicationentity.AEBase.default_ts`.
     :ivar timeout: Connection timeout in seconds. Default value is 15.
+    :ivar connect_timeout: Number of seconds to wait for transport connection
+                           to remote AE. ``None`` means ``timeout``.
+    :ivar dimse_timeout: Number of seconds to wait for the next PDU of DIMSE
+                         message (e.g. for the response to the request).
+                         ``None`` means ``timeout``.
+    :ivar idle_timeout: Number of seconds incoming association could stay
+                        idle before AE requests its release. ``None`` means
+                        ``timeout``.
+    :ivar timer_wheel: :class:`~netdicom2.timer.TimerWheel` instance that
+                       keeps ARTIM timers and timeouts of all associations of
+                       the AE.
     :ivar max_pdu_length: Maximum size of PDU in bytes.
+    :ivar max_ops_invoked: Maximum number of outstanding operations AE
+                           invokes on a single association (Asynchronous
+                           Operations Window, PS 3.7 D.3.3.3). Zero means
+                           unlimited. Default value is 1, which means that
+                           window is not negotiated.
+    :ivar max_ops_performed: Maximum number of outstanding operations AE
+                             performs on a single association. Zero means
+                             unlimited. Default value is 1.
     :ivar supported_scu: Dictionary that maps Abstract syntax UIDs to specific
                          services that are support in SCU role.
                          This attribute is populated by adding services using
@@ -83,6 +113,10 @@ class AEBase(object):
                          of the full AE class
                          This attribute is intended for **read-only** use by
                          class clients.
+    :ivar config_version: Number that is incremented every time presentation
+                          context definition list changes (when services are
+                          added). Associations requested after the change
+                          propose updated presentation contexts and roles.
 
     """
     default_ts = [_dicom.ExplicitVRLittleEndian, _dicom.ImplicitVRLittleEndian,
@@ -91,19 +125,79 @@ class AEBase(object):
     Default list of supported transfer syntaxes.
     """
 
+    dul_provider = dulprovider.DULServiceProvider
+    """
+    DUL service provider class that is used by associations of this AE.
+    Set it to :class:`~netdicom2.dulprovider.EventDrivenDULServiceProvider`
+    to avoid polling network socket in idle associations.
+    """
+
+    spool_max_size = 1048576
+    """
+    Maximum size in bytes of received dataset that is kept in memory.
+    Larger datasets are transparently spilled to a temporary file. This
+    applies to files returned by default implementation of
+    :meth:`~netdicom2.applicationentity.AEBase.get_file` and to datasets
+    that are not stored in file, in which case message dataset becomes a file
+    object (:func:`~netdicom2.dsutils.decode` accepts both). ``None`` turns
+    spooling off: files are always on disk and other datasets are always in
+    memory.
+    """
+
+    digest_algorithms = ()
+    """
+    Names of ``hashlib`` algorithms (e.g. ``('sha256',)``) that are computed
+    over data sets of sent C-STORE requests and of all received messages.
+    Digests are computed from fragments as they pass to or from the network
+    and are available as ``digests`` of the received message and of the
+    status returned by :func:`~netdicom2.sopclass.storage_scu`. Data sets
+    that are stored in regular files are read instead of being sent with
+    ``sendfile`` when digests are enabled.
+    """
+
+    max_store_header_length = 65536
+    """
+    Maximum number of bytes of incoming C-STORE dataset that are buffered
+    until leading elements are passed to
+    :meth:`~netdicom2.applicationentity.AEBase.on_store_header`.
+    """
+
+    store_deflated = False
+    """
+    If ``True``, datasets received over Deflated Explicit VR Little Endian
+    presentation context are written to files and sinks as they were received
+    (still compressed) and file meta information has deflated transfer
+    syntax. Otherwise datasets are inflated as they are received and files get
+    Explicit VR Little Endian transfer syntax. Datasets that are kept in
+    memory (or spooled) are always inflated.
+
+    Deflated transfer syntax is not in
+    :attr:`~netdicom2.applicationentity.AEBase.default_ts`, add
+    ``uids.DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN`` to ``supported_ts`` of the AE
+    to negotiate it. Requester proposes it before other transfer syntaxes.
+    """
+
     def __init__(self, supported_ts, max_pdu_length):
         if supported_ts is None:
             supported_ts = self.default_ts
 
         self.supported_ts = frozenset(supported_ts)
         self.timeout = 15
+        self.connect_timeout = None
+        self.dimse_timeout = None
+        self.idle_timeout = None
+        self.timer_wheel = timer.TimerWheel()
         self.max_pdu_length = max_pdu_length
+        self.max_ops_invoked = 1
+        self.max_ops_performed = 1
 
         self.context_def_list = {}
         self.store_in_file = set()
         self.supported_scu = {}
         self.supported_scp = {}
         self.lock = Lock()
+        self.config_version = 0
+        self._request_template = None
 
     def add_scu(self, service, sop_classes=None):
         """Adds service as SCU to the AE.
@@ -132,12 +226,41 @@ class AEBase(object):
         :param store_in_file: indicates if incoming datasets for these SOP
                               Classes should be stored in file.
         """
-        start = max(self.context_def_list.keys()) if self.context_def_list \
-            else 1
+        with self.lock:
+            start = max(self.context_def_list.keys()) \
+                if self.context_def_list else 1
 
-        self.context_def_list.update(
-            self._build_context_def_list(sop_classes, start, store_in_file)
-        )
+            self.context_def_list.update(
+                self._build_context_def_list(sop_classes, start,
+                                             store_in_file)
+            )
+            self.config_version += 1
+
+    def request_template(self):
+        """Returns encoded parts of A-ASSOCIATE-RQ PDU for this AE.
+
+        Application context, presentation contexts and user information
+        sub-items that depend only on AE configuration are encoded once and
+        are reused by all requested associations. Template is rebuilt when
+        services are added (see ``config_version``), or maximum PDU length
+        or operations window of the AE changes.
+
+        .. note::
+
+            This method is tread-safe.
+
+        :return: :class:`~netdicom2.asceprovider.RequestTemplate` instance
+        """
+        with self.lock:
+            template = self._request_template
+            if template is None \
+                    or template.version != self.config_version \
+                    or template.max_pdu_length != self.max_pdu_length \
+                    or template.operations_window != (
+                        self.max_ops_invoked, self.max_ops_performed):
+                template = asceprovider.build_request_template(self)
+                self._request_template = template
+            return template
 
     def copy_context_def_list(self):
         """Makes a shallow copy of presentation context definition list.
@@ -190,15 +313,18 @@ class AEBase(object):
         `self.store_in_file` set. Method itself does not own the file object.
         So it's service implementation responsibility to close the file after
         it's done when handling received message.
-        Default implementation is based on temporary file. User may choose
-        to override this method to provide a permanent storage for dataset.
+        Default implementation is based on spooled temporary file, that is
+        kept in memory until it grows larger than
+        :attr:`~netdicom2.applicationentity.AEBase.spool_max_size`. User may
+        choose to override this method to provide a permanent storage for
+        dataset.
 
         :param context: presentation context
         :param command_set: command dataset of the received message
         :return: file where association can store received dataset and file
                  starting position.
         """
-        tmp = tempfile.TemporaryFile()
+        tmp = dsutils.spooled_file(self.spool_max_size)
         start = tmp.tell()
         try:
             write_meta(tmp, command_set, context.supported_ts)
@@ -208,6 +334,61 @@ class AEBase(object):
         else:
             return tmp, start
 
+    def get_sink(self, context, command_set, header):
+        """Returns sink that receives incoming C-STORE dataset.
+
+        Method is called after
+        :meth:`~netdicom2.applicationentity.AEBase.on_store_header`, if it
+        returned ``None``. If method returns a sink (see
+        :mod:`~netdicom2.sinks`), dataset fragments are passed to the sink as
+        they are received, instead of being stored in file or memory, and
+        :func:`~netdicom2.sopclass.storage_scp` responds with the status
+        returned by sink ``end`` method (``on_receive_store`` is not called).
+
+        Default implementation returns ``None``.
+
+        :param context: presentation context (contains ID, SOP Class UID and
+                        Transfer Syntax)
+        :param command_set: command dataset of the received message
+        :param header: dataset with leading elements
+        :return: sink or ``None``
+        """
+        return None
+
+    def on_store_header(self, context, command_set, header):
+        """Early processing of the incoming C-STORE dataset.
+
+        Method is called as soon as leading top-level elements of the dataset
+        (everything before Pixel Data, up to
+        :attr:`~netdicom2.applicationentity.AEBase.max_store_header_length`
+        bytes) are received, so instance could be rejected before the bulk
+        of the dataset is transferred and stored.
+
+        Method may return:
+
+            * ``None`` - dataset is received as usual (this is what default
+              implementation does)
+            * status code - rest of the dataset is discarded as it arrives,
+              status is sent in C-STORE response and ``on_receive_store`` is
+              not called. Failure status rejects instance, success or warning
+              status acknowledges it without storing.
+            * tuple (file, starting position) - dataset is written to the
+              provided file instead of the one from
+              :meth:`~netdicom2.applicationentity.AEBase.get_file`, file
+              should already contain file meta information (see
+              :func:`~netdicom2.applicationentity.write_meta`).
+
+        If method raises :class:`~netdicom2.exceptions.EventHandlingError`
+        instance is rejected with ``CANNOT_UNDERSTAND`` status.
+
+        :param context: presentation context (contains ID, SOP Class UID and
+                        Transfer Syntax)
+        :param command_set: command dataset of the received message
+        :param header: dataset with leading elements
+        :return: ``None``, status or tuple with file and starting position
+        """
+        return None
+
     def on_association_request(self, assoc):
         """Extra processing of the association request.
 
@@ -357,6 +538,16 @@ class AE(AEBase, socketserver.ThreadingTCPServer):
     :param max_pdu_length: maximum PDU length in bytes (defaults to 64kb).
     """
 
+    daemon_threads = True
+    allow_reuse_address = True  # should be set before socket is bound
+
+    reuse_port = False
+    """
+    Set ``SO_REUSEPORT`` option on the listening socket, so several processes
+    could listen on the same port (see :doc:`processpool`). Attribute should
+    be set before AE instance is created.
+    """
+
     def __init__(self, ae_title, port, supported_ts=None, max_pdu_length=65536):
         """Initializes new AE instance."""
         socketserver.ThreadingTCPServer.__init__(
@@ -366,12 +557,14 @@ class AE(AEBase, socketserver.ThreadingTCPServer):
         )
         AEBase.__init__(self, supported_ts, max_pdu_length)
 
-        self.daemon_threads = True
-        self.allow_reuse_address = True
-
         self.local_ae = {'address': platform.node(), 'port': port,
                          'aet': ae_title}
 
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        socketserver.ThreadingTCPServer.server_bind(self)
+
     def add_scp(self, service):
         """Adds service as SCP to the AE.
 
@@ -398,3 +591,255 @@ class AE(AEBase, socketserver.ThreadingTCPServer):
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.quit()
+
+
+class WorkerPoolAE(AE):
+    """Application entity that handles associations with a fixed number of
+    worker threads.
+
+    :class:`~netdicom2.applicationentity.AE` starts a new thread for every
+    incoming connection, so a burst of association requests results in a
+    burst of threads. This AE hands accepted connections over to a fixed
+    pool of workers instead. At most ``max_associations`` connections are
+    admitted at a time (handled by workers or waiting in the queue for a free
+    worker). Requests over the limit are rejected right away with
+    A-ASSOCIATE-RJ (rejected-transient, local-limit-exceeded), so remote AE
+    could retry later instead of waiting for a timeout.
+
+    Every admitted association still has its own DUL service provider
+    thread, so ``max_associations`` also limits number of those.
+
+    :param ae_title: AE title (up to 16 characters)
+    :param port: port that AE listens on for incoming connection
+    :param supported_ts: list of transfer syntaxes supported by AE
+    :param max_pdu_length: maximum PDU length in bytes (defaults to 64kb).
+    :param workers: number of worker threads
+    :param max_associations: maximum number of admitted connections,
+                             defaults to number of workers
+    :param backlog: size of the listening socket accept queue
+
+    :ivar accepted_associations: total number of admitted connections
+    :ivar rejected_associations: total number of connections rejected because
+                                 of the limit
+    """
+
+    reject_timeout = 5
+    """
+    Number of seconds to wait for A-ASSOCIATE-RQ from the connection that
+    is rejected because of the limit.
+    """
+
+    reject_poll_interval = 0.05
+    """
+    Number of seconds rejecting thread waits for data on rejected connections
+    before it checks for new ones.
+    """
+
+    def __init__(self, ae_title, port, supported_ts=None, max_pdu_length=65536,
+                 workers=8, max_associations=None, backlog=128):
+        """Initializes new WorkerPoolAE instance."""
+        self.request_queue_size = backlog  # used when socket starts listening
+        super(WorkerPoolAE, self).__init__(ae_title, port, supported_ts,
+                                           max_pdu_length)
+        self.workers = workers
+        self.max_associations = max_associations or workers
+        self.accepted_associations = 0
+        self.rejected_associations = 0
+
+        self._active = 0
+        self._busy = 0
+        self._counters_lock = Lock()
+        self._requests = queue.Queue()
+        self._rejects = queue.Queue()
+        self._workers = []
+
+    @property
+    def active_associations(self):
+        """Number of admitted connections (handled or waiting for a
+        worker)."""
+        return self._active
+
+    @property
+    def busy_workers(self):
+        """Number of workers that are handling connections."""
+        return self._busy
+
+    @property
+    def queue_depth(self):
+        """Number of admitted connections waiting for a free worker."""
+        return self._requests.qsize()
+
+    def serve_forever(self, *args, **kwargs):
+        # workers are started here rather than in initializer, so AE could
+        # be created before worker processes are forked (see processpool)
+        if not self._workers:
+            self._workers = [threading.Thread(target=self._work)
+                             for _ in range(self.workers)]
+            self._workers.append(threading.Thread(target=self._reject_loop))
+            for thread in self._workers:
+                thread.daemon = True
+                thread.start()
+        super(WorkerPoolAE, self).serve_forever(*args, **kwargs)
+
+    def process_request(self, request, client_address):
+        with self._counters_lock:
+            admitted = self._active < self.max_associations
+            if admitted:
+                self._active += 1
+                self.accepted_associations += 1
+            else:
+                self.rejected_associations += 1
+        if admitted:
+            self._requests.put((request, client_address))
+        else:
+            self._rejects.put(request)
+
+    def server_close(self):
+        super(WorkerPoolAE, self).server_close()
+        if self._workers:
+            for _ in range(self.workers):
+                self._requests.put(None)
+            self._rejects.put(None)
+            self._workers = []
+
+    def _work(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                break
+            request, client_address = item
+            with self._counters_lock:
+                self._busy += 1
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self._counters_lock:
+                    self._busy -= 1
+                    self._active -= 1
+
+    def _reject_loop(self):
+        # rejects are handled by the single thread, so burst of connections
+        # over the limit does not spawn threads either. Connections are
+        # non-blocking and are waited for at once, so silent or slow remote
+        # AE does not hold up others.
+        selector = selectors.DefaultSelector() if selectors else None
+        pending = []
+        try:
+            while True:
+                try:
+                    while True:
+                        request = self._rejects.get(block=not pending)
+                        if request is None:
+                            return
+                        rejected = self._add_reject(selector, request)
+                        if rejected is not None:
+                            pending.append(rejected)
+                except queue.Empty:
+                    pass
+
+                try:
+                    readable = self._wait_rejects(selector, pending)
+                except Exception:
+                    # connections could not be watched, they are closed
+                    # rather than left hanging
+                    self.handle_error(None, None)
+                    readable, expired = set(), set(pending)
+                else:
+                    now = timer.monotonic()
+                    expired = set(r for r in pending if now > r.deadline)
+                waiting = []
+                for rejected in pending:
+                    try:
+                        done = rejected in expired or \
+                            rejected in readable and rejected.read()
+                    except (socket.error, socket.timeout):
+                        done = True  # remote AE is gone, nothing to reject
+                    except Exception:
+                        self.handle_error(rejected.request, None)
+                        done = True
+                    if done:
+                        self._close_reject(selector, rejected)
+                    else:
+                        waiting.append(rejected)
+                pending = waiting
+        finally:
+            for rejected in pending:
+                self._close_reject(selector, rejected)
+            if selector is not None:
+                selector.close()
+
+    def _add_reject(self, selector, request):
+        try:
+            rejected = _RejectedConnection(
+                request, timer.monotonic() + self.reject_timeout)
+            if selector is not None:
+                selector.register(request, selectors.EVENT_READ, rejected)
+            return rejected
+        except Exception:
+            self.handle_error(request, None)
+            self.shutdown_request(request)
+            return None
+
+    def _close_reject(self, selector, rejected):
+        if selector is not None:
+            try:
+                selector.unregister(rejected.request)
+            except (KeyError, ValueError):
+                pass
+        self.shutdown_request(rejected.request)
+
+    def _wait_rejects(self, selector, pending):
+        if selector is not None:
+            events = selector.select(self.reject_poll_interval)
+            return set(key.data for key, _ in events)
+        # Python 2.7, number of connections is limited by FD_SETSIZE
+        readable = select.select([r.request for r in pending], [], [],
+                                 self.reject_poll_interval)[0]
+        return set(r for r in pending if r.request in readable)
+
+
+class _RejectedConnection(object):
+    """Connection that is rejected because of the association limit.
+
+    A-ASSOCIATE-RQ has to be read first, closing socket with unread data
+    could reset connection before reject is delivered. Request is read as it
+    arrives on the non-blocking socket.
+    """
+
+    header = struct.Struct('>B B I')
+
+    def __init__(self, request, deadline):
+        request.setblocking(False)
+        self.request = request
+        self.deadline = deadline
+        self._header = b''
+        self._remaining = None
+
+    def read(self):
+        """Reads available data and rejects association once the whole
+        A-ASSOCIATE-RQ is received.
+
+        :return: ``True`` if connection is done with
+        """
+        data = self.request.recv(65536)
+        if not data:
+            return True
+        if self._remaining is None:
+            self._header += data
+            if len(self._header) < self.header.size:
+                return False
+            pdu_type, _, length = self.header.unpack_from(self._header)
+            if pdu_type != pdu.AAssociateRqPDU.pdu_type:
+                return True
+            self._remaining = self.header.size + length - len(self._header)
+        else:
+            self._remaining -= len(data)
+        if self._remaining > 0:
+            return False
+        reject = pdu.AAssociateRjPDU(result=2, source=3, reason_diag=2)
+        # reject is short enough for the empty socket buffer
+        self.request.send(reject.encode())
+        return True
@@ -9,19 +9,27 @@ from __future__ import absolute_import, unicode_literals
 
 # This module provides association services
 import collections
+import copy
 import functools
+import threading
 import time
+import zlib
+
+try:
+    from concurrent import futures
+except ImportError:  # Python 2.7 without futures backport
+    futures = None
 
 import six
 from six.moves import socketserver, range
 
 from . import _dicom
 from . import exceptions
-from . import dulprovider
 from . import dimsemessages
 from . import dsutils
 
 from . import pdu
+from . import statuses
 from . import userdataitems
 
 PContextDef = collections.namedtuple(
@@ -37,12 +45,568 @@ def build_pres_context_def_list(context_def_list):
     return (
         pdu.PresentationContextItemRQ(
             pc_id, pdu.AbstractSyntaxSubItem(ctx.sop_class),
-            [pdu.TransferSyntaxSubItem(i) for i in ctx.supported_ts]
+            # deflated transfer syntax is proposed first, so it is
+            # preferred by acceptor if it is supported by both sides
+            [pdu.TransferSyntaxSubItem(i) for i in
+             sorted(ctx.supported_ts,
+                    key=lambda ts: not dsutils.is_deflated(ts))]
         )
         for pc_id, ctx in six.iteritems(context_def_list)
     )
 
 
+def check_dul_message(dul_msg):
+    """Checks PDU received from DUL service provider.
+
+    :param dul_msg: received PDU
+    :return: PDU if it is P-DATA-TF or A-ASSOCIATE-AC
+    :raise exceptions.AssociationReleasedError: if A-RELEASE-RQ was received
+    :raise exceptions.AssociationAbortedError: if A-ABORT was received
+    :raise exceptions.AssociationRejectedError: if A-ASSOCIATE-RJ was received
+    """
+    if dul_msg.pdu_type == pdu.PDataTfPDU.pdu_type\
+            or dul_msg.pdu_type == pdu.AAssociateAcPDU.pdu_type:
+        return dul_msg
+    elif dul_msg.pdu_type == pdu.AReleaseRqPDU.pdu_type:
+        raise exceptions.AssociationReleasedError()
+    elif dul_msg.pdu_type == pdu.AAbortPDU.pdu_type:
+        raise exceptions.AssociationAbortedError(dul_msg.source,
+                                                 dul_msg.reason_diag)
+    elif dul_msg.pdu_type == pdu.AAssociateRjPDU.pdu_type:
+        raise exceptions.AssociationRejectedError(
+            dul_msg.result, dul_msg.source, dul_msg.reason_diag)
+    else:
+        raise exceptions.NetDICOMError()
+
+
+def command_set_to_message(command_set):
+    """Creates DIMSE message instance from decoded command set.
+
+    :param command_set: decoded command dataset
+    :return: DIMSE message
+    """
+    command_field = command_set[(0x0000, 0x0100)].value
+    msg_type = dimsemessages.MESSAGE_TYPE[command_field]
+    msg = msg_type(command_set)
+    return msg
+
+
+class MessageAssembler(object):
+    """Assembles DIMSE message from received presentation data values.
+
+    Assembler is fed with PDV items one by one (see
+    :meth:`~netdicom2.asceprovider.MessageAssembler.feed`) until the message is
+    complete. Dataset of messages with SOP Class that is listed in
+    application entity ``store_in_file`` set is written to the file provided
+    by :meth:`~netdicom2.applicationentity.AEBase.get_file`. Other datasets
+    are kept in memory until they grow larger than AE ``spool_max_size``, and
+    are spilled to temporary file after that.
+
+    Leading elements of C-STORE datasets are decoded as soon as they are
+    received and passed to
+    :meth:`~netdicom2.applicationentity.AEBase.on_store_header`, which decides
+    what to do with the rest of the dataset. Dataset could also be streamed
+    to the sink provided by
+    :meth:`~netdicom2.applicationentity.AEBase.get_sink`.
+
+    If AE has ``digest_algorithms``, digests of the data set are computed
+    from the received fragments and are set to message ``digests``.
+
+    Data set received over Deflated Explicit VR Little Endian presentation
+    context is inflated fragment by fragment. Files and sinks get inflated
+    data set (and presentation context with Explicit VR Little Endian
+    transfer syntax), unless AE ``store_deflated`` is set, in which case
+    they get data set as it was received.
+
+    :param assoc: association that receives message
+    """
+
+    def __init__(self, assoc):
+        self.assoc = assoc
+        self.encoded_command_set = []
+        self.encoded_data_set = []
+        self.command_set_received = False
+        self.data_set_received = False
+        self.no_ds = False
+        self.dataset = None
+        self.start = 0
+        self.pc_id = None
+        self.msg = None
+        self.command_set = None
+        self.data_set_length = 0
+        self.header_parser = None
+        self.early_status = None
+        self.sink = None
+        self.digests = dsutils.Digests(assoc.ae.digest_algorithms) \
+            if assoc.ae.digest_algorithms else None
+        self.context = None  # context passed to AE, see store_deflated
+        self.inflater = None
+        self.header_inflater = None
+        self.raw = False  # file or sink gets data set as it was received
+
+    def feed(self, value_item):
+        """Processes next PDV item.
+
+        :param value_item: received
+                           :class:`~netdicom2.pdu.PresentationDataValueItem`
+        :return: ``True`` if message is complete
+        """
+        self.pc_id = value_item.context_id
+        marker = value_item.control_header
+        if marker in (1, 3):
+            self.encoded_command_set.append(value_item.fragment)
+            if marker == 3:
+                self._on_command_set()
+                return self.no_ds or self.data_set_received
+        elif marker in (0, 2):
+            if marker == 2:
+                self.data_set_received = True
+            if self.digests is not None and self.early_status is None:
+                self.digests.update(value_item.fragment)
+            self._on_data_set_fragment(value_item.fragment, marker == 2)
+            if marker == 2:
+                return self.command_set_received
+        else:
+            raise exceptions.DIMSEProcessingError('Incorrect first PDV byte')
+        return False
+
+    def message(self):
+        """Returns assembled message.
+
+        :return: tuple with DIMSE message and presentation context ID
+        """
+        if self.early_status is not None:
+            self.msg.early_status = self.early_status
+            return self.msg, self.pc_id
+        if self.digests is not None and self.data_set_received:
+            self.msg.digests = self.digests.hexdigests()
+        if self.sink is not None:
+            self.msg.sink = self.sink
+        elif self.data_set_received:
+            if self.dataset:
+                self.dataset.seek(self.start)
+                self.msg.data_set = self.dataset
+            elif self.inflater is not None:
+                self.msg.data_set = self._inflated_data_set()
+            else:
+                self.msg.data_set = b''.join(self.encoded_data_set)
+        return self.msg, self.pc_id
+
+    def abort(self):
+        """Releases resources if message could not be received."""
+        if self.dataset:
+            self.dataset.close()
+        if self.sink is not None:
+            self.sink.abort()
+
+    def _inflated_data_set(self):
+        pieces = self._inflate(b''.join(self.encoded_data_set), True)
+        self.encoded_data_set = []
+        spool_max_size = self.assoc.ae.spool_max_size
+        if spool_max_size is None or \
+                sum(len(p) for p in pieces) <= spool_max_size:
+            return b''.join(pieces)
+        # compressed data set was small enough, but inflated one is not
+        fp = dsutils.spooled_file(spool_max_size)
+        fp.writelines(pieces)
+        fp.seek(0)
+        return fp
+
+    def _on_data_set_fragment(self, fragment, last):
+        if self.early_status is not None:
+            return  # dataset was rejected or skipped, nothing to keep
+        if self.sink is not None:
+            self._write(self.sink.chunk, fragment, last)
+            return
+        if self.dataset:
+            # fragment goes from receive buffer straight to the file
+            self._write(self.dataset.write, fragment, last)
+            return
+        self.encoded_data_set.append(fragment)
+        self.data_set_length += len(fragment)
+        if self.header_parser is not None:
+            header = self._parse_header(fragment, last)
+            if header is None:
+                return
+            self._on_header(header)
+            if self.dataset or self.sink is not None or \
+                    self.early_status is not None:
+                return
+        spool_max_size = self.assoc.ae.spool_max_size
+        if spool_max_size is not None and \
+                self.data_set_length > spool_max_size:
+            # dataset is too large to be kept in memory, spooled dataset
+            # is decoded by services, so it is always inflated
+            self._open_file(dsutils.spooled_file(spool_max_size), 0,
+                            raw=False)
+
+    def _on_command_set(self):
+        ae = self.assoc.ae
+        self.command_set_received = True
+        self.command_set = dsutils.decode(b''.join(self.encoded_command_set),
+                                          True, True)
+
+        self.msg = command_set_to_message(self.command_set)
+        self.no_ds = self.command_set[(0x0000, 0x0800)].value == 0x0101
+        if self.no_ds:
+            return
+        ctx = self.context = self.assoc.accepted_contexts[self.pc_id]
+        if dsutils.is_deflated(ctx.supported_ts):
+            self.inflater = dsutils.Inflater()
+            if not ae.store_deflated:
+                self.context = ctx._replace(
+                    supported_ts=_dicom.ExplicitVRLittleEndian)
+        if self.msg.command_field == dimsemessages.CStoreRQMessage.command_field:
+            self.header_parser = dsutils.HeaderParser(
+                ctx.supported_ts.is_implicit_VR,
+                ctx.supported_ts.is_little_endian,
+                max_length=ae.max_store_header_length)
+            if self.inflater is not None:
+                self.header_inflater = dsutils.Inflater()
+            fragments, self.encoded_data_set = self.encoded_data_set, []
+            for i, fragment in enumerate(fragments):
+                self._on_data_set_fragment(
+                    fragment, self.data_set_received and i == len(fragments) - 1)
+        elif self.msg.sop_class_uid in ae.store_in_file:
+            self._open_file(*ae.get_file(self.context, self.command_set))
+
+    def _on_header(self, header):
+        ae = self.assoc.ae
+        self.header_parser = None
+        self.header_inflater = None
+        try:
+            result = ae.on_store_header(self.context, self.command_set, header)
+        except exceptions.EventHandlingError:
+            result = statuses.C_STORE_CANNON_UNDERSTAND
+        if result is None:
+            sink = ae.get_sink(self.context, self.command_set, header)
+            if sink is not None:
+                self._open_sink(sink, header)
+            elif self.msg.sop_class_uid in ae.store_in_file:
+                self._open_file(*ae.get_file(self.context, self.command_set))
+        elif isinstance(result, tuple):
+            self._open_file(*result)
+        else:
+            self.early_status = result
+            self.encoded_data_set = []
+
+    def _parse_header(self, fragment, last):
+        if self.header_inflater is None:
+            return self.header_parser.feed(fragment, last)
+        # header is parsed from inflated data, while received fragments are
+        # kept until it is known where they go
+        pieces = self._inflate(fragment, last, self.header_inflater)
+        for i, piece in enumerate(pieces):
+            header = self.header_parser.feed(piece,
+                                             last and i == len(pieces) - 1)
+            if header is not None:
+                return header
+        return None
+
+    def _open_sink(self, sink, header):
+        sink.begin(self.context, self.command_set, header)
+        self.sink = sink
+        self.raw = self.assoc.ae.store_deflated
+        self._replay(sink.chunk)
+
+    def _open_file(self, fp, start, raw=None):
+        self.dataset, self.start = fp, start
+        self.raw = self.assoc.ae.store_deflated if raw is None else raw
+        self._replay(fp.write)
+
+    def _replay(self, write):
+        fragments, self.encoded_data_set = self.encoded_data_set, []
+        for i, fragment in enumerate(fragments):
+            self._write(write, fragment,
+                        self.data_set_received and i == len(fragments) - 1)
+
+    def _write(self, write, fragment, last):
+        if self.inflater is None or self.raw:
+            write(fragment)
+            return
+        for piece in self._inflate(fragment, last):
+            write(piece)
+
+    def _inflate(self, fragment, last, inflater=None):
+        try:
+            return (inflater or self.inflater).inflate(fragment, last)
+        except zlib.error as e:
+            raise exceptions.DIMSEProcessingError(
+                'Invalid deflated data set: {0}'.format(e))
+
+
+def deflate_on_context(assoc, dimse_msg, pc_id):
+    """Enables data set compression of the message that is sent over
+    Deflated Explicit VR Little Endian presentation context.
+
+    Message ``deflate`` attribute is only changed if it was not set
+    explicitly.
+
+    :param assoc: association that sends message
+    :param dimse_msg: DIMSE message
+    :param pc_id: presentation context ID
+    """
+    if dimse_msg.deflate is None:
+        ctx = assoc.accepted_contexts.get(pc_id)
+        dimse_msg.deflate = ctx is not None and \
+            dsutils.is_deflated(ctx.supported_ts)
+
+
+def operations_window(local, remote):
+    """Negotiates number of outstanding operations.
+
+    :param local: number of operations supported by local AE
+    :param remote: number of operations proposed by remote AE
+    :return: negotiated number of operations, zero means unlimited
+    """
+    if not local:
+        return remote
+    if not remote:
+        return local
+    return min(local, remote)
+
+
+def operations_window_items(ae):
+    """Builds user information sub-items that propose AE operations window.
+
+    :param ae: local application entity
+    :return: list with
+             :class:`~netdicom2.userdataitems.AsynchronousOperationsWindowSubItem`
+             or empty list if AE does not support asynchronous operations
+    """
+    if ae.max_ops_invoked == 1 and ae.max_ops_performed == 1:
+        return []
+    return [userdataitems.AsynchronousOperationsWindowSubItem(
+        ae.max_ops_invoked, ae.max_ops_performed)]
+
+
+def operations_window_from_response(response):
+    """Extracts negotiated operations window from A-ASSOCIATE-AC PDU.
+
+    :param response: received A-ASSOCIATE-AC PDU
+    :return: tuple with maximum number of operations that requester could
+             invoke and perform
+    """
+    for item in response.variable_items[-1].user_data:
+        if isinstance(item, userdataitems.AsynchronousOperationsWindowSubItem):
+            return item.max_num_ops_performed, item.max_num_ops_invoked
+    return 1, 1
+
+
+def negotiate_association(ae, assoc_req):
+    """Analyses association request and builds A-ASSOCIATE-AC response.
+
+    Presentation context is accepted if its abstract syntax is supported by
+    AE as SCP and one of the proposed transfer syntaxes is supported by AE.
+    If requester proposes Asynchronous Operations Window, window is limited
+    by :attr:`max_ops_invoked` and :attr:`max_ops_performed` of the AE.
+
+    :param ae: local application entity
+    :param assoc_req: received A-ASSOCIATE-RQ PDU
+    :return: tuple with A-ASSOCIATE-AC PDU, remote maximum PDU length,
+             dictionary of accepted presentation contexts and tuple with
+             maximum number of operations acceptor could invoke and perform
+    """
+    user_items = assoc_req.variable_items[-1]
+    max_pdu_length = user_items.user_data[0].maximum_length_received
+    accepted_contexts = {}
+    ops_window = (1, 1)
+    user_data = []
+    for item in user_items.user_data:
+        if isinstance(item, userdataitems.AsynchronousOperationsWindowSubItem):
+            ops_window = (
+                operations_window(ae.max_ops_invoked,
+                                  item.max_num_ops_performed),
+                operations_window(ae.max_ops_performed,
+                                  item.max_num_ops_invoked)
+            )
+            item = userdataitems.AsynchronousOperationsWindowSubItem(
+                *ops_window)
+        user_data.append(item)
+
+    # analyse proposed presentation contexts
+    rsp = [assoc_req.variable_items[0]]
+    requested = (
+        (item.context_id, item.abs_sub_item.name, item.ts_sub_items)
+        for item in assoc_req.variable_items[1:-1]
+    )
+
+    for pc_id, proposed_sop, proposed_ts in requested:
+        if proposed_sop not in ae.supported_scp:
+            # refuse sop class because of SOP class not supported
+            rsp.append(
+                pdu.PresentationContextItemAC(
+                    pc_id, 1, pdu.TransferSyntaxSubItem(''))
+            )
+            continue
+
+        for ts in proposed_ts:
+            if ts.name in ae.supported_ts:
+                rsp.append(pdu.PresentationContextItemAC(pc_id, 0, ts))
+                accepted_contexts[pc_id] = PContextDef(
+                    pc_id, proposed_sop, _dicom.UID(ts.name)
+                )
+                break
+        else:  # Refuse sop class because of TS not supported
+            rsp.append(
+                pdu.PresentationContextItemAC(
+                    pc_id, 1, pdu.TransferSyntaxSubItem(''))
+            )
+
+    rsp.append(pdu.UserInformationItem(user_data))
+    res = pdu.AAssociateAcPDU(
+        called_ae_title=assoc_req.called_ae_title,
+        calling_ae_title=assoc_req.calling_ae_title,
+        variable_items=rsp
+    )
+    return res, max_pdu_length, accepted_contexts, ops_window
+
+
+def _user_identity_items(remote_ae):
+    username = remote_ae.get('username')
+    password = remote_ae.get('password')
+    if username and password:
+        return [userdataitems.UserIdentityNegotiationSubItem(username,
+                                                             password)]
+    elif username:
+        return [userdataitems.UserIdentityNegotiationSubItem(
+            username, user_identity_type=1)]
+    return []
+
+
+def build_association_request(local_ae, remote_ae, mp, pcdl, users_pdu=None):
+    """Builds A-ASSOCIATE-RQ PDU.
+
+    :param local_ae: local AE parameters
+    :param remote_ae: remote AE parameters
+    :param mp: maximum PDU length
+    :param pcdl: presentation context definition list
+    :param users_pdu: additional user information sub-items
+    :return: A-ASSOCIATE-RQ PDU
+    """
+    max_pdu_length_par = userdataitems.MaximumLengthSubItem(mp)
+    user_information = [max_pdu_length_par] + users_pdu \
+        if users_pdu else [max_pdu_length_par]
+    user_information.extend(_user_identity_items(remote_ae))
+
+    variable_items = [pdu.ApplicationContextItem(APPLICATION_CONTEXT_NAME)]
+    variable_items.extend(build_pres_context_def_list(pcdl))
+    variable_items.append(pdu.UserInformationItem(user_information))
+    assoc_rq = pdu.AAssociateRqPDU(
+        called_ae_title=remote_ae['aet'],
+        calling_ae_title=local_ae['aet'],
+        variable_items=variable_items
+    )
+    # FIXME pass parameter properly
+    assoc_rq.called_presentation_address = (remote_ae['address'],
+                                            remote_ae['port'])
+    return assoc_rq
+
+
+RequestTemplate = collections.namedtuple(
+    'RequestTemplate',
+    ['version', 'max_pdu_length', 'operations_window', 'context_def_list',
+     'items', 'user_data']
+)
+"""Encoded parts of A-ASSOCIATE-RQ PDU that depend only on AE configuration.
+
+    * ``version`` - AE configuration version template was built for
+    * ``max_pdu_length`` - proposed maximum PDU length
+    * ``operations_window`` - tuple with proposed maximum number of
+      operations invoked and performed
+    * ``context_def_list`` - presentation context definition list
+    * ``items`` - :class:`~netdicom2.pdu.EncodedItems` with application context
+      and presentation context items
+    * ``user_data`` - :class:`~netdicom2.userdataitems.EncodedSubItems` with
+      maximum length, SCP/SCU role selection and asynchronous operations
+      window sub-items
+"""
+
+
+def build_request_template(ae):
+    """Builds A-ASSOCIATE-RQ template for the current AE configuration.
+
+    Caller should hold AE lock.
+
+    :param ae: local application entity
+    :return: :class:`~netdicom2.asceprovider.RequestTemplate` instance
+    """
+    pcdl = copy.copy(ae.context_def_list)
+    items = [pdu.ApplicationContextItem(APPLICATION_CONTEXT_NAME)]
+    items.extend(build_pres_context_def_list(pcdl))
+    user_data = [userdataitems.MaximumLengthSubItem(ae.max_pdu_length)]
+    user_data.extend(userdataitems.ScpScuRoleSelectionSubItem(uid, 0, 1)
+                     for uid in ae.supported_scp.keys())
+    user_data.extend(operations_window_items(ae))
+    return RequestTemplate(
+        version=ae.config_version,
+        max_pdu_length=ae.max_pdu_length,
+        operations_window=(ae.max_ops_invoked, ae.max_ops_performed),
+        context_def_list=pcdl,
+        items=pdu.EncodedItems(b''.join(i.encode() for i in items)),
+        user_data=userdataitems.EncodedSubItems(
+            b''.join(i.encode() for i in user_data))
+    )
+
+
+def association_request_from_template(template, local_ae, remote_ae,
+                                      users_pdu=None):
+    """Builds A-ASSOCIATE-RQ PDU from template.
+
+    Only AE titles and user information sub-items that are specific to
+    the remote AE (custom user data and user identity) are encoded, the
+    rest of the PDU is copied from template.
+
+    :param template: :class:`~netdicom2.asceprovider.RequestTemplate` instance
+    :param local_ae: local AE parameters
+    :param remote_ae: remote AE parameters
+    :param users_pdu: additional user information sub-items
+    :return: A-ASSOCIATE-RQ PDU
+    """
+    user_information = [template.user_data]
+    if users_pdu:
+        user_information.extend(users_pdu)
+    user_information.extend(_user_identity_items(remote_ae))
+    assoc_rq = pdu.AAssociateRqPDU(
+        called_ae_title=remote_ae['aet'],
+        calling_ae_title=local_ae['aet'],
+        variable_items=[template.items,
+                        pdu.UserInformationItem(user_information)]
+    )
+    assoc_rq.called_presentation_address = (remote_ae['address'],
+                                            remote_ae['port'])
+    return assoc_rq
+
+
+def accepted_contexts_from_response(response, pcdl):
+    """Extracts negotiated parameters from A-ASSOCIATE-AC PDU.
+
+    :param response: received A-ASSOCIATE-AC PDU
+    :param pcdl: presentation context definition list used in request
+    :return: tuple with remote maximum PDU length and dictionary of accepted
+             presentation contexts
+    """
+    user_data = response.variable_items[-1].user_data
+    try:
+        max_pdu_length = user_data[0].maximum_length_received
+    except IndexError:
+        max_pdu_length = 16000
+
+    accepted = (ctx for ctx in response.variable_items[1:-1]
+                if ctx.result_reason == 0)
+    accepted_contexts = {}
+    for ctx in accepted:
+        pc_id = ctx.context_id
+        sop_class = pcdl[ctx.context_id].sop_class
+        ts_uid = _dicom.UID(ctx.ts_sub_item.name)
+        accepted_contexts[pc_id] = PContextDef(pc_id, sop_class, ts_uid)
+    return max_pdu_length, accepted_contexts
+
+
+def _timeout(value, default):
+    return default if value is None else value
+
+
 class Association(object):
     """Base association class.
 
@@ -57,106 +621,60 @@ class Association(object):
         :param local_ae: local AE title parameters
         :param dul_socket: socket for DUL provider or None if it's not needed
         """
-        self.dul = dulprovider.DULServiceProvider(dul_socket)
+        self.dul = local_ae.dul_provider(dul_socket, local_ae.timer_wheel)
+        self.dul.connect_timeout = _timeout(local_ae.connect_timeout,
+                                            local_ae.timeout)
         self.ae = local_ae
         self.association_established = False
         self.max_pdu_length = 16000
+        self.max_ops_invoked = 1
+        self.max_ops_performed = 1
         self.accepted_contexts = {}
+        self.pending_items = collections.deque()
+        self.send_lock = threading.Lock()
 
-    def get_dul_message(self):
-        dul_msg = self.dul.receive(self.ae.timeout)
-        if dul_msg.pdu_type == pdu.PDataTfPDU.pdu_type\
-                or dul_msg.pdu_type == pdu.AAssociateAcPDU.pdu_type:
-            return dul_msg
-        elif dul_msg.pdu_type == pdu.AReleaseRqPDU.pdu_type:
-            raise exceptions.AssociationReleasedError()
-        elif dul_msg.pdu_type == pdu.AAbortPDU.pdu_type:
-            raise exceptions.AssociationAbortedError(dul_msg.source,
-                                                     dul_msg.reason_diag)
-        elif dul_msg.pdu_type == pdu.AAssociateRjPDU.pdu_type:
-            raise exceptions.AssociationRejectedError(
-                dul_msg.result, dul_msg.source, dul_msg.reason_diag)
-        else:
-            raise exceptions.NetDICOMError()
-
-    def send(self, dimse_msg, pc_id):
-        dimse_msg.set_length()
-        for p_data in dimse_msg.encode(pc_id, self.max_pdu_length):
-            self.dul.send(p_data)
-
-    def receive(self):
-        # TODO: Refactor this madness
-        encoded_command_set = []
-        encoded_data_set = []
+    def get_dul_message(self, timeout=None):
+        """Waits for PDU from DUL service provider.
 
-        command_set_received = False
-        data_set_received = False
+        :param timeout: number of seconds to wait, defaults to AE DIMSE
+                        timeout
+        :return: PDU if it is P-DATA-TF or A-ASSOCIATE-AC
+        """
+        if timeout is None:
+            timeout = _timeout(self.ae.dimse_timeout, self.ae.timeout)
+        return check_dul_message(self.dul.receive(timeout))
 
-        receiving = True
-        dataset = None
+    def send(self, dimse_msg, pc_id):
+        """Sends DIMSE message.
 
-        pc_id = None
-        msg = None
+        Command set and data set fragments are packed into as few P-DATA-TF
+        PDUs as maximum PDU length allows. Send lock is held until the last
+        fragment is written, so messages sent from other threads never get
+        between fragments of the message.
 
-        start = 0
+        :param dimse_msg: DIMSE message
+        :param pc_id: presentation context ID
+        """
+        dimse_msg.set_length()
+        deflate_on_context(self, dimse_msg, pc_id)
+        with self.send_lock:
+            for p_data in dimse_msg.encode(pc_id, self.max_pdu_length):
+                self.dul.send(p_data)
 
+    def receive(self):
+        assembler = MessageAssembler(self)
         try:
-            while receiving:
+            while True:
+                while self.pending_items:
+                    # PDVs left from previous P-DATA-TF PDU
+                    if assembler.feed(self.pending_items.popleft()):
+                        return assembler.message()
                 p_data = self.get_dul_message()
-
-                for value_item in p_data.data_value_items:
-                    # must be able to read P-DATA with several PDVs
-                    pc_id = value_item.context_id
-                    marker = six.indexbytes(value_item.data_value, 0)
-                    if marker in (1, 3):
-                        encoded_command_set.append(value_item.data_value[1:])
-                        if marker == 3:
-                            command_set_received = True
-                            command_set = dsutils.decode(
-                                b''.join(encoded_command_set),
-                                True, True
-                            )
-
-                            msg = self._command_set_to_message(command_set)
-                            no_ds = command_set[(0x0000,
-                                                 0x0800)].value == 0x0101
-                            use_file = (msg.sop_class_uid in
-                                        self.ae.store_in_file)
-                            if not no_ds and use_file:
-                                ctx = self.accepted_contexts[pc_id]
-                                dataset, start = self.ae.get_file(ctx,
-                                                                  command_set)
-                                if encoded_data_set:
-                                    dataset.writelines(encoded_data_set)
-                            if no_ds or data_set_received:
-                                receiving = False  # response: no dataset
-                                break
-                    elif marker in (0, 2):
-                        if dataset:
-                            dataset.write(value_item.data_value[1:])
-                        else:
-                            encoded_data_set.append(value_item.data_value[1:])
-                        if marker == 2:
-                            data_set_received = True
-                            if command_set_received:
-                                receiving = False
-                                break
-                    else:
-                        raise exceptions.DIMSEProcessingError(
-                            'Incorrect first PDV byte')
+                self.pending_items.extend(p_data.data_value_items)
         except Exception:
-            if dataset:
-                dataset.close()
+            assembler.abort()
             raise
 
-        if data_set_received:
-            if dataset:
-                dataset.seek(start)
-                msg.data_set = dataset
-            else:
-                msg.data_set = b''.join(encoded_data_set)
-        return msg, pc_id
-
     def kill(self):
         """Stops internal DUL service provider.
 
@@ -184,13 +702,6 @@ class Association(object):
         self.kill()
         return rsp
 
-    @staticmethod
-    def _command_set_to_message(command_set):
-        command_field = command_set[(0x0000, 0x0100)].value
-        msg_type = dimsemessages.MESSAGE_TYPE[command_field]
-        msg = msg_type(command_set)
-        return msg
-
 
 class AssociationAcceptor(socketserver.StreamRequestHandler, Association):
     """'Server-side' association implementation.
@@ -244,47 +755,10 @@ class AssociationAcceptor(socketserver.StreamRequestHandler, Association):
         """Waits for an association request from a remote AE. Upon reception
         of the request sends association response based on
         acceptable_pr_contexts"""
-        user_items = assoc_req.variable_items[-1]
-        self.max_pdu_length = user_items.user_data[0].maximum_length_received
-
-        # analyse proposed presentation contexts
-        rsp = [assoc_req.variable_items[0]]
-        requested = (
-            (item.context_id, item.abs_sub_item.name, item.ts_sub_items)
-            for item in assoc_req.variable_items[1:-1]
-        )
-
-        for pc_id, proposed_sop, proposed_ts in requested:
-            if proposed_sop not in self.ae.supported_scp:
-                # refuse sop class because of SOP class not supported
-                rsp.append(
-                    pdu.PresentationContextItemAC(
-                        pc_id, 1, pdu.TransferSyntaxSubItem(''))
-                )
-                continue
-
-            for ts in proposed_ts:
-                if ts.name in self.ae.supported_ts:
-                    rsp.append(pdu.PresentationContextItemAC(pc_id, 0, ts))
-                    ts_uid = _dicom.UID(ts.name)
-                    self.sop_classes_as_scp[pc_id] = (pc_id, proposed_sop,
-                                                      ts_uid)
-                    self.accepted_contexts[pc_id] = PContextDef(
-                        pc_id, proposed_sop, ts_uid
-                    )
-                    break
-            else:  # Refuse sop class because of TS not supported
-                rsp.append(
-                    pdu.PresentationContextItemAC(
-                        pc_id, 1, pdu.TransferSyntaxSubItem(''))
-                )
-
-        rsp.append(user_items)
-        res = pdu.AAssociateAcPDU(
-            called_ae_title=assoc_req.called_ae_title,
-            calling_ae_title=assoc_req.calling_ae_title,
-            variable_items=rsp
-        )
+        res, self.max_pdu_length, self.accepted_contexts, \
+            (self.max_ops_invoked, self.max_ops_performed) = \
+            negotiate_association(self.ae, assoc_req)
+        self.sop_classes_as_scp = dict(self.accepted_contexts)
         self.dul.send(res)
         self.remote_ae = assoc_req.calling_ae_title
 
@@ -313,23 +787,75 @@ class AssociationAcceptor(socketserver.StreamRequestHandler, Association):
         self.association_established = True
 
     def _loop(self):
-        while not self.is_killed:
-            dimse_msg, pc_id = self.receive()
-            uid = dimse_msg.sop_class_uid
-            try:
-                _, sop_class, ts = self.sop_classes_as_scp[pc_id]
-                service = self.ae.supported_scp[uid]
-            except KeyError:
-                raise exceptions.ClassNotSupportedError(
-                    'SOP Class {0} not supported as SCP'.format(uid))
-            else:
-                service(self, PContextDef(pc_id, sop_class, ts), dimse_msg)
+        if self.max_ops_performed == 1 or futures is None:
+            executor = None
+        else:
+            executor = futures.ThreadPoolExecutor(
+                self.max_ops_performed or None)
+        operations = set()
+        try:
+            while not self.is_killed:
+                if not self._wait_for_request():
+                    break
+                dimse_msg, pc_id = self.receive()
+                ctx, service = self._get_service(dimse_msg, pc_id)
+                if executor is None or \
+                        not getattr(service, 'concurrent_operations', False):
+                    service(self, ctx, dimse_msg)
+                    continue
+
+                # wait for the slot in the operations window
+                while self.max_ops_performed and \
+                        len(operations) >= self.max_ops_performed:
+                    done, operations = futures.wait(
+                        operations, return_when=futures.FIRST_COMPLETED)
+                    for operation in done:
+                        operation.result()
+                operations.add(executor.submit(service, self, ctx, dimse_msg))
+                done = set(op for op in operations if op.done())
+                for operation in done:
+                    operation.result()
+                operations -= done
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+    def _wait_for_request(self):
+        if self.pending_items:
+            return True
+        timeout = _timeout(self.ae.idle_timeout, self.ae.timeout)
+        try:
+            p_data = self.get_dul_message(timeout)
+        except exceptions.TimeoutError:
+            self._release_idle()
+            return False
+        self.pending_items.extend(p_data.data_value_items)
+        return True
+
+    def _release_idle(self):
+        # association was idle for too long, acceptor may request release too
+        self.dul.send(pdu.AReleaseRqPDU())
+        try:
+            self.dul.receive(self.ae.timeout)
+        except exceptions.TimeoutError:
+            pass
+
+    def _get_service(self, dimse_msg, pc_id):
+        uid = dimse_msg.sop_class_uid
+        try:
+            _, sop_class, ts = self.sop_classes_as_scp[pc_id]
+            service = self.ae.supported_scp[uid]
+        except KeyError:
+            raise exceptions.ClassNotSupportedError(
+                'SOP Class {0} not supported as SCP'.format(uid))
+        return PContextDef(pc_id, sop_class, ts), service
 
 
 class AssociationRequester(Association):
     def __init__(self, local_ae, remote_ae=None):
         super(AssociationRequester, self).__init__(local_ae, None)
-        self.context_def_list = local_ae.copy_context_def_list()
+        self.template = local_ae.request_template()
+        self.context_def_list = self.template.context_def_list
         self.remote_ae = remote_ae
         self.sop_classes_as_scu = {}
 
@@ -342,65 +868,29 @@ class AssociationRequester(Association):
         self.dul.send(pdu.AAbortPDU(source=0, reason_diag=reason))
         self.kill()
 
-    def _request(self, local_ae, remote_ae, mp, pcdl, users_pdu=None):
+    def _request(self, local_ae, remote_ae, users_pdu=None):
         """Requests an association with a remote AE and waits for association
         response."""
-        self.max_pdu_length = mp
-
-        max_pdu_length_par = userdataitems.MaximumLengthSubItem(mp)
-        user_information = [max_pdu_length_par] + users_pdu \
-            if users_pdu else [max_pdu_length_par]
-        username = remote_ae.get('username')
-        password = remote_ae.get('password')
-        if username and password:
-            user_information.append(
-                userdataitems.UserIdentityNegotiationSubItem(username, password))
-        elif username:
-            user_information.append(
-                userdataitems.UserIdentityNegotiationSubItem(
-                    username, user_identity_type=1))
-
-        variable_items = [pdu.ApplicationContextItem(APPLICATION_CONTEXT_NAME)]
-        variable_items.extend(build_pres_context_def_list(pcdl))
-        variable_items.append(pdu.UserInformationItem(user_information))
-        assoc_rq = pdu.AAssociateRqPDU(
-            called_ae_title=remote_ae['aet'],
-            calling_ae_title=local_ae['aet'],
-            variable_items=variable_items
-        )
-        # FIXME pass parameter properly
-        assoc_rq.called_presentation_address = (remote_ae['address'],
-                                                remote_ae['port'])
+        self.max_pdu_length = self.template.max_pdu_length
+        assoc_rq = association_request_from_template(
+            self.template, local_ae, remote_ae, users_pdu)
         self.dul.send(assoc_rq)
-        response = self.get_dul_message()
-
-        # Get maximum pdu length from answer
-        user_data = response.variable_items[-1].user_data
-        try:
-            self.max_pdu_length = user_data[0].maximum_length_received
-        except IndexError:
-            self.max_pdu_length = 16000
-
-        # Get accepted presentation contexts
-        accepted = (ctx for ctx in response.variable_items[1:-1]
-                    if ctx.result_reason == 0)
-        for ctx in accepted:
-            pc_id = ctx.context_id
-            sop_class = pcdl[ctx.context_id].sop_class
-            ts_uid = _dicom.UID(ctx.ts_sub_item.name)
-            self.sop_classes_as_scu[sop_class] = (pc_id, ts_uid)
-            self.accepted_contexts[pc_id] = PContextDef(pc_id, sop_class,
-                                                        ts_uid)
+        response = self.get_dul_message(self.ae.timeout)
+
+        self.max_pdu_length, self.accepted_contexts = \
+            accepted_contexts_from_response(response, self.context_def_list)
+        self.max_ops_invoked, self.max_ops_performed = \
+            operations_window_from_response(response)
+        self.sop_classes_as_scu = {
+            ctx.sop_class: (pc_id, ctx.supported_ts)
+            for pc_id, ctx in six.iteritems(self.accepted_contexts)
+        }
         return response
 
     def request(self):
-        ext = [userdataitems.ScpScuRoleSelectionSubItem(uid, 0, 1)
-               for uid in self.ae.supported_scp.keys()]
         custom_items = self.remote_ae.get('user_data', [])
-        response = self._request(
-            self.ae.local_ae, self.remote_ae, self.ae.max_pdu_length,
-            self.context_def_list, users_pdu=ext+custom_items
-        )
+        response = self._request(self.ae.local_ae, self.remote_ae,
+                                 users_pdu=custom_items)
         self.ae.on_association_response(response)
         self.association_established = True
 
@@ -0,0 +1,266 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+"""
+Association pool allows to reuse established associations for a series of
+short operations (like C-FIND queries) against the same remote AE. Connection
+setup and association negotiation are paid only once per pooled association.
+
+Associations are pooled by remote AE and presentation contexts (SOP classes
+and transfer syntaxes) proposed by the local AE, so changes of the AE
+configuration (adding new services) would not affect associations that were
+negotiated before.
+
+Example::
+
+    from netdicom2 import applicationentity, associationpool, sopclass
+
+    ae = applicationentity.ClientAE('AET').add_scu(sopclass.qr_find_scu)
+    with associationpool.AssociationPool(ae, max_size=2) as pool:
+        for ds in queries:
+            with pool.association(remote_ae) as assoc:
+                service = assoc.get_scu(sopclass.PATIENT_ROOT_FIND_SOP_CLASS)
+                for result, status in service(ds, 1):
+                    pass
+"""
+
+from __future__ import absolute_import
+
+import collections
+import contextlib
+import threading
+
+from . import asceprovider
+from . import exceptions
+from . import sopclass
+from . import timer
+
+
+class AssociationPool(object):
+    """Pool of established associations requested by the application entity.
+
+    Association that is returned to the pool is kept open for
+    ``idle_timeout`` seconds, after that it is released by the reaper
+    scheduled on the AE timer wheel. Before association that was idle for more
+    than ``check_interval`` seconds is handed out again, pool verifies it
+    with C-ECHO (if Verification SOP Class was negotiated). Association that
+    was aborted or released by remote AE is never handed out.
+
+    :param ae: local application entity that requests associations
+    :param max_size: maximum number of associations (both idle and in use)
+                     to a single remote AE. When limit is reached callers wait
+                     for association to be returned to the pool.
+    :param idle_timeout: number of seconds idle association is kept open
+    :param check_interval: number of seconds association could stay idle
+                           before it is checked with C-ECHO
+    """
+
+    def __init__(self, ae, max_size=4, idle_timeout=60, check_interval=30):
+        self.ae = ae
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+
+        self._condition = threading.Condition()
+        self._idle = collections.defaultdict(list)
+        self._size = collections.Counter()
+        self._reaper = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @contextlib.contextmanager
+    def association(self, remote_ae):
+        """Checks out association to the remote AE for the duration of the
+        ``with`` block.
+
+        Association is returned to the pool when block completes. If block
+        raises an exception association is aborted instead.
+
+        :param remote_ae: dictionary that contains remote AE configuration
+                          (see
+                          :meth:`~netdicom2.applicationentity.AEBase.request_association`)
+        """
+        assoc = self.acquire(remote_ae)
+        try:
+            yield assoc
+        except BaseException:
+            self.release(assoc, reuse=False)
+            raise
+        else:
+            self.release(assoc)
+
+    def acquire(self, remote_ae):
+        """Checks out association to the remote AE.
+
+        Idle association is reused if there is one, otherwise new association
+        is requested. Association should be returned with
+        :meth:`~netdicom2.associationpool.AssociationPool.release`.
+
+        :param remote_ae: dictionary that contains remote AE configuration
+        :return: established
+                 :class:`~netdicom2.asceprovider.AssociationRequester`
+        :raise exceptions.TimeoutError: if pool is exhausted and no
+                                        association was returned within AE
+                                        timeout
+        """
+        key = self._key(remote_ae)
+        deadline = timer.monotonic() + self.ae.timeout
+        self._release_expired()
+        while True:
+            assoc, last_used = self._checkout(key, deadline)
+            if assoc is None:
+                return self._request(key, remote_ae)
+            if self._is_alive(assoc, last_used):
+                return assoc
+            self._discard(assoc)
+
+    def release(self, assoc, reuse=True):
+        """Returns association to the pool.
+
+        :param assoc: association received from
+                      :meth:`~netdicom2.associationpool.AssociationPool.acquire`
+        :param reuse: ``False`` if association should not be used anymore
+                      (e.g. operation was interrupted and association state is
+                      unknown). Such association is aborted.
+        """
+        if not reuse or not self._is_established(assoc):
+            self._discard(assoc)
+            return
+        with self._condition:
+            self._idle[assoc.pool_key].append((assoc, timer.monotonic()))
+            self._condition.notify()
+            if self._reaper is None:
+                self._schedule_reaper()
+        self._release_expired()
+
+    def close(self):
+        """Releases all idle associations."""
+        with self._condition:
+            idle = [assoc for associations in self._idle.values()
+                    for assoc, _ in associations]
+            self._idle.clear()
+            if self._reaper is not None:
+                self._reaper.cancel()
+                self._reaper = None
+        for assoc in idle:
+            self._close(assoc)
+
+    def _key(self, remote_ae):
+        contexts = frozenset(
+            (ctx.sop_class, frozenset(ctx.supported_ts))
+            for ctx in self.ae.copy_context_def_list().values())
+        return (remote_ae['aet'], remote_ae['address'], remote_ae['port'],
+                remote_ae.get('username'), contexts)
+
+    def _checkout(self, key, deadline):
+        with self._condition:
+            while True:
+                if self._idle[key]:
+                    return self._idle[key].pop()
+                if self._size[key] < self.max_size:
+                    self._size[key] += 1
+                    return None, None
+                remaining = deadline - timer.monotonic()
+                if remaining <= 0:
+                    raise exceptions.TimeoutError(
+                        'Association pool is exhausted')
+                self._condition.wait(remaining)
+
+    def _request(self, key, remote_ae):
+        assoc = None
+        try:
+            assoc = asceprovider.AssociationRequester(self.ae,
+                                                      remote_ae=remote_ae)
+            assoc.pool_key = key
+            assoc.request()
+        except Exception:
+            if assoc is not None:
+                assoc.kill()
+            self._forget(key)
+            raise
+        return assoc
+
+    def _is_alive(self, assoc, last_used):
+        if not self._is_established(assoc):
+            return False
+        if timer.monotonic() - last_used < self.check_interval:
+            return True
+        try:
+            pc_id, ts = assoc.sop_classes_as_scu[
+                sopclass.VERIFICATION_SOP_CLASS]
+        except KeyError:
+            return True  # C-ECHO was not negotiated, nothing to check
+        ctx = asceprovider.PContextDef(pc_id, sopclass.VERIFICATION_SOP_CLASS,
+                                       ts)
+        try:
+            return sopclass.verification_scu(assoc, ctx, 1).is_success
+        except Exception:
+            return False
+
+    @staticmethod
+    def _is_established(assoc):
+        # association could be aborted or released by remote AE while idle
+        dul = assoc.dul
+        return assoc.association_established and \
+            dul.state_machine.current_state == 'Sta6' and \
+            not dul.has_incoming_pdu()
+
+    def _release_expired(self):
+        expired = []
+        now = timer.monotonic()
+        with self._condition:
+            for associations in self._idle.values():
+                while associations and \
+                        now - associations[0][1] >= self.idle_timeout:
+                    expired.append(associations.pop(0)[0])
+        for assoc in expired:
+            self._close(assoc)
+
+    def _schedule_reaper(self):
+        # called with the condition held, idle associations of every key are
+        # ordered by the time they were returned
+        oldest = min(associations[0][1]
+                     for associations in self._idle.values() if associations)
+        delay = max(0, oldest + self.idle_timeout - timer.monotonic())
+        self._reaper = self.ae.timer_wheel.schedule(delay, self._reap)
+
+    def _reap(self):
+        # wheel callbacks should not block, so associations are released from
+        # a separate thread
+        thread = threading.Thread(target=self._reap_expired)
+        thread.daemon = True
+        thread.start()
+
+    def _reap_expired(self):
+        with self._condition:
+            self._reaper = None
+        self._release_expired()
+        with self._condition:
+            if self._reaper is None and any(self._idle.values()):
+                self._schedule_reaper()
+
+    def _close(self, assoc):
+        try:
+            assoc.release()
+        except Exception:
+            assoc.kill()
+        self._forget(assoc.pool_key)
+
+    def _discard(self, assoc):
+        try:
+            if assoc.association_established:
+                assoc.abort()
+            else:
+                assoc.kill()
+        finally:
+            self._forget(assoc.pool_key)
+
+    def _forget(self, key):
+        with self._condition:
+            self._size[key] -= 1
+            self._condition.notify()
@@ -22,7 +22,10 @@ as they are described in PS3.7 Sections 9 (DIMSE-C) and 10 (DIMSE-N).
 """
 from __future__ import absolute_import
 
-import struct
+import io
+import itertools
+import os
+import stat
 
 from six.moves import range
 
@@ -98,23 +101,160 @@ def chunks(seq, size):
             for pos in range(0, l, size))
 
 
+class PDVPacker(object):
+    """Packs presentation data value items into P-DATA-TF PDUs.
+
+    Items are added to the current PDU for as long as it stays within the
+    maximum PDU length, so command set and small data set (or several small
+    messages) share a single PDU.
+
+    :param max_pdu_length: maximum length of P-DATA-TF PDU variable field,
+                           zero means unlimited
+    """
+
+    def __init__(self, max_pdu_length):
+        self.max_pdu_length = max_pdu_length
+        self._items = []
+        self._length = 0
+
+    def pack(self, items):
+        """Adds items to the PDUs.
+
+        :param items: iterable of presentation data value items
+        :return: generator that yields PDUs as they are filled up. Last PDU
+                 is kept until :meth:`~netdicom2.dimsemessages.PDVPacker.flush`
+                 is called.
+        """
+        for item in items:
+            size = item.total_length()
+            if self._items and self.max_pdu_length and \
+                    self._length + size > self.max_pdu_length:
+                yield self._pdu()
+            self._items.append(item)
+            self._length += size
+
+    def flush(self):
+        """Returns generator that yields the last PDU (if any)."""
+        if self._items:
+            yield self._pdu()
+
+    def _pdu(self):
+        p_data = pdu.PDataTfPDU(self._items)
+        self._items = []
+        self._length = 0
+        return p_data
+
+
 def fragment(data_set, max_pdu_length, normal, last):
     maxsize = max_pdu_length - 6
-    for chunk, has_next in chunks(data_set, maxsize):
+    for chunk, has_next in chunks(memoryview(data_set), maxsize):
         yield chunk, normal if has_next else last
 
 
 def fragment_file(f, max_pdu_length, normal, last):
+    """Splits data set from file-like object into fragments.
+
+    Fragment boundaries are computed from the data set size, each fragment
+    is read with ``readinto`` into its own buffer and is never copied
+    afterwards.
+
+    :param f: file-like object positioned at the start of the data set
+    :param max_pdu_length: maximum PDU length
+    :param normal: control header for all fragments except the last one
+    :param last: control header for the last fragment
+    """
+    maxsize = max_pdu_length - 6
+    start = f.tell()
+    f.seek(0, 2)
+    remaining = f.tell() - start
+    f.seek(start)
+    while remaining > 0:
+        chunk = bytearray(min(maxsize, remaining))
+        view = memoryview(chunk)
+        received = 0
+        while received < len(chunk):
+            count = f.readinto(view[received:])
+            if not count:
+                raise IOError('Unexpected end of data set file')
+            received += count
+        remaining -= received
+        yield chunk, normal if remaining else last
+
+
+def fragment_stream(stream, max_pdu_length, normal, last):
+    """Splits stream of data set pieces of arbitrary length into fragments.
+
+    :param stream: iterable with consecutive pieces of the data set
+    :param max_pdu_length: maximum PDU length
+    :param normal: control header for all fragments except the last one
+    :param last: control header for the last fragment
+    """
     maxsize = max_pdu_length - 6
+    buf = bytearray()
+    for piece in stream:
+        buf.extend(piece)
+        # at least one byte is kept, so the last fragment is always known
+        while len(buf) > maxsize:
+            yield bytes(buf[:maxsize]), normal
+            del buf[:maxsize]
+    yield bytes(buf), last
+
+
+def read_chunks(data_set, size):
+    """Reads data set in chunks.
+
+    :param data_set: bytes, file-like object positioned at the start of the
+                     data set or iterable with data set pieces
+    :param size: chunk size
+    :return: generator that yields chunks
+    """
+    if isinstance(data_set, bytes):
+        for chunk, _ in chunks(memoryview(data_set), size):
+            yield chunk
+        return
+    if not hasattr(data_set, 'read'):
+        for chunk in data_set:
+            yield chunk
+        return
     while True:
-        chunk = f.read(maxsize)
+        chunk = data_set.read(size)
         if not chunk:
-            break
-        has_next = f.read(1)
-        if has_next:
-            f.seek(-1, 1)
+            return
+        yield chunk
 
-        yield chunk, normal if has_next else last
+
+def fragment_file_regions(f, max_pdu_length, normal, last):
+    """Splits data set from regular file into file regions.
+
+    File is not read, each fragment is a :class:`~netdicom2.pdu.FileRegion`
+    that is copied directly from file to the socket by DUL service provider.
+    File must stay open until the message is sent.
+
+    :param f: file object positioned at the start of the data set
+    :param max_pdu_length: maximum PDU length
+    :param normal: control header for all fragments except the last one
+    :param last: control header for the last fragment
+    """
+    maxsize = max_pdu_length - 6
+    f.flush()
+    offset = f.tell()
+    end = os.fstat(f.fileno()).st_size
+    while offset < end:
+        length = min(maxsize, end - offset)
+        offset += length
+        yield pdu.FileRegion(f, offset - length, length), \
+            normal if offset < end else last
+
+
+def is_regular_file(f):
+    """Checks if data set file object is backed by a regular file on disk.
+
+    :param f: file-like object
+    :return: ``True`` if data set could be sent as file regions
+    """
+    if not isinstance(f, (io.BufferedReader, io.BufferedRandom, io.FileIO)):
+        return False
+    return stat.S_ISREG(os.fstat(f.fileno()).st_mode)
 
 
 def dimse_property(tag):
@@ -157,11 +297,26 @@ def priority_mixin(dimse_class):
 
 
 class DIMSEMessage(object):
+    """Base class of DIMSE messages.
+
+    :ivar digest_algorithms: names of ``hashlib`` algorithms that are computed
+                             over data set while message is encoded
+    :ivar digests: dictionary with hex digests of the sent or received data
+                   set (see AE ``digest_algorithms``), ``None`` if digests
+                   were not computed
+    :ivar deflate: compress data set while message is encoded. ``None``
+                   means that data set is compressed if it is sent over
+                   Deflated Explicit VR Little Endian presentation context.
+                   Set it to ``False`` if data set is already compressed.
+    """
     command_field = None
     command_fields = []
 
     def __init__(self, command_set=None):
         self._data_set = None
+        self.digest_algorithms = ()
+        self.digests = None
+        self.deflate = None
         if command_set:
             self.command_set = command_set
         else:
@@ -185,28 +340,64 @@ class DIMSEMessage(object):
 
     def encode(self, pc_id, max_pdu_length):
         """Returns the encoded message as a series of P-DATA service
-        parameter objects."""
+        parameter objects.
+
+        Command set and data set fragments are packed into as few PDUs as
+        maximum PDU length allows.
+        """
+        packer = PDVPacker(max_pdu_length)
+        return itertools.chain(
+            packer.pack(self.encode_items(pc_id, max_pdu_length)),
+            packer.flush())
+
+    def encode_items(self, pc_id, max_pdu_length):
+        """Returns the encoded message as a series of presentation data value
+        items.
+
+        Each item holds a fragment that fits into PDU of
+        ``max_pdu_length`` by itself. If ``digest_algorithms`` are set,
+        ``digests`` of the data set are available once all items were
+        produced.
+        """
         encoded_command_set = dsutils.encode(self.command_set, True, True)
 
         # fragment command set
         for item, bit in fragment(encoded_command_set, max_pdu_length, 1, 3):
-            # send only one pdv per p-data primitive
-            value_item = pdu.PresentationDataValueItem(
-                pc_id, struct.pack('b', bit) + item)
-            yield pdu.PDataTfPDU([value_item])
+            yield pdu.PresentationDataValueFragment(pc_id, bit, item)
 
         # fragment data set
         if self.data_set:
-            if isinstance(self.data_set, bytes):
+            if self.deflate:
+                # data set is compressed piece by piece, compressed stream is
+                # fragmented as it is produced
+                gen = fragment_stream(
+                    dsutils.deflate(read_chunks(self.data_set,
+                                                max_pdu_length)),
+                    max_pdu_length, 0, 2)
+            elif isinstance(self.data_set, bytes):
                 # got dataset as byte array
                 gen = fragment(self.data_set, max_pdu_length, 0, 2)
+            elif not hasattr(self.data_set, 'read'):
+                # dataset is produced piece by piece (e.g. by transcoder)
+                gen = fragment_stream(self.data_set, max_pdu_length, 0, 2)
+            elif is_regular_file(self.data_set) and \
+                    not self.digest_algorithms:
+                # dataset is in the file on disk, send it without reading
+                gen = fragment_file_regions(self.data_set, max_pdu_length,
+                                            0, 2)
             else:
-                # assume that dataset is in file-like object
+                # assume that dataset is in file-like object. Files are also
+                # read if digests are needed, since file regions never pass
+                # through the process.
                 gen = fragment_file(self.data_set, max_pdu_length, 0, 2)
+            digests = dsutils.Digests(self.digest_algorithms) \
+                if self.digest_algorithms else None
             for item, bit in gen:
-                value_item = pdu.PresentationDataValueItem(
-                    pc_id, struct.pack('b', bit) + item)
-                yield pdu.PDataTfPDU([value_item])
+                if digests is not None:
+                    digests.update(item)
+                yield pdu.PresentationDataValueFragment(pc_id, bit, item)
+            if digests is not None:
+                self.digests = digests.hexdigests()
 
     def set_length(self):
         it = (len(dsutils.encode_element(v, True, True))
@@ -248,6 +439,15 @@ class CStoreRQMessage(DIMSERequestMessage):
     move_originator_aet = dimse_property((0x0000, 0x1030))
     move_originator_message_id = dimse_property((0x0000, 0x1031))
 
+    early_status = None
+    """Status returned by
+    :meth:`~netdicom2.applicationentity.AEBase.on_store_header` if dataset was
+    not kept. Such message has no dataset."""
+
+    sink = None
+    """Sink (see :mod:`~netdicom2.sinks`) that received message dataset.
+    Such message has no dataset."""
+
 
 @status_mixin
 class CStoreRSPMessage(DIMSEResponseMessage):
@@ -5,6 +5,11 @@
 #    available at http://pynetdicom.googlecode.com
 #
 
+import hashlib
+import struct
+import tempfile
+import zlib
+
 from . import _dicom
 import six
 if six.PY3:
@@ -14,10 +19,27 @@ else:
 
 
 def decode(rawstr, is_implicit_vr, is_little_endian):
+    if hasattr(rawstr, 'read'):
+        # dataset that was spooled to file (see AEBase.spool_max_size)
+        return _dicom.read_dataset(rawstr, is_implicit_vr, is_little_endian)
     s = cStringIO(rawstr)
     return _dicom.read_dataset(s, is_implicit_vr, is_little_endian)
 
 
+def spooled_file(max_size):
+    """Creates temporary file that is kept in memory until it grows larger
+    than ``max_size``.
+
+    :param max_size: maximum size in bytes of in-memory file, ``None`` means
+                     that file is always on disk
+    :return: temporary file object
+    """
+    if max_size is None:
+        return tempfile.TemporaryFile()
+    # zero max_size means that file is never rolled over
+    return tempfile.SpooledTemporaryFile(max_size=max(max_size, 1))
+
+
 def encode(ds, is_implicit_vr, is_little_endian):
     f = _dicom.DicomBytesIO()
     f.is_implicit_VR = is_implicit_vr
@@ -36,3 +58,479 @@ def encode_element(el, is_implicit_vr, is_little_endian):
     rawstr = f.parent.getvalue()
     f.close()
     return rawstr
+
+
+def is_deflated(ts):
+    """Checks if transfer syntax is Deflated Explicit VR Little Endian.
+
+    Dataset in this transfer syntax is encoded with Explicit VR Little Endian
+    and is compressed with deflate (RFC 1951, without zlib header).
+
+    :param ts: transfer syntax UID
+    :return: ``True`` if dataset is compressed
+    """
+    return ts == _dicom.DeflatedExplicitVRLittleEndian
+
+
+def deflate(chunks, level=zlib.Z_DEFAULT_COMPRESSION):
+    """Compresses encoded dataset incrementally.
+
+    :param chunks: iterable with consecutive fragments of the encoded dataset
+    :param level: compression level
+    :return: generator that yields compressed fragments
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class Inflater(object):
+    """Decompresses deflated dataset incrementally.
+
+    Every compressed fragment is inflated into pieces of at most
+    ``max_length`` bytes, so highly compressed fragment is never inflated
+    into one large buffer.
+
+    :param max_length: maximum length of inflated piece
+    """
+
+    def __init__(self, max_length=1048576):
+        self.max_length = max_length
+        self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def inflate(self, data, last=False):
+        """Decompresses next fragment.
+
+        :param data: compressed fragment
+        :param last: ``True`` if fragment is the last one
+        :return: list of inflated pieces. List for the last fragment is never
+                 empty (last piece may be empty though).
+        :raise zlib.error: if data is not a valid deflate stream
+        """
+        pieces = []
+        data = memoryview(data).tobytes()
+        while data:
+            piece = self._decompressor.decompress(data, self.max_length)
+            data = self._decompressor.unconsumed_tail
+            if piece:
+                pieces.append(piece)
+        if last:
+            pieces.append(self._decompressor.flush())
+        return pieces
+
+
+class Digests(object):
+    """Computes several digests of the dataset bytes at once.
+
+    Digests are updated with dataset fragments as they are sent or received,
+    so dataset is never read just to compute them.
+
+    :param algorithms: names of ``hashlib`` algorithms (e.g. ``'sha256'``)
+    """
+
+    def __init__(self, algorithms):
+        self._hashes = [(name, hashlib.new(name)) for name in algorithms]
+
+    def update(self, data):
+        """Updates digests with next dataset fragment.
+
+        :param data: bytes-like object
+        """
+        for _, digest in self._hashes:
+            digest.update(data)
+
+    def hexdigests(self):
+        """Returns computed digests.
+
+        :return: dictionary that maps algorithm names to hex digests
+        """
+        return dict((name, digest.hexdigest())
+                    for name, digest in self._hashes)
+
+
+PIXEL_DATA = (0x7fe0, 0x0010)
+
+UNDEFINED_LENGTH = 0xFFFFFFFF
+
+# explicit VRs with 2 reserved bytes and 4-byte value length
+_LONG_VRS = frozenset([b'OB', b'OD', b'OF', b'OL', b'OV', b'OW', b'SQ', b'SV',
+                       b'UC', b'UN', b'UR', b'UT', b'UV'])
+
+_ITEM = 0xE000
+_ITEM_DELIMITATION = 0xE00D
+_SEQUENCE_DELIMITATION = 0xE0DD
+
+
+class HeaderParser(object):
+    """Incrementally finds leading top-level elements of encoded dataset.
+
+    Parser is fed with dataset fragments as they are received. It walks
+    element headers (skipping values, sequences and items) and, as soon as it
+    reaches ``stop_tag`` (pixel data by default) on the top level, decodes
+    everything before it. If ``stop_tag`` is not reached within
+    ``max_length`` bytes, only elements that were completely received by then
+    are decoded. Parser keeps at most ``max_length`` bytes (plus one
+    fragment) in memory, regardless of dataset size.
+
+    :param is_implicit_vr: dataset transfer syntax uses implicit VR
+    :param is_little_endian: dataset transfer syntax is little endian
+    :param stop_tag: tag of the first top-level element that should not be
+                     decoded
+    :param max_length: maximum number of bytes that are buffered
+    """
+
+    def __init__(self, is_implicit_vr, is_little_endian, stop_tag=PIXEL_DATA,
+                 max_length=65536):
+        self.is_implicit_vr = is_implicit_vr
+        self.is_little_endian = is_little_endian
+        self.stop_tag = stop_tag
+        self.max_length = max_length
+        self.header = None
+        self._endian = '<' if is_little_endian else '>'
+        self._buffer = bytearray()
+        self._pos = 0  # start of the next element header
+        self._depth = 0  # nesting level of undefined length sequences/items
+        self._end = 0  # end of the last complete top-level element
+
+    def feed(self, data, last=False):
+        """Processes next dataset fragment.
+
+        :param data: dataset fragment
+        :param last: ``True`` if fragment is the last one
+        :return: decoded leading elements or ``None`` if more data is needed.
+                 Once header was returned, parser ignores further fragments.
+        """
+        if self.header is not None:
+            return None
+        self._buffer.extend(data)
+        if self._walk() or last or self._pos >= self.max_length:
+            self.header = decode(bytes(self._buffer[:self._end]),
+                                 self.is_implicit_vr, self.is_little_endian)
+            self._buffer = None
+            return self.header
+        return None
+
+    def _walk(self):
+        buf = self._buffer
+        endian = self._endian
+        while self._pos < self.max_length:
+            pos = self._pos
+            if not self._depth:
+                self._end = pos
+            if len(buf) < pos + 8:
+                return False
+            group, elem = struct.unpack_from(endian + 'HH', buf, pos)
+            if not self._depth and (group, elem) >= self.stop_tag:
+                return True
+            if group == 0xFFFE:
+                length, = struct.unpack_from(endian + 'L', buf, pos + 4)
+                if elem == _ITEM and length != UNDEFINED_LENGTH:
+                    self._pos = pos + 8 + length
+                else:
+                    # items with undefined length are walked element by
+                    # element until their delimitation item
+                    self._depth += 1 if elem == _ITEM else -1
+                    self._pos = pos + 8
+                continue
+            if self.is_implicit_vr:
+                length, = struct.unpack_from(endian + 'L', buf, pos + 4)
+                header_length = 8
+            elif bytes(buf[pos + 4:pos + 6]) in _LONG_VRS:
+                if len(buf) < pos + 12:
+                    return False
+                length, = struct.unpack_from(endian + 'L', buf, pos + 8)
+                header_length = 12
+            else:
+                length, = struct.unpack_from(endian + 'H', buf, pos + 6)
+                header_length = 8
+            if length == UNDEFINED_LENGTH:
+                self._depth += 1
+                self._pos = pos + header_length
+            else:
+                self._pos = pos + header_length + length
+        if not self._depth and self._pos <= len(buf):
+            self._end = self._pos
+        return False
+
+
+UNCOMPRESSED_TRANSFER_SYNTAXES = frozenset([
+    _dicom.ImplicitVRLittleEndian, _dicom.ExplicitVRLittleEndian,
+    _dicom.ExplicitVRBigEndian, _dicom.DeflatedExplicitVRLittleEndian])
+
+# value multiplicity unit of VRs that are byte-swapped between little and big
+# endian transfer syntaxes
+_SWAP_UNITS = {b'US': 2, b'SS': 2, b'OW': 2, b'AT': 2,
+               b'UL': 4, b'SL': 4, b'FL': 4, b'OF': 4, b'OL': 4,
+               b'FD': 8, b'OD': 8, b'SV': 8, b'UV': 8, b'OV': 8}
+
+
+def can_transcode(src_ts, dst_ts):
+    """Checks if dataset could be transcoded with
+    :func:`~netdicom2.dsutils.transcode`.
+
+    :param src_ts: transfer syntax of the dataset
+    :param dst_ts: required transfer syntax
+    :return: ``True`` if both transfer syntaxes are uncompressed (or
+             deflated)
+    """
+    return src_ts in UNCOMPRESSED_TRANSFER_SYNTAXES and \
+        dst_ts in UNCOMPRESSED_TRANSFER_SYNTAXES
+
+
+def transcode(chunks, src_ts, dst_ts):
+    """Transcodes encoded dataset between uncompressed transfer syntaxes.
+
+    Deflated source dataset is inflated first. Dataset is never deflated,
+    deflated destination transfer syntax gets Explicit VR Little Endian
+    dataset, which is compressed when it is sent (see
+    :class:`~netdicom2.dimsemessages.DIMSEMessage` ``deflate``).
+
+    :param chunks: iterable with consecutive fragments of the encoded dataset
+    :param src_ts: transfer syntax of the dataset
+    :param dst_ts: required transfer syntax
+    :return: generator that yields fragments of transcoded dataset
+    :raise ValueError: if dataset is truncated
+    """
+    if is_deflated(src_ts):
+        chunks = _inflate_chunks(chunks)
+        src_ts = _dicom.ExplicitVRLittleEndian
+    if is_deflated(dst_ts):
+        dst_ts = _dicom.ExplicitVRLittleEndian
+    if src_ts == dst_ts:
+        for chunk in chunks:
+            yield chunk
+        return
+    transcoder = Transcoder(src_ts.is_implicit_VR, src_ts.is_little_endian,
+                            dst_ts.is_implicit_VR, dst_ts.is_little_endian)
+    for chunk in chunks:
+        for piece in transcoder.feed(chunk):
+            yield piece
+    transcoder.close()
+
+
+def _inflate_chunks(chunks):
+    inflater = Inflater()
+    for chunk in chunks:
+        for piece in inflater.inflate(chunk):
+            yield piece
+    for piece in inflater.inflate(b'', True):
+        yield piece
+
+
+class Transcoder(object):
+    """Incrementally transcodes encoded dataset between Implicit VR Little
+    Endian, Explicit VR Little Endian and Explicit VR Big Endian.
+
+    Transcoder walks element headers just like
+    :class:`~netdicom2.dsutils.HeaderParser`: headers are rewritten and
+    values are copied (or byte-swapped) as they pass through, so at most one
+    element header and one value unit are buffered regardless of the dataset
+    size.
+
+    VRs of implicit VR dataset are looked up in the data dictionary (unknown
+    tags become ``UN``). Header length depends on VR explicitness, so when it
+    changes, sequences and items with defined length are written with
+    undefined length and delimitation items, and group length elements are
+    dropped.
+
+    :param src_implicit_vr: source dataset uses implicit VR
+    :param src_little_endian: source dataset is little endian
+    :param dst_implicit_vr: transcoded dataset uses implicit VR
+    :param dst_little_endian: transcoded dataset is little endian
+    """
+
+    def __init__(self, src_implicit_vr, src_little_endian, dst_implicit_vr,
+                 dst_little_endian):
+        self.src_implicit_vr = src_implicit_vr
+        self.dst_implicit_vr = dst_implicit_vr
+        self._src = '<' if src_little_endian else '>'
+        self._dst = '<' if dst_little_endian else '>'
+        self._swap = src_little_endian != dst_little_endian
+        self._undefine = src_implicit_vr != dst_implicit_vr
+        self._buffer = bytearray()  # partial header or value unit
+        self._pos = 0  # number of consumed source bytes
+        self._stack = []  # open sequences and items: [kind, end]
+        self._value = 0  # number of value bytes left
+        self._unit = 1
+        self._drop = False
+
+    def feed(self, data):
+        """Transcodes next dataset fragment.
+
+        :param data: dataset fragment
+        :return: list of transcoded pieces. Pieces could be ``memoryview``
+                 slices of the fragment.
+        """
+        out = []
+        data = memoryview(data)
+        while True:
+            if self._value:
+                data = self._copy_value(data, out)
+                if self._value:
+                    break
+            self._close_containers(out)
+            if not len(data):
+                break
+            header, data = self._read_header(data)
+            if header is None:
+                break
+            self._on_header(header, out)
+        return out
+
+    def close(self):
+        """Checks that the whole dataset was transcoded.
+
+        :raise ValueError: if dataset is truncated
+        """
+        if self._value or self._buffer or \
+                any(end is not None for _, end in self._stack):
+            raise ValueError('Data set is truncated')
+
+    def _read_header(self, data):
+        buf = self._buffer
+        need = 8
+        while True:
+            missing = need - len(buf)
+            if missing > 0:
+                buf.extend(data[:missing])
+                data = data[missing:]
+                if len(buf) < need:
+                    return None, data
+            if need == 8 and not self.src_implicit_vr and \
+                    struct.unpack_from(self._src + 'H', buf)[0] != 0xFFFE \
+                    and bytes(buf[4:6]) in _LONG_VRS:
+                need = 12
+                continue
+            self._buffer = bytearray()
+            return bytes(buf), data
+
+    def _on_header(self, header, out):
+        src = self._src
+        group, elem = struct.unpack_from(src + 'HH', header)
+        self._pos += len(header)
+        if group == 0xFFFE:
+            length, = struct.unpack_from(src + 'L', header, 4)
+            self._on_item(elem, length, out)
+            return
+        if self.src_implicit_vr:
+            length, = struct.unpack_from(src + 'L', header, 4)
+            vr = _dictionary_vr(group, elem)
+        elif len(header) == 12:
+            vr = header[4:6]
+            length, = struct.unpack_from(src + 'L', header, 8)
+        else:
+            vr = header[4:6]
+            length, = struct.unpack_from(src + 'H', header, 6)
+        if self._undefine and elem == 0 and group != 0x0002:
+            # group length would be wrong once headers change their size
+            self._start_value(length, 1, drop=True)
+            return
+        if length == UNDEFINED_LENGTH:
+            if vr == b'UN' and self.src_implicit_vr:
+                vr = b'SQ'  # only sequences have undefined length there
+            out.append(self._element_header(group, elem, vr, length))
+            self._stack.append(
+                ['sequence' if vr in (b'SQ', b'UN') else 'fragments', None])
+        elif vr == b'SQ':
+            out.append(self._element_header(
+                group, elem, vr,
+                UNDEFINED_LENGTH if self._undefine else length))
+            self._stack.append(['sequence', self._pos + length])
+        else:
+            out.append(self._element_header(group, elem, vr, length))
+            self._start_value(length,
+                              _SWAP_UNITS.get(vr, 1) if self._swap else 1)
+
+    def _on_item(self, elem, length, out):
+        parent = self._stack[-1][0] if self._stack else None
+        if elem == _ITEM and parent == 'fragments':
+            # encapsulated pixel data fragment is copied as is
+            out.append(self._item_header(elem, length))
+            self._start_value(length, 1)
+        elif elem == _ITEM:
+            if length == UNDEFINED_LENGTH:
+                self._stack.append(['item', None])
+            else:
+                self._stack.append(['item', self._pos + length])
+                if self._undefine:
+                    length = UNDEFINED_LENGTH
+            out.append(self._item_header(elem, length))
+        else:
+            if self._stack:
+                self._stack.pop()
+            out.append(self._item_header(elem, 0))
+
+    def _close_containers(self, out):
+        stack = self._stack
+        while stack and stack[-1][1] is not None and \
+                self._pos >= stack[-1][1]:
+            kind, _ = stack.pop()
+            if self._undefine:
+                out.append(self._item_header(
+                    _ITEM_DELIMITATION if kind == 'item'
+                    else _SEQUENCE_DELIMITATION, 0))
+
+    def _start_value(self, length, unit, drop=False):
+        self._value = length
+        self._unit = unit
+        self._drop = drop
+
+    def _copy_value(self, data, out):
+        size = min(self._value, len(data))
+        piece, data = data[:size], data[size:]
+        self._value -= size
+        self._pos += size
+        if self._drop:
+            return data
+        if self._unit == 1:
+            if size:
+                out.append(piece)
+            return data
+        buf = self._buffer
+        buf.extend(piece)
+        whole = len(buf) - len(buf) % self._unit
+        if whole:
+            out.append(_swap_bytes(buf[:whole], self._unit))
+            del buf[:whole]
+        if not self._value and buf:
+            out.append(bytes(buf))  # value length is not a multiple of unit
+            del buf[:]
+        return data
+
+    def _item_header(self, elem, length):
+        return struct.pack(self._dst + 'HHL', 0xFFFE, elem, length)
+
+    def _element_header(self, group, elem, vr, length):
+        dst = self._dst
+        if self.dst_implicit_vr:
+            return struct.pack(dst + 'HHL', group, elem, length)
+        if vr not in _LONG_VRS and length > 0xFFFF:
+            vr = b'UN'  # value does not fit into short VR
+        if vr in _LONG_VRS:
+            return struct.pack(dst + 'HH2s2xL', group, elem, vr, length)
+        return struct.pack(dst + 'HH2sH', group, elem, vr, length)
+
+
+def _dictionary_vr(group, elem):
+    if elem == 0:
+        return b'UL'  # group length
+    if group % 2 and 0x0010 <= elem <= 0x00FF:
+        return b'LO'  # private creator
+    try:
+        vr = _dicom.dictionary_VR((group << 16) | elem)
+    except KeyError:
+        return b'UN'
+    candidates = vr.split(' or ')
+    # ambiguous VRs of implicit VR dataset (pixel data, LUTs) are words
+    vr = 'OW' if 'OW' in candidates else candidates[0]
+    return vr.encode('ascii')
+
+
+def _swap_bytes(data, unit):
+    swapped = bytearray(len(data))
+    for i in range(unit):
+        swapped[i::unit] = data[unit - 1 - i::unit]
+    return swapped
@@ -13,6 +13,19 @@ for incoming messages and sending messages from user queue.
 Underlying logic of the service is implemented via state machine that is
 described in DICOM standard.
 
+Two implementations of the service are available:
+
+    * :class:`~netdicom2.dulprovider.DULServiceProvider` - default
+      implementation that polls socket, outgoing queue and ARTIM timer in turn.
+    * :class:`~netdicom2.dulprovider.EventDrivenDULServiceProvider` - service
+      that sleeps until socket becomes readable, service user sends PDU or
+      ARTIM timer expires. Idle associations cost no CPU time and outgoing
+      PDUs are written without polling delay.
+
+Implementation used by associations is selected with
+:attr:`~netdicom2.applicationentity.AEBase.dul_provider` attribute of the
+application entity.
+
 In most of the cases you would not need to access
 :class:`~netdicom2.dulprovider.DULServiceProvider` directly, but rather would
 use higher level objects like sub-classes of
@@ -22,53 +35,286 @@ use higher level objects like sub-classes of
 from __future__ import absolute_import
 
 import collections
+import itertools
 
 import threading
 import socket
 import select
 import struct
+import time
 
-import six
 from six.moves import queue
 
+try:
+    import selectors
+except ImportError:  # Python 2.7
+    selectors = None
+
 from . import timer
 from . import fsm
 from . import pdu
 from . import exceptions
 
 
-def _recv_n(sock, n):
-    ret = []
-    read_length = 0
-    while read_length < n:
-        tmp = sock.recv(n - read_length)
-        ret.append(tmp)
-        read_length += len(tmp)
-    if read_length != n:
-        raise exceptions.NetDICOMError('Low level network error')
-    return b''.join(ret)
+IOV_MAX = 1024
+"""Maximum number of buffers passed to a single ``sendmsg`` call."""
+
+
+def send_buffers(sock, buffers):
+    """Sends all buffers to the socket.
+
+    Buffers are written with scatter/gather ``sendmsg`` call where it is
+    available, so they are not joined into a single string before sending.
+    File regions are copied from file to the socket with ``sendfile``.
+
+    :param sock: connected socket
+    :param buffers: list of bytes-like objects and
+                    :class:`~netdicom2.pdu.FileRegion` instances
+    """
+    if not hasattr(sock, 'sendmsg'):
+        sock.sendall(b''.join(pdu.load_buffers(buffers)))
+        return
+    pending = []
+    for buf in buffers:
+        if isinstance(buf, pdu.FileRegion):
+            _send_vectored(sock, pending)
+            pending = []
+            sock.sendfile(buf.fileobj, buf.offset, buf.length)
+        else:
+            pending.append(buf)
+    _send_vectored(sock, pending)
+
+
+def _send_vectored(sock, buffers):
+    buffers = collections.deque(memoryview(b) for b in buffers)
+    while buffers:
+        sent = sock.sendmsg(list(itertools.islice(buffers, IOV_MAX)))
+        while buffers and len(buffers[0]) <= sent:
+            sent -= len(buffers.popleft())
+        if sent:
+            buffers[0] = buffers[0][sent:]
+
+
+class PDUReader(object):
+    """Reads length-prefixed PDUs from the socket.
+
+    Reader owns receive buffer that is filled with ``recv_into``, so one large
+    read may bring in several PDUs. Each PDU is returned as ``memoryview``
+    slice of the buffer. Data that was handed out is never overwritten: once
+    buffer is exhausted reader switches to a new one, so PDUs (and
+    presentation data values decoded from them) stay valid for as long as
+    they are referenced. PDUs that do not fit into the buffer are received
+    directly into dedicated buffer of the exact PDU size.
+
+    :param sock: socket to read PDUs from
+    :param buffer_size: size of the receive buffer in bytes
+    """
+
+    header = struct.Struct('>B B I')
+
+    def __init__(self, sock, buffer_size=131072):
+        self.sock = sock
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # start of unprocessed data
+        self._end = 0  # end of received data
+
+    def has_pdu(self):
+        """Checks if complete PDU is already in the buffer.
+
+        :return: ``True`` if next PDU can be read without accessing socket
+        """
+        available = self._end - self._start
+        if available < 6:
+            return False
+        _, _, length = self.header.unpack_from(self._buffer, self._start)
+        return available >= length + 6
+
+    def read_pdu(self):
+        """Reads next PDU.
+
+        Method blocks until the whole PDU is received.
+
+        :return: tuple with PDU type and raw PDU, or ``None`` if connection
+                 was closed by remote AE.
+        :raise socket.error: on network error
+        """
+        if not self._fill(6):
+            return None
+        pdu_type, _, length = self.header.unpack_from(self._buffer,
+                                                      self._start)
+        total = length + 6
+        if total > len(self._buffer):
+            return pdu_type, self._read_large(total)
+        if not self._fill(total):
+            return None
+        raw_pdu = self._view[self._start:self._start + total]
+        self._start += total
+        return pdu_type, raw_pdu
+
+    def _fill(self, size):
+        available = self._end - self._start
+        if available >= size:
+            return True
+        if self._start + size > len(self._buffer):
+            # move partial PDU to the beginning of the new buffer, old one
+            # may still be referenced by previously returned PDUs
+            self._new_buffer(len(self._buffer))
+        while self._end - self._start < size:
+            received = self.sock.recv_into(self._view[self._end:])
+            if not received:
+                return False
+            self._end += received
+        return True
+
+    def _new_buffer(self, size):
+        available = self._end - self._start
+        buf = bytearray(size)
+        buf[:available] = self._view[self._start:self._end]
+        self._buffer, self._view = buf, memoryview(buf)
+        self._start, self._end = 0, available
+
+    def _read_large(self, total):
+        raw_pdu = bytearray(total)
+        view = memoryview(raw_pdu)
+        available = self._end - self._start
+        view[:available] = self._view[self._start:self._end]
+        self._start = self._end
+        while available < total:
+            received = self.sock.recv_into(view[available:])
+            if not received:
+                return None
+            available += received
+        return view
 
 
 PDU_TYPES = {
-    0x01: (pdu.AAssociateRqPDU, 'Evt6'),
-    0x02: (pdu.AAssociateAcPDU, 'Evt3'),
-    0x03: (pdu.AAssociateRjPDU, 'Evt4'),
-    0x04: (pdu.PDataTfPDU, 'Evt10'),
-    0x05: (pdu.AReleaseRqPDU, 'Evt12'),
-    0x06: (pdu.AReleaseRpPDU, 'Evt13'),
-    0x07: (pdu.AAbortPDU, 'Evt16')
+    0x01: (pdu.AAssociateRqPDU, fsm.EVT6),
+    0x02: (pdu.AAssociateAcPDU, fsm.EVT3),
+    0x03: (pdu.AAssociateRjPDU, fsm.EVT4),
+    0x04: (pdu.PDataTfPDU, fsm.EVT10),
+    0x05: (pdu.AReleaseRqPDU, fsm.EVT12),
+    0x06: (pdu.AReleaseRpPDU, fsm.EVT13),
+    0x07: (pdu.AAbortPDU, fsm.EVT16)
 }
 
 PDU_TO_EVENT = {
-    pdu.AAssociateRqPDU.pdu_type: 'Evt1',  # A-ASSOCIATE Request
-    pdu.AAssociateAcPDU.pdu_type: 'Evt7',  # A-ASSOCIATE Response (accept)
-    pdu.AAssociateRjPDU.pdu_type: 'Evt8',  # A-ASSOCIATE Response (reject)
-    pdu.AReleaseRqPDU.pdu_type: 'Evt11',   # A-Release Request
-    pdu.AReleaseRpPDU.pdu_type: 'Evt14',   # A-Release Response
-    pdu.AAbortPDU.pdu_type: 'Evt15',
-    pdu.PDataTfPDU.pdu_type: 'Evt9'
+    pdu.AAssociateRqPDU.pdu_type: fsm.EVT1,  # A-ASSOCIATE Request
+    pdu.AAssociateAcPDU.pdu_type: fsm.EVT7,  # A-ASSOCIATE Response (accept)
+    pdu.AAssociateRjPDU.pdu_type: fsm.EVT8,  # A-ASSOCIATE Response (reject)
+    pdu.AReleaseRqPDU.pdu_type: fsm.EVT11,   # A-Release Request
+    pdu.AReleaseRpPDU.pdu_type: fsm.EVT14,   # A-Release Response
+    pdu.AAbortPDU.pdu_type: fsm.EVT15,
+    pdu.PDataTfPDU.pdu_type: fsm.EVT9
 }
 
+SERVICE_USER_EVENTS = frozenset(PDU_TO_EVENT.values())
+"""Events that are issued by PDUs from the outgoing queue."""
+
+
+def pdu_size(primitive):
+    """Returns number of bytes PDU holds in memory while it is queued.
+
+    Only P-DATA-TF PDUs are accounted, other PDUs are small and are never
+    held back.
+
+    :param primitive: PDU instance
+    :return: size of the PDU in bytes
+    """
+    if isinstance(primitive, pdu.PDataTfPDU):
+        return primitive.pdu_length
+    return 0
+
+
+class PDUQueue(queue.Queue):
+    """Queue of PDUs that is bounded by the size of queued PDUs in bytes.
+
+    Queue is considered full when size of queued PDUs reaches
+    ``high_water`` mark. PDU is still accepted by the empty queue even if it is
+    larger than the mark, so a single large PDU never blocks forever. PDUs
+    other than P-DATA-TF are always accepted.
+
+    Producer could either block in
+    :meth:`~netdicom2.dulprovider.PDUQueue.put` until queue has room, or check
+    :meth:`~netdicom2.dulprovider.PDUQueue.full` and hold the data back by
+    itself. In the latter case ``space_callback`` (if set) is called when
+    consumer takes PDU out of the full queue. Callback is called with the
+    queue lock held, so it should not access the queue.
+
+    :param high_water: maximum size of queued PDUs in bytes, ``None`` means
+                       unbounded queue
+    :ivar nbytes: size of queued PDUs in bytes
+    """
+
+    def __init__(self, high_water=None):
+        queue.Queue.__init__(self)
+        self.high_water = high_water
+        self.space_callback = None
+        self.nbytes = 0
+
+    def full(self):
+        with self.mutex:
+            return self._is_full()
+
+    def put(self, item, block=True, timeout=None):
+        with self.not_full:
+            if not pdu_size(item):
+                pass  # control PDUs are never held back
+            elif not block:
+                if self._is_full():
+                    raise queue.Full
+            elif timeout is None:
+                while self._is_full():
+                    self.not_full.wait()
+            else:
+                if timeout < 0:
+                    raise ValueError("'timeout' must be a non-negative number")
+                deadline = time.time() + timeout
+                while self._is_full():
+                    remaining = deadline - time.time()
+                    if remaining <= 0.0:
+                        raise queue.Full
+                    self.not_full.wait(remaining)
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def unbound(self):
+        """Removes the size limit and wakes up blocked producers.
+
+        Method is called when consumer is gone, so producers would not wait
+        for the room that never appears.
+        """
+        with self.mutex:
+            self.high_water = None
+            self.not_full.notify_all()
+
+    def _is_full(self):
+        return self.high_water is not None and self.nbytes and \
+            self.nbytes >= self.high_water
+
+    def _put(self, item):
+        self.nbytes += pdu_size(item)
+        self.queue.append(item)
+
+    def _get(self):
+        was_full = self._is_full()
+        item = self.queue.popleft()
+        self.nbytes -= pdu_size(item)
+        if was_full and self.space_callback is not None:
+            self.space_callback()  # called with the queue lock held
+        return item
+
+
+class _Deadline(object):
+    """Marker that is put into incoming queue when receive deadline expires.
+    """
+
+    __slots__ = ('number',)
+
+    def __init__(self, number):
+        self.number = number
+
 
 class DULServiceProvider(threading.Thread):
     """Implements DUL service.
@@ -83,9 +329,41 @@ class DULServiceProvider(threading.Thread):
 
     Underlying implementation relies on state machine that is defined in :doc:`fsm`
 
+    Incoming PDUs are read through :class:`~netdicom2.dulprovider.PDUReader`.
+
+    P-DATA-TF PDUs sent while association is established (Sta6) are written
+    to the socket right from the service user thread, bypassing outgoing
+    queue and event loop. All other PDUs, as well as P-DATA-TF PDUs sent in
+    other states or queued behind another PDU, go through the event loop.
+    Socket writes and state transitions are serialized with a lock.
+
+    Both incoming and outgoing queues are
+    :class:`~netdicom2.dulprovider.PDUQueue` instances bounded in bytes. When
+    incoming queue is full service stops reading the socket until service
+    user takes PDUs out of the queue, so TCP flow control slows remote AE
+    down. Service user that sends PDUs into the full outgoing queue is
+    blocked.
+    """
+
+    receive_buffer_size = 131072
+    """Size of the receive buffer in bytes."""
+
+    incoming_high_water = 4 * 1024 * 1024
     """
+    Maximum size in bytes of received PDUs that are waiting for the service
+    user. ``None`` means unbounded queue.
+    """
+
+    outgoing_high_water = 4 * 1024 * 1024
+    """
+    Maximum size in bytes of PDUs that are waiting to be written to the
+    socket. ``None`` means unbounded queue.
+    """
+
+    artim_timeout = 10
+    """ARTIM timer timeout in seconds."""
 
-    def __init__(self, dul_socket=None):
+    def __init__(self, dul_socket=None, timer_wheel=None):
         """Initializes DUL service.
 
         If no socket is provided service will act as 'client' and will open
@@ -94,22 +372,33 @@ class DULServiceProvider(threading.Thread):
 
         :param dul_socket: remote client socket that will be used to send and
                            receive PDUs.
+        :param timer_wheel: :class:`~netdicom2.timer.TimerWheel` that keeps
+                            ARTIM timer and receive deadlines. If wheel is not
+                            provided service checks its timers by itself.
         """
         super(DULServiceProvider, self).__init__()
 
         self.primitive = None  # current pdu
         self.event = collections.deque()
 
-        self.to_service_user = queue.Queue()
-        self.from_service_user = queue.Queue()
+        self.to_service_user = PDUQueue(self.incoming_high_water)
+        self.from_service_user = PDUQueue(self.outgoing_high_water)
+        self._write_lock = threading.RLock()
+        self.connect_timeout = None
+        self._deadlines = itertools.count()
 
         # Setup the timer and finite state machines
-        self.timer = timer.Timer(10)
+        self.timer_wheel = timer_wheel
+        self.timer = timer.Timer(self.artim_timeout, timer_wheel,
+                                 self._timer_expired)
         self.state_machine = fsm.StateMachine(self)
         self._is_killed = threading.Event()
 
         if dul_socket:  # A client socket has been given. Generate an event 5
-            self.event.append('Evt5')
+            self.event.append(fsm.EVT5)
+            self.reader = PDUReader(dul_socket, self.receive_buffer_size)
+        else:
+            self.reader = None
 
         self.dul_socket = dul_socket
 
@@ -122,12 +411,17 @@ class DULServiceProvider(threading.Thread):
         .. note::
 
             PDU is not immediately written into the socket, but rather put into
-            queue that is processed by service event loop.
+            queue that is processed by service event loop. The only exception
+            is P-DATA-TF PDU sent in established association, it is written
+            immediately.
+
+        Method blocks while outgoing queue is full.
 
         :param primitive: outgoing PDU. Possible PDU types are described
                           in :doc:`pdu`
         """
-        self.from_service_user.put(primitive)
+        if not self._write_directly(primitive):
+            self.from_service_user.put(primitive)
 
     def receive(self, timeout):
         """Tries to get PDU from incoming queue.
@@ -135,16 +429,76 @@ class DULServiceProvider(threading.Thread):
         If timeout is exceeded method
         rises :class:`~netdicom2.exceptions.TimeoutError` exception.
 
+        If service has a timer wheel, deadline is scheduled on the wheel,
+        which puts expiration marker into incoming queue. Method should not
+        be called from several threads at once.
+
         :param timeout: the amount of seconds method waits for PDU to appear
                         in incoming queue
         :return: PDU instance. Possible PDU types are described
                  in :doc:`pdu`
         :raise exceptions.TimeoutError: If specified timeout is exceeded
         """
+        if self.timer_wheel is None or timeout is None:
+            try:
+                return self.to_service_user.get(timeout=timeout)
+            except queue.Empty:
+                raise exceptions.TimeoutError()
+
+        deadline = _Deadline(next(self._deadlines))
+        handle = self.timer_wheel.schedule(
+            timeout, lambda: self.to_service_user.put(deadline))
         try:
-            return self.to_service_user.get(timeout=timeout)
-        except queue.Empty:
-            raise exceptions.TimeoutError()
+            while True:
+                primitive = self.to_service_user.get()
+                if primitive is deadline:
+                    raise exceptions.TimeoutError()
+                if not isinstance(primitive, _Deadline):
+                    return primitive
+                # marker of the deadline that was cancelled too late
+        finally:
+            handle.cancel()
+
+    def has_incoming_pdu(self):
+        """Checks if incoming queue holds PDUs for service user.
+
+        Markers of receive deadlines that were cancelled too late are not
+        counted.
+        """
+        with self.to_service_user.mutex:
+            return any(not isinstance(primitive, _Deadline)
+                       for primitive in self.to_service_user.queue)
+
+    def connect(self, address):
+        """Opens transport connection to the remote AE.
+
+        :param address: tuple with remote AE address and port
+        :raise socket.timeout: if connection was not established within
+                               ``connect_timeout`` seconds
+        """
+        self.dul_socket = socket.create_connection(address,
+                                                   self.connect_timeout)
+        self.dul_socket.settimeout(None)
+        self.reader = PDUReader(self.dul_socket, self.receive_buffer_size)
+
+    def write_pdu(self, primitive):
+        """Writes encoded PDU to the transport connection.
+
+        Method is called by state machine actions from service event loop.
+
+        :param primitive: outgoing PDU
+        """
+        if isinstance(primitive, pdu.PDataTfPDU):
+            send_buffers(self.dul_socket, primitive.encode_buffers())
+        else:
+            self.dul_socket.sendall(primitive.encode())
+
+    def close_transport(self):
+        """Closes transport connection."""
+        with self._write_lock:
+            self.dul_socket.close()
+            self.dul_socket = None
+            self.reader = None
 
     def stop(self):
         """Tries to stop service for idle association.
@@ -155,7 +509,7 @@ class DULServiceProvider(threading.Thread):
         :return: ``True`` if service termination flag was successfully set
                  (current association state was 'idle'), ``False`` otherwise
         """
-        if self.state_machine.current_state == 'Sta1':
+        if self.state_machine.state == fsm.STA1:
             self.is_killed = True
             return True
         else:
@@ -169,46 +523,80 @@ class DULServiceProvider(threading.Thread):
     def run(self):
         try:
             while not self.is_killed:
-                self._check_network() or self._check_outgoing_pdu() or\
-                    self._check_timer()
+                self._wait_for_event()
                 try:
                     evt = self.event.popleft()
                 except IndexError:
                     continue
-                self.state_machine.action(evt, self)
+                with self._write_lock:
+                    self.state_machine.action(evt, self)
+                    if evt in SERVICE_USER_EVENTS:
+                        self.from_service_user.task_done()
         except Exception:
             self.to_service_user.put(pdu.AAbortPDU(source=0, reason_diag=0))
             raise
         finally:
+            self.from_service_user.unbound()
             self._is_killed.set()
 
-    def _check_network(self):
-        if self.state_machine.current_state == 'Sta13':
-            # waiting for connection to close
-            if self.dul_socket is None:
+    def _timer_expired(self):
+        pass  # event loop checks timer by itself
+
+    def _write_directly(self, primitive):
+        if not isinstance(primitive, pdu.PDataTfPDU):
+            return False
+        with self._write_lock:
+            # PDU could not overtake PDUs that are still in the queue.
+            # Transport may be already closed by event loop before it
+            # processed the event, PDU is queued then.
+            if self.state_machine.state != fsm.STA6 or \
+                    self.dul_socket is None or \
+                    self.from_service_user.unfinished_tasks:
                 return False
+            self.write_pdu(primitive)
+            self.state_machine.record(fsm.EVT9)
+            return True
 
-            # wait for remote connection to close
+    def _wait_for_event(self):
+        self._check_network() or self._check_outgoing_pdu() or\
+            self._check_timer()
+
+    def _check_transport(self):
+        if self.dul_socket is None:
+            return False
+
+        if self.state_machine.state == fsm.STA13:
+            # waiting for connection to close
             try:
                 while self.dul_socket.recv(1) != b'':
                     continue
             except socket.error:
                 return False
 
-            self.dul_socket.close()
-            self.dul_socket = None
-            self.event.append('Evt17')
+            self.close_transport()
+            self.event.append(fsm.EVT17)
+            return True
+
+        if self.state_machine.state == fsm.STA4:
+            self.event.append(fsm.EVT2)
+            return True
+        return False
+
+    def _check_network(self):
+        if self._check_transport():
             return True
 
         if not self.dul_socket:
             return False
 
-        if self.state_machine.current_state == 'Sta4':
-            self.event.append('Evt2')
-            return True
+        if self.to_service_user.full():
+            # service user is behind, leave data in the socket buffer
+            time.sleep(0.05)
+            return False
 
         # check if something comes in the client socket
-        if select.select([self.dul_socket], [], [], 0.05)[0]:
+        if self.reader.has_pdu() or \
+                select.select([self.dul_socket], [], [], 0.05)[0]:
             self._check_incoming_pdu()
             return True
         else:
@@ -228,7 +616,7 @@ class DULServiceProvider(threading.Thread):
 
     def _check_timer(self):
         if self.timer.check() is False:
-            self.event.append('Evt18')  # Timer expired
+            self.event.append(fsm.EVT18)  # Timer expired
             return True
         else:
             return False
@@ -236,33 +624,170 @@ class DULServiceProvider(threading.Thread):
     def _check_incoming_pdu(self):
         # There is something to read
         try:
-            raw_pdu = self.dul_socket.recv(1)
+            result = self.reader.read_pdu()
         except socket.error:
-            self.event.append('Evt17')
-            self.dul_socket.close()
-            self.dul_socket = None
-            return
+            result = None
 
-        if raw_pdu == b'':
+        if result is None:
             # Remote port has been closed
-            self.event.append('Evt17')
-            self.dul_socket.close()
-            self.dul_socket = None
+            self.event.append(fsm.EVT17)
+            self.close_transport()
             return
+
+        # Determine the type of PDU coming on remote port and set the event
+        # accordingly
+        pdu_type, raw_pdu = result
+        try:
+            pdu_class, event = PDU_TYPES[pdu_type]
+        except KeyError:
+            self.event.append(fsm.EVT19)
         else:
-            res = _recv_n(self.dul_socket, 1)
-            raw_pdu += res
-            length = _recv_n(self.dul_socket, 4)
-            raw_pdu += length
-            length = struct.unpack('>L', length)
-            tmp = _recv_n(self.dul_socket, length[0])
-            raw_pdu += tmp
-
-            # Determine the type of PDU coming on remote port and set the event
-            # accordingly
+            self.primitive = pdu_class.decode(raw_pdu)
+            self.event.append(event)
+
+
+class EventDrivenDULServiceProvider(DULServiceProvider):
+    """Implements DUL service without polling.
+
+    Event loop of this service blocks until one of the following happens:
+
+        * data arrives on the association socket
+        * service user puts PDU into outgoing queue
+        * ARTIM timer expires
+
+    Service user wakes event loop up through a socket pair, so outgoing PDUs
+    are written to the network as soon as they are sent. Timer deadline is used
+    as a wait timeout, thus idle association does not consume CPU time.
+
+    Service has the same interface as
+    :class:`~netdicom2.dulprovider.DULServiceProvider` and can be used as a
+    drop-in replacement.
+
+    .. note::
+
+        This service relies on ``selectors`` module and is not available on
+        Python 2.7.
+    """
+
+    def __init__(self, dul_socket=None, timer_wheel=None):
+        """Initializes event driven DUL service.
+
+        :param dul_socket: remote client socket that will be used to send and
+                           receive PDUs.
+        :param timer_wheel: :class:`~netdicom2.timer.TimerWheel` that keeps
+                            ARTIM timer and receive deadlines
+        """
+        if selectors is None:
+            raise exceptions.NetDICOMError(
+                'Event driven DUL service requires selectors module')
+
+        # Event loop is started by base class initializer, so wake up channel
+        # has to be ready before that.
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._wakeup_recv, selectors.EVENT_READ)
+        self._selected_socket = None
+
+        super(EventDrivenDULServiceProvider, self).__init__(dul_socket,
+                                                            timer_wheel)
+
+    def send(self, primitive):
+        """Puts PDU into outgoing queue and wakes up event loop.
+
+        P-DATA-TF PDU in established association is written immediately.
+
+        :param primitive: outgoing PDU. Possible PDU types are described
+                          in :doc:`pdu`
+        """
+        if not self._write_directly(primitive):
+            self.from_service_user.put(primitive)
+            self._wakeup()
+
+    def stop(self):
+        """Tries to stop service for idle association.
+
+        :return: ``True`` if service termination flag was successfully set
+                 (current association state was 'idle'), ``False`` otherwise
+        """
+        stopped = super(EventDrivenDULServiceProvider, self).stop()
+        if stopped:
+            self._wakeup()
+        return stopped
+
+    def kill(self):
+        """Sets termination flag for event loop and waits for thread to exit."""
+        self.is_killed = True
+        self._wakeup()
+        self._is_killed.wait()
+
+    def run(self):
+        # socket is not watched while incoming queue is full, service user
+        # wakes event loop up when it takes PDU out of the queue
+        self.to_service_user.space_callback = self._wakeup
+        try:
+            super(EventDrivenDULServiceProvider, self).run()
+        finally:
+            self._selector.close()
+            self._wakeup_recv.close()
+            self._wakeup_send.close()
+
+    def _timer_expired(self):
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self._wakeup_send.send(b'\0')
+        except socket.error:
+            pass  # wake up channel is full or already closed
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_recv.recv(4096):
+                continue
+        except socket.error:
+            pass
+
+    def _update_selector(self, throttled):
+        dul_socket = None if throttled else self.dul_socket
+        if dul_socket is self._selected_socket:
+            return
+        if self._selected_socket is not None:
             try:
-                pdu_type, event = PDU_TYPES[six.indexbytes(raw_pdu, 0)]
-                self.primitive = pdu_type.decode(raw_pdu)
-                self.event.append(event)
-            except KeyError:
-                self.event.append('Evt19')
+                self._selector.unregister(self._selected_socket)
+            except (KeyError, ValueError):
+                pass
+        if dul_socket is not None:
+            self._selector.register(dul_socket, selectors.EVENT_READ)
+        self._selected_socket = dul_socket
+
+    def _wait_for_event(self):
+        # Only one event is generated per call, since every event carries its
+        # PDU in `self.primitive`.
+        if self.event or self.is_killed:
+            return
+        if self._check_transport():
+            return
+        throttled = self.to_service_user.full()
+        if not throttled and self.reader is not None and \
+                self.reader.has_pdu():
+            self._check_incoming_pdu()
+            return
+        if self._check_outgoing_pdu():
+            return
+
+        self._update_selector(throttled)
+        # timer scheduled on the wheel wakes event loop up when it expires
+        ready = self._selector.select(self.timer.remaining())
+        network_ready = False
+        for key, _ in ready:
+            if key.fileobj is self._wakeup_recv:
+                self._drain_wakeup()
+            else:
+                network_ready = True
+
+        if network_ready:
+            self._check_incoming_pdu()
+        else:
+            self._check_outgoing_pdu() or self._check_timer()
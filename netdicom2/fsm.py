@@ -7,34 +7,96 @@
 """
 Implementation of the OSI Upper Layer Services
 DICOM, Part 8, Section 7
+
+State machine actions do not access transport directly. Instead they use
+the following methods of the DUL service provider:
+
+    * ``connect(address)`` - open transport connection to remote AE
+    * ``write_pdu(primitive)`` - write PDU to the transport connection
+    * ``close_transport()`` - close transport connection
+
+This allows the same transition table to drive both threaded
+(:doc:`dulprovider`) and ``asyncio`` based service providers.
+
+Events and states are passed around as integer codes (``EVT1`` ..
+``EVT19``, ``STA1`` .. ``STA13``). :data:`TransitionTable` is compiled with
+:func:`~netdicom2.fsm.compile_table` into a flat list, so every event costs a
+single list lookup. Transition statistics could be collected at runtime
+with :func:`~netdicom2.fsm.enable_statistics`::
+
+    from netdicom2 import fsm
+
+    statistics = fsm.enable_statistics()
+    ...  # run some associations
+    print(statistics.time_in_states())
+    fsm.disable_statistics()
 """
 
 from __future__ import absolute_import
 
-import socket
+import threading
+
+import six
 
 from . import pdu
+from . import timer
+
+# Events and states are numbered as in the standard. Transition table is
+# written with names for readability and is compiled into a list indexed by
+# event and state codes.
+
+(EVT1, EVT2, EVT3, EVT4, EVT5, EVT6, EVT7, EVT8, EVT9, EVT10, EVT11, EVT12,
+ EVT13, EVT14, EVT15, EVT16, EVT17, EVT18, EVT19) = range(1, 20)
+
+(STA1, STA2, STA3, STA4, STA5, STA6, STA7, STA8, STA9, STA10, STA11, STA12,
+ STA13) = range(1, 14)
+
+EVENT_COUNT = 20
+"""Size of the event dimension of compiled table (codes start at 1)."""
+
+STATE_COUNT = 14
+"""Size of the state dimension of compiled table (codes start at 1)."""
+
+
+def event_code(name):
+    """Converts event name (e.g. ``'Evt10'``) to event code."""
+    return int(name[3:])
+
+
+def state_code(name):
+    """Converts state name (e.g. ``'Sta6'``) to state code."""
+    return int(name[3:])
+
+
+def event_name(code):
+    """Converts event code to event name."""
+    return 'Evt{0}'.format(code)
+
+
+def state_name(code):
+    """Converts state code to state name."""
+    return 'Sta{0}'.format(code)
+
 
 # Finite State machine action definitions
 
 
 def ae_1(provider):
     """Issue TransportConnect request primitive to local transport service."""
-    provider.dul_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    provider.dul_socket.connect(provider.primitive.called_presentation_address)
-    return 'Sta4'
+    provider.connect(provider.primitive.called_presentation_address)
+    return STA4
 
 
 def ae_2(provider):
     """Send A_ASSOCIATE-RQ PDU."""
-    provider.dul_socket.send(provider.primitive.encode())
-    return 'Sta5'
+    provider.write_pdu(provider.primitive)
+    return STA5
 
 
 def ae_3(provider):
     """Issue A-ASSOCIATE confirmation (accept) primitive."""
     provider.to_service_user.put(provider.primitive)
-    return 'Sta6'
+    return STA6
 
 
 def ae_4(provider):
@@ -42,16 +104,15 @@ def ae_4(provider):
     connection.
     """
     provider.to_service_user.put(provider.primitive)
-    provider.dul_socket.close()
-    provider.dul_socket = None
-    return 'Sta1'
+    provider.close_transport()
+    return STA1
 
 
 def ae_5(provider):
     """Issue transport connection response primitive; start ARTIM timer."""
     # Don't need to send this primitive.
     provider.timer.start()
-    return 'Sta2'
+    return STA2
 
 
 def ae_6(provider):
@@ -64,119 +125,117 @@ def ae_6(provider):
     # Accept
     provider.to_service_user.put(provider.primitive)
     # TODO Look into why according to standard transition to `Sta13` may occur
-    return 'Sta3'
+    return STA3
 
 
 def ae_7(provider):
     """Send A-ASSOCIATE-AC PDU."""
-    provider.dul_socket.send(provider.primitive.encode())
-    return 'Sta6'
+    provider.write_pdu(provider.primitive)
+    return STA6
 
 
 def ae_8(provider):
     """Send A-ASSOCIATE-RJ PDU."""
     # not sure about this ...
-    provider.dul_socket.send(provider.primitive.encode())
-    return 'Sta13'
+    provider.write_pdu(provider.primitive)
+    return STA13
 
 
 def dt_1(provider):
     """Send P-DATA-TF PDU."""
-    provider.dul_socket.send(provider.primitive.encode())
+    provider.write_pdu(provider.primitive)
     provider.primitive = None
-    return 'Sta6'
+    return STA6
 
 
 def dt_2(provider):
     """Send P-DATA indication primitive."""
     provider.to_service_user.put(provider.primitive)
-    return 'Sta6'
+    return STA6
 
 
 def ar_1(provider):
     """Send A-RELEASE-RQ PDU."""
     provider.primitive = pdu.AReleaseRqPDU()
-    provider.dul_socket.send(provider.primitive.encode())
-    return 'Sta7'
+    provider.write_pdu(provider.primitive)
+    return STA7
 
 
 def ar_2(provider):
     """Send A-RELEASE indication primitive."""
     provider.to_service_user.put(provider.primitive)
-    return 'Sta8'
+    return STA8
 
 
 def ar_3(provider):
     """Issue A-RELEASE confirmation primitive and close transport connection."""
     provider.to_service_user.put(provider.primitive)
-    provider.dul_socket.close()
-    provider.dul_socket = None
-    return 'Sta1'
+    provider.close_transport()
+    return STA1
 
 
 def ar_4(provider):
     """Issue A-RELEASE-RP PDU and start ARTIM timer."""
     provider.primitive = pdu.AReleaseRpPDU()
-    provider.dul_socket.send(provider.primitive.encode())
+    provider.write_pdu(provider.primitive)
     provider.timer.start()
-    return 'Sta13'
+    return STA13
 
 
 def ar_5(provider):
     """Stop ARTIM timer."""
     provider.timer.stop()
-    return 'Sta1'
+    return STA1
 
 
 def ar_6(provider):
     """Issue P-DATA indication."""
     provider.to_service_user.put(provider.primitive)
-    return 'Sta7'
+    return STA7
 
 
 def ar_7(provider):
     """Issue P-DATA-TF PDU."""
-    provider.dul_socket.send(provider.primitive.encode())
-    return 'Sta8'
+    provider.write_pdu(provider.primitive)
+    return STA8
 
 
 def ar_8(provider):
     """Issue A-RELEASE indication (release collision)."""
     provider.to_service_user.put(provider.primitive)
     if provider.requestor == 1:
-        return 'Sta9'
+        return STA9
     else:
-        return 'Sta10'
+        return STA10
 
 
 def ar_9(provider):
     """Send A-RELEASE-RP PDU."""
     provider.primitive = pdu.AReleaseRpPDU()
-    provider.dul_socket.send(provider.primitive.encode())
-    return 'Sta11'
+    provider.write_pdu(provider.primitive)
+    return STA11
 
 
 def ar_10(provider):
     """Issue A-RELEASE confirmation primitive."""
     provider.to_service_user.put(provider.primitive)
-    return 'Sta12'
+    return STA12
 
 
 def aa_1(provider):
     """Send A-ABORT PDU (service-user source) and start (or restart)
     ARTIM timer.
     """
-    provider.dul_socket.send(provider.primitive.encode())
+    provider.write_pdu(provider.primitive)
     provider.timer.restart()
-    return 'Sta13'
+    return STA13
 
 
 def aa_2(provider):
     """Stop ARTIM timer if running. Close transport connection."""
     provider.timer.stop()
-    provider.dul_socket.close()
-    provider.dul_socket = None
-    return 'Sta1'
+    provider.close_transport()
+    return STA1
 
 
 def aa_3(provider):
@@ -188,9 +247,8 @@ def aa_3(provider):
        - Issue A-P-ABORT indication and close transport connection.
          This action is triggered by the reception of an A-ABORT PDU."""
     provider.to_service_user.put(provider.primitive)
-    provider.dul_socket.close()
-    provider.dul_socket = None
-    return 'Sta1'
+    provider.close_transport()
+    return STA1
 
 
 def aa_4(provider):
@@ -198,37 +256,37 @@ def aa_4(provider):
     # TODO look into this action
     provider.primitive = pdu.AAbortPDU(source=0, reason_diag=0)
     provider.to_service_user.put(provider.primitive)
-    return 'Sta1'
+    return STA1
 
 
 def aa_5(provider):
     """Stop ARTIM timer."""
     provider.timer.stop()
-    return 'Sta1'
+    return STA1
 
 
 def aa_6(provider):
     """Ignore PDU."""
     provider.primitive = None
-    return 'Sta13'
+    return STA13
 
 
 def aa_7(provider):
     """Send A-ABORT PDU."""
-    provider.dul_socket.send(provider.primitive.encode())
-    return 'Sta13'
+    provider.write_pdu(provider.primitive)
+    return STA13
 
 
 def aa_8(provider):
     """Send A-ABORT PDU, issue an A-P-ABORT indication and start ARTIM timer."""
     provider.primitive = pdu.AAbortPDU(source=2, reason_diag=0)
     if provider.dul_socket:
-        provider.dul_socket.send(provider.primitive.encode())
+        provider.write_pdu(provider.primitive)
 
         # Issue A-P-ABORT indication
         provider.to_service_user.put(provider.primitive)
         provider.timer.start()
-    return 'Sta13'
+    return STA13
 
 
 # Finite State Machine
@@ -424,12 +482,155 @@ TransitionTable = {
     ('Evt19', 'Sta13'): aa_7}
 
 
+def compile_table(table):
+    """Compiles transition table into a list of actions.
+
+    Action for event ``e`` in state ``s`` is stored at
+    ``e * STATE_COUNT + s``. Missing transitions are ``None``.
+
+    :param table: dictionary that maps ``('EvtN', 'StaM')`` tuples to actions
+    :return: list of actions
+    """
+    compiled = [None] * (EVENT_COUNT * STATE_COUNT)
+    for (event, state), action in six.iteritems(table):
+        compiled[event_code(event) * STATE_COUNT + state_code(state)] = action
+    return compiled
+
+
+Transitions = compile_table(TransitionTable)
+"""Compiled :data:`TransitionTable`."""
+
+
+class TransitionStatistics(object):
+    """Counts state machine transitions of all associations.
+
+    Statistics is collected while it is enabled with
+    :func:`~netdicom2.fsm.enable_statistics`. For every transition number of
+    occurrences and monotonic time of the last occurrence are kept. Time
+    associations spent in each state is accumulated as well, so it is easy to
+    see, for example, how long associations stay established (Sta6) compared
+    to waiting for transport connection close (Sta13).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clears collected statistics."""
+        with self._lock:
+            self._counts = [0] * (EVENT_COUNT * STATE_COUNT)
+            self._timestamps = [None] * (EVENT_COUNT * STATE_COUNT)
+            self._state_time = [0.0] * STATE_COUNT
+
+    def add(self, index, state, elapsed, now):
+        with self._lock:
+            self._counts[index] += 1
+            self._timestamps[index] = now
+            if elapsed is not None:
+                self._state_time[state] += elapsed
+
+    def transitions(self):
+        """Returns transition counters.
+
+        :return: dictionary that maps ``('EvtN', 'StaM')`` tuples to tuples
+                 with number of transitions and time of the last transition
+        """
+        with self._lock:
+            return {
+                (event_name(index // STATE_COUNT),
+                 state_name(index % STATE_COUNT)): (count,
+                                                    self._timestamps[index])
+                for index, count in enumerate(self._counts) if count
+            }
+
+    def time_in_states(self):
+        """Returns total time associations spent in each state.
+
+        Time is accounted when association leaves the state.
+
+        :return: dictionary that maps state names to number of seconds
+        """
+        with self._lock:
+            return {state_name(state): elapsed
+                    for state, elapsed in enumerate(self._state_time)
+                    if elapsed}
+
+
+_statistics = None
+
+
+def enable_statistics():
+    """Starts collecting transition statistics.
+
+    :return: :class:`~netdicom2.fsm.TransitionStatistics` instance that
+             collects statistics
+    """
+    global _statistics
+    if _statistics is None:
+        _statistics = TransitionStatistics()
+    return _statistics
+
+
+def disable_statistics():
+    """Stops collecting transition statistics."""
+    global _statistics
+    _statistics = None
+
+
 class StateMachine(object):
-    def __init__(self, provider):
-        self.current_state = 'Sta1'
+    """DUL state machine.
+
+    :param provider: DUL service provider
+    :param transitions: compiled transition table (see
+                        :func:`~netdicom2.fsm.compile_table`)
+    :ivar state: current state code
+    """
+
+    def __init__(self, provider, transitions=Transitions):
+        self.state = STA1
         self.provider = provider
+        self.transitions = transitions
+        self._entered = None
+
+    @property
+    def current_state(self):
+        """Current state name (e.g. ``'Sta6'``)."""
+        return state_name(self.state)
+
+    @current_state.setter
+    def current_state(self, name):
+        self.state = state_code(name)
 
     def action(self, event, provider):
-        """ Execute the action triggered by event """
-        action = TransitionTable[(event, self.current_state)]
-        self.current_state = action(provider)
+        """Executes the action triggered by event.
+
+        :param event: event code
+        :param provider: DUL service provider
+        :raise KeyError: if transition is not defined
+        """
+        state = self.state
+        index = event * STATE_COUNT + state
+        action = self.transitions[index]
+        if action is None:
+            raise KeyError((event_name(event), state_name(state)))
+        self.state = action(provider)
+        if _statistics is not None:
+            self._record(_statistics, index, state)
+
+    def record(self, event):
+        """Records transition that was carried out bypassing
+        :meth:`~netdicom2.fsm.StateMachine.action` (e.g. P-DATA-TF PDU written
+        directly by the service user thread). State is not changed.
+
+        :param event: event code
+        """
+        if _statistics is not None:
+            self._record(_statistics, event * STATE_COUNT + self.state,
+                         self.state)
+
+    def _record(self, statistics, index, state):
+        now = timer.monotonic()
+        elapsed = None if self._entered is None else now - self._entered
+        self._entered = now
+        statistics.add(index, state, elapsed, now)
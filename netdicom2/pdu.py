@@ -273,28 +273,44 @@ class PDataTfPDU(object):
                     for i in self.data_value_items))
 
     def encode(self):
-        return self.header.pack(self.pdu_type, self.reserved, self.pdu_length)\
-            + b''.join([item.encode()
-                        for item in self.data_value_items])
+        return b''.join(load_buffers(self.encode_buffers()))
+
+    def encode_buffers(self):
+        """Encodes PDU as a list of buffers.
+
+        PDU and item headers are packed into small byte strings, while
+        presentation data values are passed as is, so the list could be sent
+        with a single scatter/gather call without copying message fragments.
+
+        :return: list of bytes-like objects and
+                 :class:`~netdicom2.pdu.FileRegion` instances
+        """
+        buffers = [self.header.pack(self.pdu_type, self.reserved,
+                                    self.pdu_length)]
+        for item in self.data_value_items:
+            buffers.extend(item.encode_buffers())
+        return buffers
 
     @classmethod
     def decode(cls, rawstring):
         """Factory method. Decodes P-DATA-TF PDU instance from raw string.
 
+        Presentation data value items are not copied from the raw string,
+        instead they reference it through ``memoryview`` slices.
+
         :param rawstring: rawstring containing binary representation of the
                           P-DATA-TF PDU
         :return: decoded PDU
         """
-        def iter_items():
-            length_read = 0
-            while length_read != pdu_length:
-                item = PresentationDataValueItem.decode(stream)
-                length_read += item.total_length()
-                yield item
-
-        stream = cStringIO(rawstring)
-        pdu_type, reserved, pdu_length = cls.header.unpack(stream.read(6))
-        data_value_items = list(iter_items())
+        buf = memoryview(rawstring)
+        _, reserved, pdu_length = cls.header.unpack_from(buf)
+        offset = cls.header.size
+        end = offset + pdu_length
+        data_value_items = []
+        while offset < end:
+            item = PresentationDataValueItem.decode_from(buf, offset)
+            offset += item.total_length()
+            data_value_items.append(item)
         return cls(data_value_items, reserved)
 
     def total_length(self):
@@ -751,7 +767,39 @@ class UserInformationItem(object):
         return 4 + self.item_length
 
 
+class EncodedItems(object):
+    """Sequence of variable items that is already encoded.
+
+    Used by association requester to reuse application context and
+    presentation context items of A-ASSOCIATE-RQ PDU (see
+    :func:`~netdicom2.asceprovider.build_request_template`).
+
+    :param data: encoded variable items
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def __repr__(self):
+        return 'EncodedItems(length={0})'.format(len(self.data))
+
+    def encode(self):
+        return self.data
+
+    def total_length(self):
+        return len(self.data)
+
+
 class PresentationDataValueItem(object):
+    """
+    Presentation Data Value Item (PS 3.8 9.3.5.1)
+
+    :param context_id: presentation context ID
+    :param data_value: presentation data value: message control header
+                       followed by message fragment. Value could be any
+                       bytes-like object (including ``memoryview``).
+    """
+
     header = struct.Struct('>I B')
 
     def __init__(self, context_id, data_value):
@@ -767,10 +815,22 @@ class PresentationDataValueItem(object):
     def item_length(self):
         return len(self.data_value) + 1
 
+    @property
+    def control_header(self):
+        """Message control header (PS 3.8 E.2) as integer."""
+        return six.indexbytes(self.data_value, 0)
+
+    @property
+    def fragment(self):
+        """Message fragment as ``memoryview`` of the data value."""
+        return memoryview(self.data_value)[1:]
+
     def encode(self):
-        return b''.join([self.header.pack(self.item_length,
-                                          self.context_id),
-                         self.data_value])
+        return b''.join(self.encode_buffers())
+
+    def encode_buffers(self):
+        return [self.header.pack(self.item_length, self.context_id),
+                self.data_value]
 
     @classmethod
     def decode(cls, stream):
@@ -786,5 +846,106 @@ class PresentationDataValueItem(object):
         data_value = stream.read(int(item_length) - 1)
         return cls(context_id, data_value)
 
+    @classmethod
+    def decode_from(cls, buf, offset=0):
+        """Decodes presentation data value item from buffer without copying.
+
+        :param buf: ``memoryview`` of the raw data
+        :param offset: item offset in the buffer
+        :return: decoded presentation data value item. Data value of the item
+                 is a ``memoryview`` slice of the buffer.
+        """
+        item_length, context_id = cls.header.unpack_from(buf, offset)
+        start = offset + cls.header.size
+        return cls(context_id, buf[start:start + item_length - 1])
+
     def total_length(self):
         return 4 + self.item_length
+
+
+class PresentationDataValueFragment(PresentationDataValueItem):
+    """
+    Outgoing Presentation Data Value Item (PS 3.8 9.3.5.1).
+
+    Unlike :class:`~netdicom2.pdu.PresentationDataValueItem` message control
+    header is kept apart from the message fragment, so fragment is never
+    copied to prepend the header.
+
+    :param context_id: presentation context ID
+    :param control_header: message control header (PS 3.8 E.2)
+    :param fragment: message fragment, any bytes-like object or
+                     :class:`~netdicom2.pdu.FileRegion`
+    """
+
+    header = struct.Struct('>I B B')
+
+    def __init__(self, context_id, control_header, fragment):
+        self.context_id = context_id
+        self._control_header = control_header
+        self._fragment = fragment
+
+    @property
+    def data_value(self):
+        fragment, = load_buffers([self._fragment])
+        return six.int2byte(self._control_header) + \
+            memoryview(fragment).tobytes()
+
+    @property
+    def item_length(self):
+        return len(self._fragment) + 2
+
+    @property
+    def control_header(self):
+        return self._control_header
+
+    @property
+    def fragment(self):
+        fragment, = load_buffers([self._fragment])
+        return memoryview(fragment)
+
+    def encode_buffers(self):
+        return [self.header.pack(self.item_length, self.context_id,
+                                 self._control_header),
+                self._fragment]
+
+
+class FileRegion(object):
+    """
+    Region of the file that is used as a message fragment.
+
+    Region is not read by the library, instead DUL service provider copies
+    it from the file to the socket with ``sendfile`` where it is available.
+
+    :param fileobj: file object opened in binary mode
+    :param offset: region offset in the file
+    :param length: region length in bytes
+    """
+
+    def __init__(self, fileobj, offset, length):
+        self.fileobj = fileobj
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        return 'FileRegion(offset={self.offset}, ' \
+               'length={self.length})'.format(self=self)
+
+    def read(self):
+        """Reads region from the file.
+
+        :return: region content
+        """
+        self.fileobj.seek(self.offset)
+        return self.fileobj.read(self.length)
+
+
+def load_buffers(buffers):
+    """Replaces file regions in the list of buffers with their content.
+
+    :param buffers: list of buffers returned by ``encode_buffers``
+    :return: list of bytes-like objects
+    """
+    return [b.read() if isinstance(b, FileRegion) else b for b in buffers]
@@ -0,0 +1,200 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+"""
+Multi-process SCP mode.
+
+:class:`~netdicom2.applicationentity.AE` handles every association in a
+thread, so all event handlers of the AE share a single interpreter lock. If
+handlers do CPU-heavy work (parsing, compression, indexing), use
+:class:`~netdicom2.processpool.ProcessPoolServer` to run several worker
+processes, each with its own AE instance, that accept associations on the
+same port::
+
+    from netdicom2 import applicationentity, processpool, sopclass
+
+    def make_ae():
+        return MyStorageAE('AET', 104).add_scp(sopclass.storage_scp)
+
+    with processpool.ProcessPoolServer(make_ae, processes=4) as server:
+        server.join()
+
+Heavy processing of received files could also be handed over to
+``concurrent.futures.ProcessPoolExecutor`` with
+:class:`~netdicom2.processpool.PostProcessingStorageAE`.
+
+.. note::
+
+    Worker processes are forked, so this module is only available on
+    POSIX systems.
+"""
+
+from __future__ import absolute_import
+
+import multiprocessing
+import signal
+import threading
+
+from concurrent import futures
+
+from . import applicationentity
+from . import statuses
+from . import StorageAE
+
+
+class ProcessPoolServer(object):
+    """Runs application entity in several worker processes.
+
+    Two modes are supported:
+
+        * pre-fork (default) - AE is created and starts listening in the
+          parent process. Worker processes are forked afterwards and accept
+          connections from the inherited listening socket.
+        * ``SO_REUSEPORT`` - every worker process creates its own AE with its
+          own listening socket bound to the same port. Kernel balances
+          incoming connections between sockets.
+
+    In both modes factory is called without arguments and should return
+    configured, but not running AE instance.
+
+    :param ae_factory: callable that creates
+                       :class:`~netdicom2.applicationentity.AE` instance
+    :param processes: number of worker processes, defaults to number of CPUs
+    :param reuse_port: use ``SO_REUSEPORT`` mode instead of pre-fork mode
+    :param timeout: number of seconds to wait for workers to start
+    """
+
+    def __init__(self, ae_factory, processes=None, reuse_port=False,
+                 timeout=15):
+        self.ae_factory = ae_factory
+        self.processes = processes or multiprocessing.cpu_count()
+        self.reuse_port = reuse_port
+        self.timeout = timeout
+        self.workers = []
+        self.ae = None
+
+    def start(self):
+        """Starts worker processes and waits until they accept connections.
+
+        :raise RuntimeError: if worker process did not start in time
+        """
+        if not self.reuse_port:
+            self.ae = self.ae_factory()
+        context = multiprocessing.get_context('fork')
+        for _ in range(self.processes):
+            ready = context.Event()
+            worker = context.Process(target=_serve,
+                                     args=(self.ae, self.ae_factory, ready))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+            if not ready.wait(self.timeout):
+                self.stop()
+                raise RuntimeError('Worker process failed to start')
+
+    def stop(self):
+        """Stops worker processes.
+
+        Workers are asked to stop accepting connections and exit. Worker that
+        does not exit within ``timeout`` is killed.
+        """
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.terminate()
+        for worker in self.workers:
+            worker.join(self.timeout)
+            if worker.is_alive():
+                worker.kill()
+                worker.join()
+        self.workers = []
+        if self.ae is not None:
+            self.ae.server_close()
+            self.ae = None
+
+    def join(self):
+        """Waits for worker processes to exit."""
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def _serve(ae, ae_factory, ready):
+    if ae is None:
+        applicationentity.AE.reuse_port = True
+        ae = ae_factory()
+    else:
+        # listening socket is shared, so connection could be accepted by
+        # another worker. Blocking accept would hang in that case.
+        ae.socket.setblocking(False)
+
+    def shutdown(signum, frame):
+        # shutdown blocks until serve_forever returns, so it can't be called
+        # from the signal handler directly
+        threading.Thread(target=ae.shutdown).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    ready.set()
+    try:
+        ae.serve_forever()
+    finally:
+        ae.server_close()
+
+
+class PostProcessingStorageAE(StorageAE):
+    """Storage AE that hands received files over to the process pool.
+
+    Received dataset is stored in ``storage_dir`` (just like with
+    :class:`~netdicom2.StorageAE`) and its file name is passed to
+    ``post_process`` callable, which is executed by
+    ``concurrent.futures.ProcessPoolExecutor``. C-STORE response is sent
+    right away, without waiting for processing to complete.
+
+    Executor is created on the first received dataset, so AE could be used
+    with :class:`~netdicom2.processpool.ProcessPoolServer`: each worker gets
+    its own executor. Pending tasks are completed when AE is closed.
+
+    :param post_process: picklable callable that takes file name
+    :param storage_dir: directory where received datasets are stored
+    :param ae_title: AE title (up to 16 characters)
+    :param port: port that AE listens on for incoming connection
+    :param supported_ts: list of transfer syntaxes supported by AE
+    :param max_pdu_length: maximum PDU length in bytes (defaults to 64kb).
+    :param max_workers: number of processes in the executor, defaults to
+                        number of CPUs
+    """
+
+    def __init__(self, post_process, storage_dir, ae_title, port,
+                 supported_ts=None, max_pdu_length=65536, max_workers=None):
+        super(PostProcessingStorageAE, self).__init__(
+            storage_dir, ae_title, port, supported_ts, max_pdu_length)
+        self.post_process = post_process
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self):
+        """Process pool executor that runs post processing."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = futures.ProcessPoolExecutor(self.max_workers)
+            return self._executor
+
+    def on_receive_store(self, context, ds):
+        ds.flush()  # file should be complete before it is processed
+        self.executor.submit(self.post_process, ds.name)
+        return statuses.SUCCESS
+
+    def server_close(self):
+        super(PostProcessingStorageAE, self).server_close()
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
@@ -0,0 +1,299 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+"""
+Streaming sinks for received C-STORE datasets.
+
+Sink gets dataset fragments right from the PDV loop of the association, as
+they are received, so dataset could be pushed to its final destination
+(e.g. object store) without storing it on local disk first. Sink is created
+for each incoming instance by
+:meth:`~netdicom2.applicationentity.AEBase.get_sink` and its methods are
+called in the following order:
+
+    * ``begin`` - once, after leading elements of the dataset were received
+    * ``chunk`` - for every dataset fragment
+    * ``end`` - after the last fragment, from
+      :func:`~netdicom2.sopclass.storage_scp`. Returned status is sent in
+      C-STORE response.
+    * ``abort`` - instead of ``end`` if dataset could not be received
+      completely (e.g. association was aborted)
+
+Example::
+
+    from netdicom2 import applicationentity, sinks
+
+    class ObjectStoreAE(applicationentity.AE):
+        def __init__(self, store, *args, **kwargs):
+            super(ObjectStoreAE, self).__init__(*args, **kwargs)
+            self.store = store
+
+        def get_sink(self, context, command_set, header):
+            return sinks.TeeSink([sinks.FileSink(self),
+                                  sinks.ObjectStoreSink(self.store)])
+"""
+
+from __future__ import absolute_import
+
+import errno
+import io
+import os
+import tempfile
+
+from . import applicationentity
+from . import dimsemessages
+from . import exceptions
+from . import statuses
+
+
+class Sink(object):
+    """Base class for dataset sinks.
+
+    Default implementation discards dataset and returns ``SUCCESS``.
+    """
+
+    def begin(self, context, command_set, header):
+        """Starts receiving of the dataset.
+
+        :param context: presentation context (contains ID, SOP Class UID and
+                        Transfer Syntax)
+        :param command_set: command dataset of the received message
+        :param header: dataset with leading elements (see
+                       :meth:`~netdicom2.applicationentity.AEBase.on_store_header`)
+        """
+        pass
+
+    def chunk(self, data):
+        """Processes next dataset fragment.
+
+        :param data: dataset fragment. Fragment may be a ``memoryview``
+                     of the receive buffer, so it should be copied if sink
+                     keeps it after method returns.
+        """
+        pass
+
+    def end(self):
+        """Completes receiving of the dataset.
+
+        :return: status that should be sent in C-STORE response
+        """
+        return statuses.SUCCESS
+
+    def abort(self):
+        """Releases resources if dataset could not be received."""
+        pass
+
+
+class FileSink(Sink):
+    """Writes dataset to the file provided by application entity.
+
+    This sink works just like datasets that are stored in file without
+    sinks: file is provided by
+    :meth:`~netdicom2.applicationentity.AEBase.get_file` and is passed to
+    :meth:`~netdicom2.applicationentity.AEBase.on_receive_store` when
+    dataset is complete.
+
+    :param ae: application entity that receives dataset
+    """
+
+    def __init__(self, ae):
+        self.ae = ae
+        self.context = None
+        self.file = None
+        self.start = 0
+
+    def begin(self, context, command_set, header):
+        self.context = context
+        self.file, self.start = self.ae.get_file(context, command_set)
+
+    def chunk(self, data):
+        self.file.write(data)
+
+    def end(self):
+        self.file.seek(self.start)
+        try:
+            return self.ae.on_receive_store(self.context, self.file)
+        except exceptions.EventHandlingError:
+            return statuses.C_STORE_CANNON_UNDERSTAND
+        finally:
+            self.file.close()
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class TeeSink(Sink):
+    """Passes dataset to several sinks.
+
+    Response status is the most severe status returned by sinks: failure
+    takes precedence over warning and warning over success.
+
+    :param sinks: list of sinks
+    """
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+        self._started = []
+
+    def begin(self, context, command_set, header):
+        for sink in self.sinks:
+            try:
+                sink.begin(context, command_set, header)
+            except Exception:
+                self.abort()
+                raise
+            self._started.append(sink)
+
+    def chunk(self, data):
+        for sink in self.sinks:
+            sink.chunk(data)
+
+    def end(self):
+        results = []
+        for i, sink in enumerate(self.sinks):
+            try:
+                results.append(sink.end())
+            except Exception:
+                for pending in self.sinks[i + 1:]:
+                    pending.abort()
+                raise
+        return max(results, key=_severity)
+
+    def abort(self):
+        for sink in self._started:
+            try:
+                sink.abort()
+            except Exception:
+                pass  # other sinks should release their resources too
+
+
+def _severity(status):
+    status = statuses.Status(int(status), dimsemessages.CStoreRSPMessage)
+    if status.is_failure:
+        return 2
+    if status.is_warning:
+        return 1
+    return 0
+
+
+class ObjectStoreSink(Sink):
+    """Uploads dataset (as DICOM file) to the object store.
+
+    Object store should provide ``upload(key)`` method that returns upload
+    object with ``write(data)``, ``complete()`` and ``abort()`` methods.
+    Object becomes visible in the store only after upload is completed.
+    :class:`~netdicom2.sinks.DirectoryObjectStore` is a local stand-in for
+    such store.
+
+    :param store: object store
+    :param key: callable that takes command set and dataset header and returns
+                object key. By default key is SOP Instance UID with ``.dcm``
+                extension.
+    """
+
+    def __init__(self, store, key=None):
+        self.store = store
+        self.key = key or _instance_key
+        self.upload = None
+
+    def begin(self, context, command_set, header):
+        meta = io.BytesIO()
+        applicationentity.write_meta(meta, command_set, context.supported_ts)
+        self.upload = self.store.upload(self.key(command_set, header))
+        self.upload.write(meta.getvalue())
+
+    def chunk(self, data):
+        self.upload.write(data)
+
+    def end(self):
+        try:
+            self.upload.complete()
+        except Exception:
+            self.abort()
+            raise
+        return statuses.SUCCESS
+
+    def abort(self):
+        if self.upload is not None:
+            self.upload.abort()
+            self.upload = None
+
+
+def _instance_key(command_set, header):
+    return '{}.dcm'.format(command_set.AffectedSOPInstanceUID)
+
+
+class DirectoryObjectStore(object):
+    """Object store backed by local directory.
+
+    Object is written to a temporary file in the store directory and is
+    renamed to its key when upload is completed, so partially received
+    objects are never visible under their keys. Keys may contain ``/``,
+    which creates sub-directories.
+
+    :param directory: store directory
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, key):
+        """Returns path of the object.
+
+        :param key: object key
+        :return: path of the file where object is stored
+        """
+        return os.path.join(self.directory, *key.split('/'))
+
+    def upload(self, key):
+        """Starts object upload.
+
+        :param key: object key
+        :return: :class:`~netdicom2.sinks.DirectoryUpload` instance
+        """
+        return DirectoryUpload(self.path(key))
+
+    def open(self, key):
+        """Opens stored object for reading.
+
+        :param key: object key
+        :return: file object
+        """
+        return open(self.path(key), 'rb')
+
+
+class DirectoryUpload(object):
+    """Upload to :class:`~netdicom2.sinks.DirectoryObjectStore`.
+
+    :param path: final path of the object
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        self.file.write(data)
+
+    def complete(self):
+        self.file.close()
+        _replace(self.temp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass  # upload was completed
+
+
+_replace = getattr(os, 'replace', os.rename)  # Python 2.7 has no os.replace
@@ -43,6 +43,11 @@ Each SCU role implementation must conform to the following interface::
 Arguments have similar meaning to SCP role implementation. First two mandatory
 arguments are provided by association and the rest are expected from service
 user.
+
+SCP role implementations that only send responses (and never receive messages
+on the association themselves) could be marked with ``concurrent_operations``
+decorator. When association negotiates Asynchronous Operations Window such
+services process several requests at once.
 """
 
 from __future__ import absolute_import
@@ -75,6 +80,12 @@ def store_in_file(service):
     return service
 
 
+def concurrent_operations(service):
+    """Sets ``concurrent_operations`` attribute to ``True``"""
+    service.concurrent_operations = True
+    return service
+
+
 class MessageDispatcher(object):
     """Base class for message dispatcher service.
 
@@ -148,6 +159,7 @@ def verification_scu(asce, ctx, msg_id):
     return statuses.Status(response.status, dimsemessages.CEchoRSPMessage)
 
 
+@concurrent_operations
 @sop_classes([VERIFICATION_SOP_CLASS])
 def verification_scp(asce, ctx, msg):
     """Process received C-ECHO.
@@ -168,6 +180,82 @@ def verification_scp(asce, ctx, msg):
     asce.send(rsp, ctx.id)
 
 
+def _c_store_rq(asce, msg_id):
+    c_store = dimsemessages.CStoreRQMessage()
+    c_store.message_id = msg_id
+    c_store.priority = dimsemessages.PRIORITY_MEDIUM
+    c_store.move_originator_aet = asce.ae.local_ae['aet']
+    c_store.move_originator_message_id = msg_id
+    c_store.digest_algorithms = asce.ae.digest_algorithms
+    return c_store
+
+
+def _read_file_uids(ds):
+    """Reads SOP Class UID, SOP Instance UID and transfer syntax from DICOM
+    file.
+
+    File is left positioned at the start of the dataset (after file meta).
+
+    :param ds: DICOM file object
+    :return: tuple with SOP Class UID, SOP Instance UID and transfer syntax
+             UID
+    """
+    zero = ds.tell()
+    _dicom.read_preamble(ds, False)
+    meta = _dicom.read_file_meta_info(ds)
+    try:
+        instance_uid = meta.MediaStorageSOPInstanceUID
+    except AttributeError:
+        # Dataset was written by a bunch of a-holes (No SOP Instance UID
+        # in file meta).
+        # If it still fails, then dataset was written
+        # by a bunch of ****s
+        start = ds.tell()
+        ds.seek(zero)
+        ds_full = _dicom.read_file(ds, stop_before_pixels=True)
+        instance_uid = ds_full.SOPInstanceUID
+        ds.seek(start)
+    return meta.MediaStorageSOPClassUID, instance_uid, \
+        meta.get('TransferSyntaxUID')
+
+
+def _set_file_data_set(c_store, ds, file_ts, ts):
+    """Sets data set from DICOM file to C-STORE request.
+
+    If file transfer syntax differs from the negotiated one, data set is
+    transcoded while it is sent (see :func:`~netdicom2.dsutils.transcode`).
+    Data sets in compressed transfer syntaxes are sent as they are.
+
+    :param c_store: C-STORE request
+    :param ds: DICOM file object positioned at the start of the data set
+    :param file_ts: transfer syntax of the file
+    :param ts: negotiated transfer syntax
+    """
+    if file_ts is not None and file_ts != ts and \
+            dsutils.can_transcode(file_ts, ts):
+        c_store.data_set = dsutils.transcode(
+            dimsemessages.read_chunks(ds, _TRANSCODE_CHUNK_SIZE), file_ts, ts)
+        return
+    if dsutils.is_deflated(file_ts):
+        c_store.deflate = False  # data set in file is already compressed
+    c_store.data_set = ds
+
+
+_TRANSCODE_CHUNK_SIZE = 65536
+
+
+def _sop_class_uid(dataset):
+    """Returns SOP Class UID of the dataset.
+
+    :param dataset: dataset or name of DICOM file
+    :return: SOP Class UID
+    """
+    if isinstance(dataset, six.string_types):
+        with open(dataset, 'rb') as ds:
+            return _read_file_uids(ds)[0]
+    return dataset.SOPClassUID
+
+
 @sop_classes([])
 def storage_scu(asce, ctx, dataset, msg_id):
     """Simple storage SCU role implementation.
@@ -175,39 +263,26 @@ def storage_scu(asce, ctx, dataset, msg_id):
     This implementation provides *no* SOP Class UIDs. When adding this SCU you should provide
     list of SOP Class UIDs you want to store.
 
-    :param dataset: dataset or filename that should be sent via Storage service
+    :param dataset: dataset or filename that should be sent via Storage
+                    service. File in different transfer syntax than
+                    negotiated one is transcoded while it is sent.
     :param msg_id: message identifier
-    :return: status code when dataset is stored.
+    :return: status code when dataset is stored. If AE has
+             ``digest_algorithms``, status ``digests`` attribute holds
+             digests of the sent dataset.
     """
-    c_store = dimsemessages.CStoreRQMessage()
-    c_store.message_id = msg_id
-    c_store.priority = dimsemessages.PRIORITY_MEDIUM
-    c_store.move_originator_aet = asce.ae.local_ae['aet']
-    c_store.move_originator_message_id = msg_id
+    c_store = _c_store_rq(asce, msg_id)
 
     if isinstance(dataset, six.string_types):
         # Got file name
         with open(dataset, 'rb') as ds:
-            zero = ds.tell()
-            _dicom.read_preamble(ds, False)
-            meta = _dicom.read_file_meta_info(ds)
-            c_store.sop_class_uid = meta.MediaStorageSOPClassUID
-            try:
-                instance_uid = meta.MediaStorageSOPInstanceUID
-            except AttributeError:
-                # Dataset was written by a bunch of a-holes (No SOP Instance UID
-                # in file meta).
-                # If it still fails, then dataset was written
-                # by a bunch of ****s
-                start = ds.tell()
-                ds.seek(zero)
-                ds_full = _dicom.read_file(ds, stop_before_pixels=True)
-                instance_uid = ds_full.SOPInstanceUID
-                ds.seek(start)
-
-            c_store.affected_sop_instance_uid = instance_uid
-            c_store.data_set = ds
+            c_store.sop_class_uid, c_store.affected_sop_instance_uid, \
+                file_ts = _read_file_uids(ds)
+            _set_file_data_set(c_store, ds, file_ts, ctx.supported_ts)
             asce.send(c_store, ctx.id)
+            # data set is sent straight from file, so file is kept open
+            # until response is received
+            response, _ = asce.receive()
     else:
         # Assume it's dataset object
         c_store.sop_class_uid = dataset.SOPClassUID
@@ -218,11 +293,96 @@ def storage_scu(asce, ctx, dataset, msg_id):
         # send c_store request
         asce.send(c_store, ctx.id)
 
-    # wait for c-store response
-    response, _ = asce.receive()
-    return statuses.Status(response.status, dimsemessages.CStoreRSPMessage)
+        # wait for c-store response
+        response, _ = asce.receive()
+    status = statuses.Status(response.status, dimsemessages.CStoreRSPMessage)
+    status.digests = c_store.digests
+    return status
+
+
+def pipelined_storage_scu(asce, datasets, msg_id=1):
+    """Stores datasets keeping several C-STORE requests in flight.
+
+    Number of outstanding requests is limited by the Asynchronous Operations
+    Window negotiated for the association
+    (:attr:`~netdicom2.asceprovider.Association.max_ops_invoked`). If window
+    was not negotiated, requests are sent one by one, just like with
+    :func:`storage_scu`. Responses are matched with requests by message ID,
+    so they could arrive in any order.
+
+    SOP Classes of the datasets should be added to the AE as SCU (usually
+    with :func:`storage_scu`) and accepted by the remote AE.
+
+    Function is a generator::
+
+        with ae.request_association(remote_ae) as assoc:
+            for dataset, status in pipelined_storage_scu(assoc, file_names):
+                print(dataset, status)
+
+    :param asce: established association
+    :param datasets: iterable with datasets or filenames
+    :param msg_id: message identifier of the first request, following
+                   requests get consecutive identifiers
+    :return: generator that yields tuples with dataset (or filename) and
+             status of the response
+    """
+    in_flight = {}
+    try:
+        for dataset in datasets:
+            while asce.max_ops_invoked and \
+                    len(in_flight) >= asce.max_ops_invoked:
+                yield _receive_store_response(asce, in_flight)
+            c_store = _c_store_rq(asce, msg_id)
+            ds = None
+            if isinstance(dataset, six.string_types):
+                ds = open(dataset, 'rb')
+                in_flight[msg_id] = dataset, ds, c_store
+                c_store.sop_class_uid, c_store.affected_sop_instance_uid, \
+                    file_ts = _read_file_uids(ds)
+            else:
+                c_store.sop_class_uid = dataset.SOPClassUID
+                c_store.affected_sop_instance_uid = dataset.SOPInstanceUID
+
+            try:
+                pc_id, ts = asce.sop_classes_as_scu[c_store.sop_class_uid]
+            except KeyError:
+                raise exceptions.ClassNotSupportedError(
+                    'SOP Class {0} not supported as SCU'.format(
+                        c_store.sop_class_uid))
+            if ds is None:
+                c_store.data_set = dsutils.encode(dataset, ts.is_implicit_VR,
+                                                  ts.is_little_endian)
+                in_flight[msg_id] = dataset, ds, c_store
+            else:
+                _set_file_data_set(c_store, ds, file_ts, ts)
+            asce.send(c_store, pc_id)
+            msg_id = msg_id % 0xFFFF + 1
+
+        while in_flight:
+            yield _receive_store_response(asce, in_flight)
+    finally:
+        for _, ds, _ in six.itervalues(in_flight):
+            if ds is not None:
+                ds.close()
 
 
+def _receive_store_response(asce, in_flight):
+    response, _ = asce.receive()
+    try:
+        dataset, ds, c_store = in_flight.pop(
+            response.message_id_being_responded_to)
+    except KeyError:
+        raise exceptions.DIMSEProcessingError(
+            'Unexpected response to message {0}'.format(
+                response.message_id_being_responded_to))
+    if ds is not None:
+        ds.close()
+    status = statuses.Status(response.status, dimsemessages.CStoreRSPMessage)
+    status.digests = c_store.digests
+    return dataset, status
+
+
+@concurrent_operations
 @store_in_file
 @sop_classes(STORAGE_SOP_CLASSES)
 def storage_scp(asce, ctx, msg):
@@ -232,16 +392,30 @@ def storage_scp(asce, ctx, msg):
     ``on_receive_store`` method of the application entity.
     If message handler raises :class:`~netdicom2.exceptions.EventHandlingError`
     service response with ``CANNOT_UNDERSTAND`` code.
+    If dataset was rejected or skipped by ``on_store_header`` service
+    responds with status returned by it. If dataset was streamed to the sink
+    (see :meth:`~netdicom2.applicationentity.AEBase.get_sink`) service
+    completes the sink and responds with status returned by its ``end``
+    method. If sink fails to complete, it is aborted and service responds
+    with ``CANNOT_UNDERSTAND`` or ``OUT_OF_RESOURCES`` code.
 
     :param msg: received message
     """
-    try:
-        status = asce.ae.on_receive_store(ctx, msg.data_set)
-    except exceptions.EventHandlingError:
-        status = statuses.C_STORE_CANNON_UNDERSTAND
-    finally:
-        if msg.data_set:
-            msg.data_set.close()
+    if msg.early_status is not None:
+        status = msg.early_status
+    elif msg.sink is not None:
+        try:
+            status = msg.sink.end()
+        except Exception as e:
+            status = _abort_sink(msg.sink, e)
+    else:
+        try:
+            status = asce.ae.on_receive_store(ctx, msg.data_set)
+        except exceptions.EventHandlingError:
+            status = statuses.C_STORE_CANNON_UNDERSTAND
+        finally:
+            if msg.data_set:
+                msg.data_set.close()
     # make response
     rsp = dimsemessages.CStoreRSPMessage()
     rsp.message_id_being_responded_to = msg.message_id
@@ -251,6 +425,22 @@ def storage_scp(asce, ctx, msg):
     asce.send(rsp, ctx.id)
 
 
+def _abort_sink(sink, error):
+    """Aborts sink that failed to complete.
+
+    :param sink: dataset sink
+    :param error: exception raised by sink ``end`` method
+    :return: status that should be sent in C-STORE response
+    """
+    try:
+        sink.abort()
+    except Exception:
+        pass  # response is sent anyway
+    if isinstance(error, exceptions.EventHandlingError):
+        return statuses.C_STORE_CANNON_UNDERSTAND
+    return statuses.C_STORE_OUT_OF_RESOURCES
+
+
 FIND_SOP_CLASSES = [PATIENT_ROOT_FIND_SOP_CLASS, STUDY_ROOT_FIND_SOP_CLASS]
                     #PATIENT_STUDY_ONLY_FIND_SOP_CLASS
 
@@ -290,6 +480,7 @@ def qr_find_scu(asce, ctx, ds, msg_id):
             break
 
 
+@concurrent_operations
 @sop_classes(FIND_SOP_CLASSES)
 def qr_find_scp(asce, ctx, msg):
     """Query/Retrieve find SCP role implementation.
@@ -300,27 +491,36 @@ def qr_find_scp(asce, ctx, msg):
 
     :param msg: received C-FIND message
     """
+    for rsp, pc_id in _find_responses(asce, ctx, msg):
+        asce.send(rsp, pc_id)
+
+
+def _find_responses(asce, ctx, msg):
+    """Yields C-FIND responses for the results provided by AE.
+
+    Every response is sent as soon as it is produced, results may come
+    slowly and SCU should not wait for the whole query to get pending
+    responses.
+    """
     ds = dsutils.decode(msg.data_set, ctx.supported_ts.is_implicit_VR,
                         ctx.supported_ts.is_little_endian)
 
-    # make response
-    rsp = dimsemessages.CFindRSPMessage()
-    rsp.message_id_being_responded_to = msg.message_id
-    rsp.sop_class_uid = msg.sop_class_uid
-
     gen = asce.ae.on_receive_find(ctx, ds)
     for data_set, status in gen:
+        rsp = dimsemessages.CFindRSPMessage()
+        rsp.message_id_being_responded_to = msg.message_id
+        rsp.sop_class_uid = msg.sop_class_uid
         rsp.status = int(status)
         rsp.data_set = dsutils.encode(data_set,
                                       ctx.supported_ts.is_implicit_VR,
                                       ctx.supported_ts.is_little_endian)
-        asce.send(rsp, ctx.id)
+        yield rsp, ctx.id
 
     rsp = dimsemessages.CFindRSPMessage()
     rsp.message_id_being_responded_to = msg.message_id
     rsp.sop_class_uid = msg.sop_class_uid
     rsp.status = int(statuses.SUCCESS)
-    asce.send(rsp, ctx.id)
+    yield rsp, ctx.id
 
 
 GET_SOP_CLASSES = [PATIENT_ROOT_GET_SOP_CLASS, STUDY_ROOT_GET_SOP_CLASS,
@@ -335,18 +535,26 @@ def qr_get_scu(asce, ctx, ds, msg_id):
     First of all you should remember that C-STORE request messages are received
     in current association (unlike when you are using C-MOVE), so remember
     to add proper presentation context for expected object(s).
-    Second, it is strongly recommended to add presentation contexts to your AE
+    Second, it is recommended to add presentation contexts to your AE
     with ``store_in_file`` set to ``True``, unless you are expecting something
-    small like Structure Report documents.
+    small like Structure Report documents. Datasets that are not stored in
+    file are kept in memory up to AE ``spool_max_size`` and are passed to
+    ``on_receive_store`` as spooled file object if they are larger.
     Upon receiving datasets service would call ``on_receive_store`` method of
     parent AE (just like C-MOVE service) and than yield context and dataset.
     If ``store_in_file`` is set to ``True`` then dataset is a file object.
-    If not service yields ``dicom.dataset.Dataset`` object
+    If not service yields ``dicom.dataset.Dataset`` object. If dataset was
+    streamed to the sink (see
+    :meth:`~netdicom2.applicationentity.AEBase.get_sink`), service yields
+    completed sink (e.g. :class:`~netdicom2.storage.StorageSink` with the path
+    of the stored file).
 
     :param ds: dataset that contains request parameters.
     :param msg_id: message ID
     """
     def decode_ds(_ds):
+        if not isinstance(_ds, bytes):
+            _ds.seek(0)  # spooled dataset could be read by on_receive_store
         return dsutils.decode(_ds, ctx.supported_ts.is_implicit_VR,
                               ctx.supported_ts.is_little_endian)
 
@@ -376,14 +584,27 @@ def qr_get_scu(asce, ctx, ds, msg_id):
             rsp.affected_sop_instance_uid = msg.affected_sop_instance_uid
             rsp.sop_class_uid = msg.sop_class_uid
 
-            try:
-                status = asce.ae.on_receive_store(ctx, msg.data_set)
-                yield ctx, msg.data_set if in_file else decode_ds(msg.data_set)
-            except exceptions.EventHandlingError:
-                status = statuses.C_GET_UNABLE_TO_PROCESS
-            finally:
-                if in_file and msg.data_set:
-                    msg.data_set.close()
+            if msg.early_status is not None:
+                # dataset was rejected or skipped by on_store_header
+                status = msg.early_status
+            elif msg.sink is not None:
+                try:
+                    status = msg.sink.end()
+                except Exception as e:
+                    status = _abort_sink(msg.sink, e)
+                else:
+                    yield ctx, msg.sink
+            else:
+                try:
+                    status = asce.ae.on_receive_store(ctx, msg.data_set)
+                    yield ctx, (msg.data_set if in_file
+                                else decode_ds(msg.data_set))
+                except exceptions.EventHandlingError:
+                    status = statuses.C_GET_UNABLE_TO_PROCESS
+                finally:
+                    if msg.data_set and not isinstance(msg.data_set, bytes):
+                        # file from get_file or spooled dataset
+                        msg.data_set.close()
 
             rsp.status = int(status)
             asce.send(rsp, pc_id)
@@ -445,7 +666,7 @@ def qr_move_scp(asce, ctx, msg):
         completed = 0
         for data_set in gen:
             # request an association with destination send C-STORE
-            service = assoc.get_scu(data_set.SOPClassUID)
+            service = assoc.get_scu(_sop_class_uid(data_set))
             status = service(data_set, completed)
             if status.is_failure:
                 failed += 1
@@ -500,31 +721,11 @@ def modality_work_list_scu(asce, ctx, ds, msg_id):
             break
 
 
+@concurrent_operations
 @sop_classes([MODALITY_WORK_LIST_INFORMATION_FIND_SOP_CLASS])
 def modality_work_list_scp(asce, ctx, msg):
-    ds = dsutils.decode(msg.data_set, ctx.supported_ts.is_implicit_VR,
-                        ctx.supported_ts.is_little_endian)
-
-    # make response
-    rsp = dimsemessages.CFindRSPMessage()
-    rsp.message_id_being_responded_to = msg.message_id
-    rsp.sop_class_uid = msg.sop_class_uid
-
-    gen = asce.ae.on_receive_find(ctx, ds)
-    for identifier_ds, status in gen:
-        rsp.status = int(status)
-        rsp.data_set = dsutils.encode(identifier_ds,
-                                      ctx.supported_ts.is_implicit_VR,
-                                      ctx.supported_ts.is_little_endian)
-        # send response
-        asce.send(rsp, ctx.id)
-
-    # send final response
-    rsp = dimsemessages.CFindRSPMessage()
-    rsp.message_id_being_responded_to = msg.message_id
-    rsp.sop_class_uid = msg.sop_class_uid
-    rsp.status = int(statuses.SUCCESS)
-    asce.send(rsp, ctx.id)
+    for rsp, pc_id in _find_responses(asce, ctx, msg):
+        asce.send(rsp, pc_id)
 
 
 STORAGE_COMMITMENT_PUSH_MODEL_SOP_CLASS = '1.2.840.10008.1.20.1.1'
@@ -0,0 +1,627 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+"""
+Storage of received instances in a directory tree.
+
+:class:`~netdicom2.StorageAE` and :class:`~netdicom2.ClientStorageAE` store
+every received instance with :class:`~netdicom2.storage.StorageSink`. Path
+of the file inside storage directory is computed by the layout: callable
+that takes command set and leading elements of the dataset (see
+:meth:`~netdicom2.applicationentity.AEBase.on_store_header`) and returns
+list of path components. Following layouts are provided:
+
+    * :func:`~netdicom2.storage.flat_layout` - all files in the storage
+      directory (default)
+    * :func:`~netdicom2.storage.hierarchical_layout` -
+      ``<Patient ID>/<Study UID>/<Series UID>/<SOP Instance UID>.dcm``
+    * :class:`~netdicom2.storage.HashedLayout` - fan-out by the hash prefix
+      of SOP Instance UID, which keeps number of files per directory low
+      regardless of how instances are grouped
+
+Instance is written to a temporary file that is created exclusively
+(``O_EXCL``) in the target directory and is linked to its final name only
+when the whole dataset is received, so incomplete files never appear under
+instance names. If the name is taken, numeric suffix is added. Existence of
+files is never checked in advance: creation itself fails if file exists.
+
+Stored instances are recorded in :class:`~netdicom2.storage.InstanceIndex`,
+so :class:`~netdicom2.StorageAE` recognizes instances that were already
+received right from the command set and handles them according to its
+duplicate policy:
+
+    * :data:`~netdicom2.storage.DUPLICATE_DISCARD` - dataset is discarded
+      and success is reported (default)
+    * :data:`~netdicom2.storage.DUPLICATE_WARN` - dataset is discarded and
+      warning status is reported
+    * :data:`~netdicom2.storage.DUPLICATE_OVERWRITE` - dataset replaces
+      previously stored file
+    * :data:`~netdicom2.storage.DUPLICATE_KEEP` - dataset is stored under
+      a new name, next to previously stored file
+
+Durability of stored files is optional. With
+:class:`~netdicom2.storage.WriteBehind` dataset fragments are written by a
+pool of background writers, and completed files are flushed to disk
+(together with their directory entries) in groups, so many instances share
+the cost of one flush. C-STORE response is sent only when the group that
+contains the instance is durable.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import hashlib
+import itertools
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+
+from six.moves import queue, range
+
+from . import applicationentity
+from . import dimsemessages
+from . import sinks
+from . import statuses
+from . import timer
+
+
+UNKNOWN = 'UNKNOWN'
+
+DUPLICATE_DISCARD = 'discard'
+DUPLICATE_WARN = 'warn'
+DUPLICATE_OVERWRITE = 'overwrite'
+DUPLICATE_KEEP = 'keep'
+
+_UNSAFE_CHARACTERS = re.compile(r'[^\w.^=+-]')
+
+
+def flat_layout(command_set, header):
+    """Stores all instances directly in the storage directory.
+
+    :param command_set: command dataset of the received message
+    :param header: dataset with leading elements
+    :return: list of path components
+    """
+    return [instance_file_name(command_set)]
+
+
+def hierarchical_layout(command_set, header):
+    """Stores instances in Patient/Study/Series directories.
+
+    Missing attributes are replaced with ``UNKNOWN``.
+
+    :param command_set: command dataset of the received message
+    :param header: dataset with leading elements
+    :return: list of path components
+    """
+    return [path_component(header.get('PatientID')),
+            path_component(header.get('StudyInstanceUID')),
+            path_component(header.get('SeriesInstanceUID')),
+            instance_file_name(command_set)]
+
+
+class HashedLayout(object):
+    """Stores instances in directories named after the prefix of SOP Instance
+    UID hash.
+
+    For example with default parameters instance is stored in
+    ``<storage_dir>/3f/a2/<SOP Instance UID>.dcm``.
+
+    :param levels: number of directory levels
+    :param width: number of hex digits in the name of directory
+    """
+
+    def __init__(self, levels=2, width=2):
+        self.levels = levels
+        self.width = width
+
+    def __call__(self, command_set, header):
+        uid = str(command_set.AffectedSOPInstanceUID)
+        digest = hashlib.sha1(uid.encode('ascii')).hexdigest()
+        return [digest[i * self.width:(i + 1) * self.width]
+                for i in range(self.levels)] + \
+            [instance_file_name(command_set)]
+
+
+def instance_file_name(command_set):
+    """Returns file name for the received instance.
+
+    :param command_set: command dataset of the received message
+    :return: SOP Instance UID with ``.dcm`` extension
+    """
+    return '{}.dcm'.format(path_component(command_set.AffectedSOPInstanceUID))
+
+
+def path_component(value):
+    """Makes attribute value safe to use as a file or directory name.
+
+    :param value: attribute value
+    :return: value with unsafe characters replaced with ``_``, or ``UNKNOWN``
+             if value is empty
+    """
+    value = _UNSAFE_CHARACTERS.sub('_', str(value or '').strip())
+    if not value.strip('.'):
+        return UNKNOWN
+    return value
+
+
+def make_dirs(directory):
+    """Creates directory and its parents if they do not exist.
+
+    :param directory: directory path
+    """
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def create_file(directory, file_name):
+    """Exclusively creates new file.
+
+    If file with this name exists, numeric suffix is added to the name
+    (``<name>_1.dcm``, ``<name>_2.dcm`` and so on).
+
+    :param directory: directory where file is created
+    :param file_name: file name
+    :return: file object opened for reading and writing
+    """
+    base, ext = os.path.splitext(os.path.join(directory, file_name))
+    for i in itertools.count():
+        path = '{}_{}{}'.format(base, i, ext) if i else base + ext
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL |
+                         getattr(os, 'O_BINARY', 0), 0o666)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        else:
+            os.close(fd)
+            # file is reopened by name, so file object has it
+            return open(path, 'r+b')
+
+
+def link_file(temp_path, path):
+    """Gives complete temporary file its final name.
+
+    File is hard linked to the final name, which fails if the name is
+    taken, so existing file is never replaced. Numeric suffix is added
+    to the name in that case. Temporary name is removed afterwards.
+
+    :param temp_path: path of the temporary file
+    :param path: desired path
+    :return: final path of the file
+    """
+    base, ext = os.path.splitext(path)
+    for i in itertools.count():
+        target = '{}_{}{}'.format(base, i, ext) if i else path
+        try:
+            os.link(temp_path, target)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        else:
+            os.unlink(temp_path)
+            return target
+
+
+class InstanceIndex(object):
+    """Persistent index of stored instances.
+
+    Index is an SQLite database that maps SOP Instance UIDs to stored files.
+    Index could be shared between threads. Connection is opened on the first
+    use in every process, so AE with the index could be forked (e.g. by
+    :class:`~netdicom2.processpool.ProcessPoolServer`).
+
+    :param path: database file path
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def __contains__(self, instance_uid):
+        return self.get(instance_uid) is not None
+
+    def __len__(self):
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT COUNT(*) FROM instances').fetchone()
+        return row[0]
+
+    def get(self, instance_uid):
+        """Returns path of the stored instance.
+
+        :param instance_uid: SOP Instance UID
+        :return: file path or ``None`` if instance was not stored
+        """
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT path FROM instances WHERE sop_instance_uid = ?',
+                (str(instance_uid),)).fetchone()
+        return row[0] if row else None
+
+    def add(self, instance_uid, sop_class_uid, path):
+        """Records stored instance.
+
+        :param instance_uid: SOP Instance UID
+        :param sop_class_uid: SOP Class UID
+        :param path: file path
+        """
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO instances VALUES (?, ?, ?, ?)',
+                    (str(instance_uid), str(sop_class_uid), path,
+                     time.time()))
+
+    def remove(self, instance_uid):
+        """Removes instance from the index.
+
+        :param instance_uid: SOP Instance UID
+        """
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    'DELETE FROM instances WHERE sop_instance_uid = ?',
+                    (str(instance_uid),))
+
+    def close(self):
+        """Closes database connection."""
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            # connection inherited from parent process should not be used
+            self._connection = sqlite3.connect(self.path,
+                                               check_same_thread=False)
+            self._pid = os.getpid()
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            with self._connection:
+                self._connection.execute(
+                    'CREATE TABLE IF NOT EXISTS instances ('
+                    'sop_instance_uid TEXT PRIMARY KEY, '
+                    'sop_class_uid TEXT, path TEXT, stored REAL)')
+        return self._connection
+
+
+class WriteBehind(object):
+    """Background writers with group commit.
+
+    Every file is assigned to one of ``workers`` writer threads, which writes
+    queued fragments in order. When file is committed, it is passed to the
+    committer thread that collects files for up to ``latency`` seconds (or
+    until ``max_batch`` files are collected), flushes all of them with
+    ``fsync``, gives them their final names and flushes directories where
+    they are stored, once per directory.
+
+    :ivar instances: number of committed files
+    :ivar bytes_written: number of written bytes
+    :ivar batches: number of commit groups
+    :ivar fsyncs: number of ``fsync`` calls (files and directories)
+
+    :param workers: number of writer threads
+    :param latency: maximum number of seconds file waits for the group
+                    commit to start
+    :param max_batch: maximum number of files in commit group
+    :param max_pending: maximum number of fragments queued for every writer.
+                        Association that receives file waits if writer
+                        queue is full.
+    """
+
+    def __init__(self, workers=2, latency=0.01, max_batch=256,
+                 max_pending=256):
+        self.workers = workers
+        self.latency = latency
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.instances = 0
+        self.bytes_written = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self._started = timer.monotonic()
+        self._lock = threading.Lock()
+        self._queues = []
+        self._pending = queue.Queue()
+        self._errors = {}
+        self._pid = None
+
+    def write(self, fp, data):
+        """Queues data that should be written to the file.
+
+        :param fp: file object
+        :param data: bytes-like object, it is copied before the method returns
+        """
+        self._queue(fp).put((fp, memoryview(data).tobytes()))
+
+    def drain(self, fp):
+        """Waits until all queued data is written to the file.
+
+        :param fp: file object
+        :raise IOError: if data could not be written
+        """
+        done = threading.Event()
+        self._queue(fp).put((fp, done.set))
+        done.wait()
+        error = self._errors.pop(id(fp), None)
+        if error is not None:
+            raise error
+
+    def commit(self, fp, link):
+        """Writes queued data, closes the file and waits until it is durable.
+
+        :param fp: file object
+        :param link: callable that is called after file data is flushed to
+                     disk, it should give file its final name and return
+                     directory that should be flushed
+        :raise IOError: if file could not be written or flushed
+        """
+        self.drain(fp)
+        request = _CommitRequest(fp, link)
+        self._pending.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+
+    def stats(self):
+        """Returns throughput counters.
+
+        :return: dictionary with counters and average number of files
+                 per group, files per second and bytes per second since
+                 writer was created
+        """
+        with self._lock:
+            elapsed = max(timer.monotonic() - self._started, 1e-6)
+            return {
+                'instances': self.instances,
+                'bytes_written': self.bytes_written,
+                'batches': self.batches,
+                'fsyncs': self.fsyncs,
+                'batch_size': float(self.instances) / (self.batches or 1),
+                'instances_per_second': self.instances / elapsed,
+                'bytes_per_second': self.bytes_written / elapsed
+            }
+
+    def close(self):
+        """Stops background threads once queued work is completed."""
+        with self._lock:
+            queues, self._queues = self._queues, []
+            started = self._pid == os.getpid()
+            self._pid = None
+        if started:
+            for q in queues:
+                q.put(None)
+            self._pending.put(None)
+
+    def _queue(self, fp):
+        with self._lock:
+            if self._pid != os.getpid():
+                # threads are started lazily, and again after fork
+                self._pid = os.getpid()
+                self._queues = [queue.Queue(self.max_pending)
+                                for _ in range(self.workers)]
+                self._pending = queue.Queue()
+                for q in self._queues:
+                    self._start(self._write_loop, q)
+                self._start(self._commit_loop, self._pending)
+            return self._queues[hash(fp) % len(self._queues)]
+
+    @staticmethod
+    def _start(target, q):
+        thread = threading.Thread(target=target, args=(q,))
+        thread.daemon = True
+        thread.start()
+
+    def _write_loop(self, q):
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            fp, data = item
+            if callable(data):
+                data()
+                continue
+            if id(fp) in self._errors:
+                continue  # file is already broken, skip the rest
+            try:
+                fp.write(data)
+            except Exception as e:
+                self._errors[id(fp)] = e
+            else:
+                with self._lock:
+                    self.bytes_written += len(data)
+
+    def _commit_loop(self, pending):
+        while True:
+            request = pending.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = timer.monotonic() + self.latency
+            while len(batch) < self.max_batch:
+                remaining = deadline - timer.monotonic()
+                try:
+                    request = pending.get(remaining > 0, max(remaining, 0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    pending.put(None)  # stop after this batch
+                    break
+                batch.append(request)
+            self._commit(batch)
+
+    def _commit(self, batch):
+        directories = set()
+        fsyncs = 0
+        for request in batch:
+            try:
+                request.fp.flush()
+                os.fsync(request.fp.fileno())
+                fsyncs += 1
+                request.fp.close()
+                directories.add(request.link())
+            except Exception as e:
+                request.error = e
+                request.fp.close()
+        for directory in directories:
+            try:
+                _fsync_directory(directory)
+                fsyncs += 1
+            except OSError:
+                pass  # not supported by platform or file system
+        with self._lock:
+            self.batches += 1
+            self.instances += sum(1 for r in batch if r.error is None)
+            self.fsyncs += fsyncs
+        for request in batch:
+            request.done.set()
+
+
+class _CommitRequest(object):
+    def __init__(self, fp, link):
+        self.fp = fp
+        self.link = link
+        self.error = None
+        self.done = threading.Event()
+
+
+def _fsync_directory(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class StorageSink(sinks.FileSink):
+    """Stores received instance in the storage directory.
+
+    Once dataset is complete and file has its final name, file is passed to
+    :meth:`~netdicom2.applicationentity.AEBase.on_receive_store` of the AE,
+    just like with :class:`~netdicom2.sinks.FileSink`.
+
+    :ivar path: path of the stored file, available when sink is completed
+
+    :param ae: application entity that receives instance
+    :param storage_dir: storage directory
+    :param layout: storage layout
+    :param index: :class:`~netdicom2.storage.InstanceIndex` where stored
+                  instance is recorded
+    :param overwrite: if ``True`` previously stored file of the instance is
+                      replaced
+    :param write_behind: :class:`~netdicom2.storage.WriteBehind` that
+                         writes and commits file. Sink is completed when
+                         file is durable.
+    """
+
+    def __init__(self, ae, storage_dir, layout=flat_layout, index=None,
+                 overwrite=False, write_behind=None):
+        super(StorageSink, self).__init__(ae)
+        self.write_behind = write_behind
+        self.storage_dir = storage_dir
+        self.layout = layout
+        self.index = index
+        self.overwrite = overwrite
+        self.command_set = None
+        self.path = None
+        self.temp_path = None
+
+    def begin(self, context, command_set, header):
+        self.context = context
+        self.command_set = command_set
+        self.path = None
+        if self.overwrite and self.index is not None:
+            self.path = self.index.get(command_set.AffectedSOPInstanceUID)
+        if self.path is None:
+            self.path = os.path.join(self.storage_dir,
+                                     *self.layout(command_set, header))
+        directory = os.path.dirname(self.path)
+        make_dirs(directory)
+        # mkstemp creates file with O_EXCL
+        fd, self.temp_path = tempfile.mkstemp(
+            suffix='.part', prefix='.', dir=directory)
+        self.file = os.fdopen(fd, 'w+b')
+        try:
+            self.start = self.file.tell()
+            applicationentity.write_meta(self.file, command_set,
+                                         context.supported_ts)
+        except Exception:
+            self.abort()
+            raise
+
+    def chunk(self, data):
+        if self.write_behind is not None:
+            self.write_behind.write(self.file, data)
+        else:
+            self.file.write(data)
+
+    def end(self):
+        if self.write_behind is not None:
+            self.write_behind.commit(self.file, self._link)
+        else:
+            self.file.close()
+            self._link()
+        # file is reopened under its final name, so handler could use it
+        self.file = open(self.path, 'rb')
+        try:
+            status = super(StorageSink, self).end()
+        except Exception:
+            self._discard()
+            raise
+        if statuses.Status(int(status),
+                           dimsemessages.CStoreRSPMessage).is_failure:
+            # instance is not recorded, so SCU could send it again
+            self._discard()
+        elif self.index is not None:
+            self.index.add(self.command_set.AffectedSOPInstanceUID,
+                           self.command_set.AffectedSOPClassUID, self.path)
+        return status
+
+    def abort(self):
+        if self.write_behind is not None and self.file is not None and \
+                not self.file.closed:
+            try:
+                self.write_behind.drain(self.file)
+            except Exception:
+                pass  # file is removed anyway
+        super(StorageSink, self).abort()
+        if self.temp_path is not None:
+            try:
+                os.unlink(self.temp_path)
+            except OSError:
+                pass
+            self.temp_path = None
+
+    def _discard(self):
+        instance_uid = self.command_set.AffectedSOPInstanceUID
+        if self.index is not None and \
+                self.index.get(instance_uid) == self.path:
+            # overwritten file of the instance is gone too
+            self.index.remove(instance_uid)
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _link(self):
+        if self.overwrite:
+            _replace(self.temp_path, self.path)
+        else:
+            self.path = link_file(self.temp_path, self.path)
+        self.temp_path = None
+        return os.path.dirname(self.path)
+
+
+_replace = getattr(os, 'replace', os.rename)  # Python 2.7 has no os.replace
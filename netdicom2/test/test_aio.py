@@ -0,0 +1,138 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+import asyncio
+import unittest
+
+from pydicom import dataset, dcmread
+
+import netdicom2.applicationentity as ae
+import netdicom2.sopclass as sc
+
+from netdicom2 import aio
+from netdicom2 import statuses
+
+
+def run(coro):
+    return asyncio.new_event_loop().run_until_complete(coro)
+
+
+class CFindServerAE(aio.AE):
+    def __init__(self, test_name, *args, **kwargs):
+        super(CFindServerAE, self).__init__(*args, **kwargs)
+        self.test_name = test_name
+
+    async def on_receive_find(self, context, ds):
+        rsp = dataset.Dataset()
+        rsp.PatientName = self.test_name
+        return iter([(rsp, statuses.SUCCESS)])
+
+
+class CStoreServerAE(aio.AE):
+    def __init__(self, *args, **kwargs):
+        super(CStoreServerAE, self).__init__(*args, **kwargs)
+        self.received = []
+
+    def on_receive_store(self, context, ds):
+        self.received.append(dcmread(ds))
+        return statuses.SUCCESS
+
+
+class AsyncEchoTestCase(unittest.TestCase):
+    def test_c_echo_positive(self):
+        async def test():
+            ae1 = aio.ClientAE('AET1').add_scu(aio.sopclass.verification_scu)
+            ae2 = aio.AE('AET2', 11114).add_scp(aio.sopclass.verification_scp)
+            remote_ae = dict(address='127.0.0.1', port=11114, aet='AET2')
+            async with ae2:
+                async with ae1.request_association(remote_ae) as assoc:
+                    service = assoc.get_scu(sc.VERIFICATION_SOP_CLASS)
+                    for i in range(3):
+                        result = await service(i + 1)
+                        self.assertTrue(result.is_success)
+
+        run(test())
+
+    def test_many_associations(self):
+        async def echo(ae1, remote_ae):
+            async with ae1.request_association(remote_ae) as assoc:
+                service = assoc.get_scu(sc.VERIFICATION_SOP_CLASS)
+                return await service(1)
+
+        async def test():
+            ae1 = aio.ClientAE('AET1').add_scu(aio.sopclass.verification_scu)
+            ae2 = aio.AE('AET2', 11114).add_scp(aio.sopclass.verification_scp)
+            remote_ae = dict(address='127.0.0.1', port=11114, aet='AET2')
+            async with ae2:
+                results = await asyncio.gather(
+                    *[echo(ae1, remote_ae) for _ in range(50)])
+            self.assertTrue(all(r.is_success for r in results))
+
+        run(test())
+
+    def test_threaded_scu(self):
+        async def test():
+            ae2 = aio.AE('AET2', 11114).add_scp(aio.sopclass.verification_scp)
+            remote_ae = dict(address='127.0.0.1', port=11114, aet='AET2')
+
+            def echo():
+                ae1 = ae.ClientAE('AET1').add_scu(sc.verification_scu)
+                with ae1.request_association(remote_ae) as assoc:
+                    service = assoc.get_scu(sc.VERIFICATION_SOP_CLASS)
+                    return service(1)
+
+            async with ae2:
+                loop = asyncio.get_event_loop()
+                result = await loop.run_in_executor(None, echo)
+            self.assertTrue(result.is_success)
+
+        run(test())
+
+
+class AsyncCFindTestCase(unittest.TestCase):
+    def test_c_find_positive(self):
+        test_name = 'Patient^Name^Test'
+
+        async def test():
+            ae1 = aio.ClientAE('AET1').add_scu(aio.sopclass.qr_find_scu)
+            ae2 = CFindServerAE(test_name, 'AET2', 11114)\
+                .add_scp(aio.sopclass.qr_find_scp)
+            remote_ae = dict(address='127.0.0.1', port=11114, aet='AET2')
+            async with ae2:
+                async with ae1.request_association(remote_ae) as assoc:
+                    service = assoc.get_scu(sc.PATIENT_ROOT_FIND_SOP_CLASS)
+                    req = dataset.Dataset()
+                    req.PatientName = test_name
+                    results = [r async for r in service(req, 1)]
+            self.assertEqual(results[0][0].PatientName, test_name)
+            self.assertEqual(results[-1][1], statuses.SUCCESS)
+
+        run(test())
+
+
+class AsyncCStoreTestCase(unittest.TestCase):
+    def test_c_store_positive(self):
+        rq = dataset.Dataset()
+        rq.PatientName = 'Patient^Name^Test'
+        rq.SOPInstanceUID = '1.2.3.4.5.1.1'
+        rq.SOPClassUID = sc.BASIC_TEXT_SR_STORAGE
+
+        async def test():
+            ae1 = aio.ClientAE('AET1').add_scu(aio.sopclass.storage_scu,
+                                               [sc.BASIC_TEXT_SR_STORAGE])
+            ae2 = CStoreServerAE('AET2', 11114)\
+                .add_scp(aio.sopclass.storage_scp)
+            remote_ae = dict(address='127.0.0.1', port=11114, aet='AET2')
+            async with ae2:
+                async with ae1.request_association(remote_ae) as assoc:
+                    service = assoc.get_scu(sc.BASIC_TEXT_SR_STORAGE)
+                    status = await service(rq, 1)
+            self.assertEqual(status, statuses.SUCCESS)
+            self.assertEqual(ae2.received[0].PatientName, rq.PatientName)
+
+        run(test())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,321 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+import hashlib
+import threading
+import unittest
+import zlib
+
+import pydicom
+from pydicom import dataset
+from pydicom import uid
+
+import netdicom2.applicationentity as ae
+import netdicom2.asceprovider as asceprovider
+import netdicom2.dimsemessages as dimsemessages
+import netdicom2.dsutils as dsutils
+import netdicom2.exceptions as exceptions
+import netdicom2.sinks as sinks
+import netdicom2.sopclass as sc
+import netdicom2.uids as uids
+import netdicom2.userdataitems as userdataitems
+
+
+DEFLATED = uids.DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN
+
+
+class FakeAssociation(object):
+    def __init__(self, local_ae, ctx):
+        self.ae = local_ae
+        self.accepted_contexts = {ctx.id: ctx}
+
+
+def c_store_rq(size):
+    ds = dataset.Dataset()
+    ds.PatientID = 'TestID'
+    ds.SOPInstanceUID = '1.2.3.4.5.1.1'
+    ds.add_new((0x0009, 0x0010), 'LO', 'PRIVATE')
+    ds.add_new((0x0009, 0x1001), 'OB', b'\x01' * size)
+    msg = dimsemessages.CStoreRQMessage()
+    msg.message_id = 1
+    msg.sop_class_uid = sc.BASIC_TEXT_SR_STORAGE
+    msg.affected_sop_instance_uid = ds.SOPInstanceUID
+    msg.priority = dimsemessages.PRIORITY_MEDIUM
+    msg.data_set = dsutils.encode(ds, False, True)
+    msg.set_length()
+    return msg
+
+
+class MessageAssemblerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ae = ae.ClientAE('AET1')
+        self.ae.spool_max_size = 10000
+        self.ctx = asceprovider.PContextDef(1, sc.BASIC_TEXT_SR_STORAGE,
+                                            uid.ExplicitVRLittleEndian)
+
+    def assemble(self, msg):
+        assembler = asceprovider.MessageAssembler(
+            FakeAssociation(self.ae, self.ctx))
+        complete = False
+        for p_data in msg.encode(self.ctx.id, 4096):
+            for item in p_data.data_value_items:
+                self.assertFalse(complete)
+                complete = assembler.feed(item)
+        self.assertTrue(complete)
+        received, pc_id = assembler.message()
+        self.assertEqual(pc_id, self.ctx.id)
+        return received
+
+    def test_small_dataset_in_memory(self):
+        msg = c_store_rq(100)
+        received = self.assemble(msg)
+        self.assertEqual(received.data_set, msg.data_set)
+
+    def test_large_dataset_is_spooled(self):
+        msg = c_store_rq(50000)
+        received = self.assemble(msg)
+        self.assertNotIsInstance(received.data_set, bytes)
+        self.assertEqual(received.data_set.read(), msg.data_set)
+        received.data_set.seek(0)
+        ds = dsutils.decode(received.data_set, False, True)
+        self.assertEqual(ds.PatientID, 'TestID')
+        received.data_set.close()
+
+    def test_spooling_is_off(self):
+        self.ae.spool_max_size = None
+        msg = c_store_rq(50000)
+        self.assertEqual(self.assemble(msg).data_set, msg.data_set)
+
+    def test_digests(self):
+        self.ae.digest_algorithms = ('sha256',)
+        msg = c_store_rq(50000)
+        received = self.assemble(msg)
+        self.assertEqual(received.digests,
+                         {'sha256': hashlib.sha256(msg.data_set).hexdigest()})
+        received.data_set.close()
+
+    def test_get_file(self):
+        self.ae.store_in_file.add(sc.BASIC_TEXT_SR_STORAGE)
+        small = self.assemble(c_store_rq(100)).data_set
+        self.assertFalse(small._rolled)
+        small.close()
+        large = self.assemble(c_store_rq(50000)).data_set
+        self.assertTrue(large._rolled)
+        large.close()
+
+
+class RecordingSink(sinks.Sink):
+    def __init__(self):
+        self.context = None
+        self.data = b''
+
+    def begin(self, context, command_set, header):
+        self.context = context
+
+    def chunk(self, data):
+        self.data += bytes(data)
+
+
+def inflate(data):
+    return zlib.decompress(data, -zlib.MAX_WBITS)
+
+
+class DeflatedMessageAssemblerTestCase(MessageAssemblerTestCase):
+    def setUp(self):
+        super(DeflatedMessageAssemblerTestCase, self).setUp()
+        self.ctx = asceprovider.PContextDef(
+            1, sc.BASIC_TEXT_SR_STORAGE, DEFLATED)
+
+    def assemble(self, msg):
+        msg.deflate = True
+        return super(DeflatedMessageAssemblerTestCase, self).assemble(msg)
+
+    def test_large_inflated_dataset_is_spooled(self):
+        # data set compresses well, so only inflated data set is large
+        msg = c_store_rq(5000)
+        msg.data_set += b'\x00' * 50000
+        received = self.assemble(msg)
+        self.assertEqual(received.data_set.read(), msg.data_set)
+        received.data_set.close()
+
+    def test_digests(self):
+        self.ae.digest_algorithms = ('sha256',)
+        msg = c_store_rq(50000)
+        received = self.assemble(msg)
+        # digests are computed from data set as it was received
+        sent = b''.join(bytes(item.fragment)
+                        for p_data in msg.encode(self.ctx.id, 4096)
+                        for item in p_data.data_value_items
+                        if item.control_header in (0, 2))
+        self.assertEqual(received.digests,
+                         {'sha256': hashlib.sha256(sent).hexdigest()})
+        self.assertEqual(inflate(sent), msg.data_set)
+
+    def test_get_file(self):
+        pass  # compressed data set is never large enough to roll over
+
+    def test_file_is_inflated(self):
+        self.ae.store_in_file.add(sc.BASIC_TEXT_SR_STORAGE)
+        msg = c_store_rq(50000)
+        received = self.assemble(msg).data_set
+        ds = pydicom.dcmread(received)
+        self.assertEqual(ds.file_meta.TransferSyntaxUID,
+                         uid.ExplicitVRLittleEndian)
+        self.assertEqual(ds.PatientID, 'TestID')
+        received.close()
+
+    def test_file_is_deflated(self):
+        self.ae.store_in_file.add(sc.BASIC_TEXT_SR_STORAGE)
+        self.ae.store_deflated = True
+        msg = c_store_rq(50000)
+        received = self.assemble(msg).data_set
+        ds = pydicom.dcmread(received)
+        self.assertEqual(ds.file_meta.TransferSyntaxUID, DEFLATED)
+        self.assertEqual(len(ds[0x0009, 0x1001].value), 50000)
+        received.close()
+
+    def test_sink(self):
+        sink = RecordingSink()
+        self.ae.get_sink = lambda context, command_set, header: sink
+        msg = c_store_rq(50000)
+        self.assertIs(self.assemble(msg).sink, sink)
+        self.assertEqual(sink.context.supported_ts,
+                         uid.ExplicitVRLittleEndian)
+        self.assertEqual(sink.data, msg.data_set)
+
+        sink = RecordingSink()
+        self.ae.store_deflated = True
+        self.assemble(msg)
+        self.assertEqual(sink.context.supported_ts, DEFLATED)
+        self.assertEqual(inflate(sink.data), msg.data_set)
+
+    def test_invalid_data(self):
+        msg = c_store_rq(100)
+        msg.deflate = False
+        assembler = asceprovider.MessageAssembler(
+            FakeAssociation(self.ae, self.ctx))
+        with self.assertRaises(exceptions.DIMSEProcessingError):
+            for p_data in msg.encode(self.ctx.id, 4096):
+                for item in p_data.data_value_items:
+                    assembler.feed(item)
+            assembler.message()
+
+
+class RecordingDUL(object):
+    def __init__(self, dul_socket, timer_wheel):
+        self.sent = []
+        self.on_send = None
+
+    def send(self, p_data):
+        self.sent.append([(item.context_id, item.control_header)
+                          for item in p_data.data_value_items])
+        if self.on_send is not None:
+            self.on_send()
+
+
+class SendTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ae = ae.ClientAE('AET1')
+        self.ae.dul_provider = RecordingDUL
+        self.asce = asceprovider.Association(self.ae, None)
+        self.asce.max_pdu_length = 16000
+
+    def test_messages_do_not_interleave(self):
+        threads = []
+
+        def on_send():
+            if not threads:
+                # another thread sends its message while the first one is
+                # being written
+                thread = threading.Thread(target=self.asce.send,
+                                          args=(c_store_rq(10), 3))
+                thread.start()
+                threads.append(thread)
+                thread.join(0.1)
+
+        self.asce.dul.on_send = on_send
+        self.asce.send(c_store_rq(40000), 1)
+        threads[0].join(5)
+        self.assertFalse(threads[0].is_alive())
+        items = [item for p_data in self.asce.dul.sent for item in p_data]
+        self.assertEqual(items, [(1, 3), (1, 0), (1, 0), (1, 2),
+                                 (3, 3), (3, 2)])
+
+    def test_small_message_is_packed(self):
+        self.asce.send(c_store_rq(10), 1)
+        self.assertEqual(self.asce.dul.sent, [[(1, 3), (1, 2)]])
+
+
+class DeflateTestCase(unittest.TestCase):
+    def test_streaming_round_trip(self):
+        data = b''.join(b'%d' % i for i in range(100000))
+        chunks = [data[i:i + 1000] for i in range(0, len(data), 1000)]
+        compressed = list(dsutils.deflate(chunks))
+        self.assertLess(sum(len(c) for c in compressed), len(data) // 2)
+        inflater = dsutils.Inflater(max_length=4096)
+        pieces = []
+        for i, chunk in enumerate(compressed):
+            pieces.extend(inflater.inflate(chunk, i == len(compressed) - 1))
+        self.assertTrue(all(len(p) <= 4096 for p in pieces))
+        self.assertEqual(b''.join(pieces), data)
+
+    def test_proposed_first(self):
+        ctx = asceprovider.PContextDef(
+            1, sc.BASIC_TEXT_SR_STORAGE,
+            frozenset([uid.ExplicitVRLittleEndian, uid.ImplicitVRLittleEndian,
+                       DEFLATED]))
+        item, = asceprovider.build_pres_context_def_list({1: ctx})
+        self.assertEqual(item.ts_sub_items[0].name, DEFLATED)
+
+
+class RequestTemplateTestCase(unittest.TestCase):
+    remote_ae = {'aet': 'REMOTE', 'address': 'localhost', 'port': 104,
+                 'username': 'user', 'password': 'secret'}
+
+    def setUp(self):
+        self.ae = ae.ClientAE('TEST').add_scu(sc.storage_scu)
+        self.ae.max_ops_invoked = 0
+
+    def test_same_as_built_request(self):
+        self.ae.supported_scp[sc.VERIFICATION_SOP_CLASS] = sc.verification_scp
+        self.ae.update_context_def_list([sc.VERIFICATION_SOP_CLASS])
+        custom = [userdataitems.GenericUserDataSubItem(0x60, b'custom')]
+        ext = [userdataitems.ScpScuRoleSelectionSubItem(uid, 0, 1)
+               for uid in self.ae.supported_scp.keys()]
+        ext.extend(asceprovider.operations_window_items(self.ae))
+        expected = asceprovider.build_association_request(
+            self.ae.local_ae, self.remote_ae,
+            self.ae.max_pdu_length, self.ae.copy_context_def_list(),
+            users_pdu=ext + custom)
+        assoc_rq = asceprovider.association_request_from_template(
+            self.ae.request_template(), self.ae.local_ae, self.remote_ae,
+            users_pdu=custom)
+        self.assertEqual(assoc_rq.encode(), expected.encode())
+        self.assertEqual(assoc_rq.total_length(), len(expected.encode()))
+
+    def test_template_is_reused(self):
+        template = self.ae.request_template()
+        self.assertIs(self.ae.request_template(), template)
+        self.assertEqual(template.context_def_list,
+                         self.ae.copy_context_def_list())
+
+    def test_template_is_rebuilt(self):
+        template = self.ae.request_template()
+        self.ae.add_scu(sc.verification_scu)
+        rebuilt = self.ae.request_template()
+        self.assertGreater(rebuilt.version, template.version)
+        self.assertIn(sc.VERIFICATION_SOP_CLASS,
+                      [c.sop_class for c in rebuilt.context_def_list.values()])
+        self.assertNotIn(
+            sc.VERIFICATION_SOP_CLASS,
+            [c.sop_class for c in template.context_def_list.values()])
+
+        self.ae.max_pdu_length = 32768
+        template = self.ae.request_template()
+        self.assertIsNot(template, rebuilt)
+        self.assertEqual(template.max_pdu_length, 32768)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+import time
+import unittest
+
+from pydicom import dataset
+from pydicom import uid
+
+import netdicom2
+import netdicom2.applicationentity as ae
+import netdicom2.associationpool as associationpool
+import netdicom2.sopclass as sc
+
+from netdicom2 import exceptions
+from netdicom2 import statuses
+
+
+REMOTE_AE = dict(address='127.0.0.1', port=11115, aet='AET2')
+
+
+class CountingAE(ae.AE):
+    def __init__(self, *args, **kwargs):
+        super(CountingAE, self).__init__(*args, **kwargs)
+        self.associations = 0
+
+    def on_association_request(self, assoc):
+        self.associations += 1
+
+    def on_receive_find(self, context, ds):
+        rsp = dataset.Dataset()
+        rsp.PatientName = ds.PatientName
+        return iter([(rsp, statuses.C_FIND_PENDING)])
+
+
+class AssociationPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = CountingAE('AET2', 11115).add_scp(sc.qr_find_scp)\
+            .add_scp(sc.verification_scp)
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.client = ae.ClientAE('AET1').add_scu(sc.qr_find_scu)\
+            .add_scu(sc.verification_scu)
+        self.query = dataset.Dataset()
+        self.query.PatientName = 'Patient^Name^Test'
+
+    def test_association_is_reused(self):
+        with associationpool.AssociationPool(self.client) as pool:
+            for _ in range(5):
+                results = list(netdicom2.c_find(REMOTE_AE, 'AET1', self.query,
+                                                pool=pool))
+                self.assertEqual(results[-1][1], statuses.SUCCESS)
+                self.assertEqual(len(results), 2)
+        self.assertEqual(self.server.associations, 1)
+
+    def test_idle_timeout(self):
+        with associationpool.AssociationPool(self.client,
+                                             idle_timeout=0) as pool:
+            for _ in range(2):
+                with pool.association(REMOTE_AE):
+                    pass
+        self.assertEqual(self.server.associations, 2)
+
+    def test_idle_association_is_reaped(self):
+        with associationpool.AssociationPool(self.client,
+                                             idle_timeout=0.1) as pool:
+            with pool.association(REMOTE_AE) as assoc:
+                pass
+            deadline = time.time() + 5
+            while assoc.association_established and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertFalse(assoc.association_established)
+            self.assertFalse(any(pool._idle.values()))
+
+    def test_transfer_syntaxes_are_part_of_key(self):
+        with associationpool.AssociationPool(self.client) as pool:
+            with pool.association(REMOTE_AE):
+                pass
+            # same SOP classes are proposed with other transfer syntaxes
+            with self.client.lock:
+                self.client.context_def_list = {
+                    pc_id: ctx._replace(supported_ts=frozenset(
+                        [uid.ExplicitVRLittleEndian]))
+                    for pc_id, ctx in self.client.context_def_list.items()}
+                self.client.config_version += 1
+            with pool.association(REMOTE_AE):
+                pass
+        self.assertEqual(self.server.associations, 2)
+
+    def test_health_check(self):
+        with associationpool.AssociationPool(self.client,
+                                             check_interval=0) as pool:
+            for _ in range(2):
+                with pool.association(REMOTE_AE) as assoc:
+                    service = assoc.get_scu(sc.VERIFICATION_SOP_CLASS)
+                    self.assertTrue(service(2).is_success)
+        self.assertEqual(self.server.associations, 1)
+
+    def test_failed_association_is_not_reused(self):
+        with associationpool.AssociationPool(self.client) as pool:
+            with self.assertRaises(ValueError):
+                with pool.association(REMOTE_AE):
+                    raise ValueError()
+            with pool.association(REMOTE_AE):
+                pass
+        self.assertEqual(self.server.associations, 2)
+
+    def test_pool_exhausted(self):
+        with associationpool.AssociationPool(self.client,
+                                             max_size=1) as pool:
+            with pool.association(REMOTE_AE):
+                timeout, self.client.timeout = self.client.timeout, 0.1
+                with self.assertRaises(exceptions.TimeoutError):
+                    pool.acquire(REMOTE_AE)
+                self.client.timeout = timeout
+
+
+if __name__ == '__main__':
+    unittest.main()
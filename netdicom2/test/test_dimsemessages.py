@@ -3,8 +3,12 @@
 #    See the file license.txt included with this distribution.
 __author__ = 'Blane'
 
+import hashlib
+import io
+import tempfile
 import unittest
 import netdicom2.dimsemessages
+import netdicom2.pdu
 
 
 class MessageTesterBase(unittest.TestCase):
@@ -520,3 +524,112 @@ class NDeleteRSPMessage(MessageTesterBase):
         self.assertEqual(self.msg.sop_class_uid, '')
         self.assertEqual(self.msg.status, '')
         self.assertEqual(self.msg.affected_sop_instance_uid, '')
+
+
+class FragmentFileTestCase(unittest.TestCase):
+    def test_fragment_boundaries(self):
+        f = io.BytesIO(b'preamble' + b'x' * 25)
+        f.seek(8)
+        fragments = list(netdicom2.dimsemessages.fragment_file(f, 16, 0, 2))
+        self.assertEqual([len(chunk) for chunk, _ in fragments], [10, 10, 5])
+        self.assertEqual([bit for _, bit in fragments], [0, 0, 2])
+        self.assertEqual(b''.join(bytes(c) for c, _ in fragments), b'x' * 25)
+
+    def test_empty_data_set(self):
+        f = io.BytesIO(b'')
+        self.assertEqual(
+            list(netdicom2.dimsemessages.fragment_file(f, 16, 0, 2)), [])
+
+
+class FragmentFileRegionsTestCase(unittest.TestCase):
+    def test_fragment_boundaries(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(b'preamble' + b'x' * 25)
+            f.seek(8)
+            self.assertTrue(netdicom2.dimsemessages.is_regular_file(f))
+            fragments = list(
+                netdicom2.dimsemessages.fragment_file_regions(f, 16, 0, 2))
+            self.assertEqual([(r.offset, len(r)) for r, _ in fragments],
+                             [(8, 10), (18, 10), (28, 5)])
+            self.assertEqual([bit for _, bit in fragments], [0, 0, 2])
+            self.assertEqual(b''.join(r.read() for r, _ in fragments),
+                             b'x' * 25)
+
+    def test_in_memory_file(self):
+        self.assertFalse(
+            netdicom2.dimsemessages.is_regular_file(io.BytesIO(b'data')))
+
+
+class PDVPackingTestCase(unittest.TestCase):
+    def make_find_rsp(self, data_set):
+        msg = netdicom2.dimsemessages.CFindRSPMessage()
+        msg.message_id_being_responded_to = 1
+        msg.sop_class_uid = '1.2.3'
+        msg.status = 0xFF00
+        msg.data_set = data_set
+        msg.set_length()
+        return msg
+
+    def test_command_and_small_data_set_share_pdu(self):
+        msg = self.make_find_rsp(b'x' * 300)
+        pdus = list(msg.encode(1, 16384))
+        self.assertEqual(len(pdus), 1)
+        headers = [i.control_header for i in pdus[0].data_value_items]
+        self.assertEqual(headers, [3, 2])
+
+    def test_large_data_set(self):
+        msg = self.make_find_rsp(b'x' * 40000)
+        pdus = list(msg.encode(1, 16384))
+        self.assertEqual(len(pdus), 4)  # full fragments do not fit command
+        for p_data in pdus:
+            self.assertLessEqual(p_data.pdu_length, 16384)
+        items = [i for p in pdus for i in p.data_value_items]
+        self.assertEqual(b''.join(bytes(i.fragment) for i in items[1:]),
+                         b'x' * 40000)
+
+    def test_packer(self):
+        packer = netdicom2.dimsemessages.PDVPacker(100)
+        items = [netdicom2.pdu.PresentationDataValueFragment(1, 3, b'x' * 40)
+                 for _ in range(5)]
+        pdus = list(packer.pack(items))
+        self.assertEqual([len(p.data_value_items) for p in pdus], [2, 2])
+        pdus = list(packer.flush())
+        self.assertEqual([len(p.data_value_items) for p in pdus], [1])
+        self.assertEqual(list(packer.flush()), [])
+
+
+class DigestsTestCase(unittest.TestCase):
+    data_set = b'0123456789' * 5000
+
+    def encode(self, data_set):
+        msg = netdicom2.dimsemessages.CStoreRQMessage()
+        msg.message_id = 1
+        msg.sop_class_uid = '1.2.3'
+        msg.affected_sop_instance_uid = '1.2.3.4'
+        msg.data_set = data_set
+        msg.digest_algorithms = ('sha256', 'md5')
+        msg.set_length()
+        items = [i for p in msg.encode(1, 16384) for i in p.data_value_items]
+        self.assertEqual(b''.join(bytes(i.fragment) for i in items[1:]),
+                         self.data_set)
+        return msg.digests
+
+    def check_digests(self, digests):
+        self.assertEqual(digests, {
+            'sha256': hashlib.sha256(self.data_set).hexdigest(),
+            'md5': hashlib.md5(self.data_set).hexdigest()})
+
+    def test_bytes(self):
+        self.check_digests(self.encode(self.data_set))
+
+    def test_regular_file(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(self.data_set)
+            f.seek(0)
+            self.check_digests(self.encode(f))
+
+    def test_no_digests_by_default(self):
+        msg = netdicom2.dimsemessages.CStoreRQMessage()
+        msg.data_set = self.data_set
+        list(msg.encode(1, 16384))
+        self.assertIsNone(msg.digests)
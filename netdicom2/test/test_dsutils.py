@@ -0,0 +1,162 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+import unittest
+
+from pydicom import dataset
+from pydicom import sequence
+from pydicom import uid
+
+import netdicom2.dsutils as dsutils
+import netdicom2.uids as uids
+
+
+def make_dataset():
+    ds = dataset.Dataset()
+    ds.PatientName = 'Patient^Name^Test'
+    ds.PatientID = 'TestID'
+    item = dataset.Dataset()
+    item.CodeValue = '123'
+    item.CodeMeaning = 'Meaning'
+    ds.ConceptNameCodeSequence = sequence.Sequence([item, item])
+    ds.SOPInstanceUID = '1.2.3.4.5.1.1'
+    ds.Rows = 16
+    ds.Columns = 16
+    ds.BitsAllocated = 16
+    ds.PixelData = b'\x00\x01' * 256
+    return ds
+
+
+def undefined_length_sequences(ds):
+    ds.ConceptNameCodeSequence.is_undefined_length = True
+    for item in ds.ConceptNameCodeSequence:
+        item.is_undefined_length_sequence_item = True
+    return ds
+
+
+class HeaderParserTestCase(unittest.TestCase):
+    def check_header(self, ds, is_implicit_vr, is_little_endian, step=1):
+        encoded = dsutils.encode(ds, is_implicit_vr, is_little_endian)
+        parser = dsutils.HeaderParser(is_implicit_vr, is_little_endian)
+        header = None
+        received = 0
+        while header is None:
+            header = parser.feed(encoded[received:received + step])
+            received += step
+        # header is ready before pixel data is received
+        self.assertLess(received, len(encoded) - len(ds.PixelData) + step)
+        self.assertEqual(header.PatientID, ds.PatientID)
+        self.assertEqual(header.SOPInstanceUID, ds.SOPInstanceUID)
+        self.assertEqual(header.Rows, 16)
+        self.assertEqual(len(header.ConceptNameCodeSequence), 2)
+        self.assertNotIn('PixelData', header)
+
+    def test_explicit_little_endian(self):
+        self.check_header(make_dataset(), False, True)
+
+    def test_implicit_little_endian(self):
+        self.check_header(make_dataset(), True, True)
+
+    def test_explicit_big_endian(self):
+        self.check_header(make_dataset(), False, False, step=7)
+
+    def test_undefined_length_sequences(self):
+        self.check_header(undefined_length_sequences(make_dataset()),
+                          False, True)
+        self.check_header(undefined_length_sequences(make_dataset()),
+                          True, True, step=5)
+
+    def test_dataset_without_pixel_data(self):
+        ds = make_dataset()
+        del ds.PixelData
+        encoded = dsutils.encode(ds, False, True)
+        parser = dsutils.HeaderParser(False, True)
+        self.assertIsNone(parser.feed(encoded[:-1]))
+        header = parser.feed(encoded[-1:], last=True)
+        self.assertEqual(header.BitsAllocated, 16)
+        self.assertIsNone(parser.feed(b'ignored'))
+
+    def test_max_length(self):
+        ds = make_dataset()
+        ds.add_new((0x0009, 0x0010), 'LO', 'PRIVATE')
+        ds.add_new((0x0009, 0x1001), 'OB', b'\x00' * 10000)
+        encoded = dsutils.encode(ds, False, True)
+        parser = dsutils.HeaderParser(False, True, max_length=1000)
+        header = parser.feed(encoded[:2000])
+        self.assertEqual(header.SOPInstanceUID, ds.SOPInstanceUID)
+        self.assertIn((0x0009, 0x0010), header)
+        self.assertNotIn((0x0009, 0x1001), header)
+        self.assertNotIn('PatientID', header)
+
+
+class TranscoderTestCase(unittest.TestCase):
+    syntaxes = [(True, True), (False, True), (False, False)]
+
+    def make_dataset(self):
+        ds = make_dataset()
+        ds.AcquisitionMatrix = [1, 2, 3, 4]
+        ds.DiffusionBValue = 1.25
+        ds.TagAngleSecondAxis = -5
+        return ds
+
+    def transcode(self, encoded, src, dst, step):
+        transcoder = dsutils.Transcoder(src[0], src[1], dst[0], dst[1])
+        pieces = []
+        for i in range(0, len(encoded), step):
+            pieces.extend(transcoder.feed(encoded[i:i + step]))
+        transcoder.close()
+        return b''.join(bytes(piece) for piece in pieces)
+
+    def check_transcoding(self, ds, step):
+        for src in self.syntaxes:
+            encoded = dsutils.encode(ds, *src)
+            for dst in self.syntaxes:
+                transcoded = dsutils.decode(
+                    self.transcode(encoded, src, dst, step), *dst)
+                self.assertEqual(transcoded.PatientID, ds.PatientID)
+                self.assertEqual(transcoded.Rows, 16)
+                self.assertEqual(transcoded.AcquisitionMatrix, [1, 2, 3, 4])
+                self.assertEqual(transcoded.DiffusionBValue, 1.25)
+                self.assertEqual(transcoded.TagAngleSecondAxis, -5)
+                self.assertEqual(
+                    transcoded.ConceptNameCodeSequence[1].CodeMeaning,
+                    'Meaning')
+                self.assertEqual(transcoded.SOPInstanceUID,
+                                 ds.SOPInstanceUID)
+                # words of pixel data are kept in dataset byte order
+                pixel_data = b'\x00\x01' if src[1] == dst[1] else b'\x01\x00'
+                self.assertEqual(transcoded.PixelData, pixel_data * 256)
+
+    def test_defined_length_sequences(self):
+        self.check_transcoding(self.make_dataset(), 1)
+        self.check_transcoding(self.make_dataset(), 1000)
+
+    def test_undefined_length_sequences(self):
+        ds = undefined_length_sequences(self.make_dataset())
+        self.check_transcoding(ds, 7)
+
+    def test_lengths_become_undefined(self):
+        ds = self.make_dataset()
+        encoded = dsutils.encode(ds, True, True)
+        transcoded = self.transcode(encoded, (True, True), (False, True), 64)
+        self.assertIn(b'\xfe\xff\xdd\xe0', transcoded)  # sequence delimiter
+        transcoded = self.transcode(encoded, (True, True), (False, False), 64)
+        self.assertNotIn(b'\xfe\xff\xdd\xe0', transcoded)
+        self.assertIn(b'\xff\xfe\xe0\xdd', transcoded)
+
+    def test_truncated_dataset(self):
+        encoded = dsutils.encode(self.make_dataset(), True, True)
+        transcoder = dsutils.Transcoder(True, True, False, True)
+        transcoder.feed(encoded[:-10])
+        with self.assertRaises(ValueError):
+            transcoder.close()
+
+    def test_deflated_source(self):
+        ds = self.make_dataset()
+        chunks = dsutils.deflate([dsutils.encode(ds, False, True)])
+        transcoded = b''.join(bytes(piece) for piece in dsutils.transcode(
+            chunks, uids.DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN,
+            uid.ImplicitVRLittleEndian))
+        self.assertEqual(dsutils.decode(transcoded, True, True).PatientID,
+                         ds.PatientID)
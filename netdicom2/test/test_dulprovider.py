@@ -0,0 +1,248 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+import netdicom2.dulprovider
+import netdicom2.pdu
+
+
+class PDUReaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sock, self.peer = socket.socketpair()
+
+    def tearDown(self):
+        self.sock.close()
+        self.peer.close()
+
+    def test_several_pdus_in_one_read(self):
+        pdus = [netdicom2.pdu.AReleaseRqPDU(), netdicom2.pdu.AReleaseRpPDU(),
+                netdicom2.pdu.AAbortPDU(source=2, reason_diag=1)]
+        self.peer.sendall(b''.join(p.encode() for p in pdus))
+
+        reader = netdicom2.dulprovider.PDUReader(self.sock, 1024)
+        for expected in pdus:
+            pdu_type, raw_pdu = reader.read_pdu()
+            self.assertEqual(pdu_type, expected.pdu_type)
+            self.assertEqual(bytes(raw_pdu), expected.encode())
+        self.assertFalse(reader.has_pdu())
+
+    def test_pdu_larger_than_buffer(self):
+        item = netdicom2.pdu.PresentationDataValueItem(1, b'\x02' + b'x' * 5000)
+        p_data = netdicom2.pdu.PDataTfPDU([item])
+        release = netdicom2.pdu.AReleaseRqPDU()
+        self.peer.sendall(p_data.encode() + release.encode())
+
+        reader = netdicom2.dulprovider.PDUReader(self.sock, 64)
+        pdu_type, raw_pdu = reader.read_pdu()
+        self.assertEqual(pdu_type, p_data.pdu_type)
+        self.assertEqual(bytes(raw_pdu), p_data.encode())
+        pdu_type, raw_pdu = reader.read_pdu()
+        self.assertEqual(bytes(raw_pdu), release.encode())
+
+    def test_partial_pdu_is_moved_to_buffer_start(self):
+        release = netdicom2.pdu.AReleaseRqPDU().encode()
+        reader = netdicom2.dulprovider.PDUReader(self.sock, 16)
+        self.peer.sendall(release + release[:4])
+        reader.read_pdu()
+        self.assertFalse(reader.has_pdu())
+        self.peer.sendall(release[4:])
+        _, raw_pdu = reader.read_pdu()
+        self.assertEqual(bytes(raw_pdu), release)
+
+    def test_returned_pdus_are_not_overwritten(self):
+        first = netdicom2.pdu.AAbortPDU(source=2, reason_diag=1).encode()
+        second = netdicom2.pdu.AReleaseRqPDU().encode()
+        reader = netdicom2.dulprovider.PDUReader(self.sock, 16)
+        self.peer.sendall(first)
+        _, raw_first = reader.read_pdu()
+        self.peer.sendall(second)
+        _, raw_second = reader.read_pdu()
+        self.assertEqual(bytes(raw_first), first)
+        self.assertEqual(bytes(raw_second), second)
+
+    def test_connection_closed(self):
+        self.peer.close()
+        reader = netdicom2.dulprovider.PDUReader(self.sock)
+        self.assertIsNone(reader.read_pdu())
+
+
+class SendBuffersTestCase(unittest.TestCase):
+    def test_partial_sends(self):
+        sock, peer = socket.socketpair()
+        self.addCleanup(sock.close)
+        self.addCleanup(peer.close)
+        buffers = [b'header', bytearray(b'x' * 1000000), b'', b'tail']
+        expected = b''.join(buffers)
+        received = bytearray()
+
+        def receive():
+            while len(received) < len(expected):
+                received.extend(peer.recv(65536))
+
+        reader = threading.Thread(target=receive)
+        reader.start()
+        netdicom2.dulprovider.send_buffers(sock, buffers)
+        reader.join(5)
+        self.assertEqual(bytes(received), expected)
+
+    def test_file_regions(self):
+        sock, peer = socket.socketpair()
+        self.addCleanup(sock.close)
+        self.addCleanup(peer.close)
+        with tempfile.TemporaryFile() as f:
+            f.write(b'0123456789')
+            f.flush()
+            buffers = [b'header', netdicom2.pdu.FileRegion(f, 2, 5), b'tail']
+            netdicom2.dulprovider.send_buffers(sock, buffers)
+        sock.shutdown(socket.SHUT_WR)
+        received = b''
+        while True:
+            data = peer.recv(1024)
+            if not data:
+                break
+            received += data
+        self.assertEqual(received, b'header23456tail')
+
+
+class DirectWriteTestCase(unittest.TestCase):
+    def test_p_data_written_from_caller_thread(self):
+        sock, peer = socket.socketpair()
+        self.addCleanup(peer.close)
+        provider = netdicom2.dulprovider.DULServiceProvider(sock)
+        self.addCleanup(sock.close)
+        self.addCleanup(provider.kill)
+        while provider.state_machine.current_state != 'Sta2':
+            time.sleep(0.01)  # wait for transport connection indication
+        with provider._write_lock:
+            provider.state_machine.current_state = 'Sta6'
+
+        item = netdicom2.pdu.PresentationDataValueItem(1, b'\x02data')
+        p_data = netdicom2.pdu.PDataTfPDU([item])
+        provider.send(p_data)
+        self.assertEqual(provider.from_service_user.unfinished_tasks, 0)
+        expected = p_data.encode()
+        received = b''
+        while len(received) < len(expected):
+            received += peer.recv(1024)
+        self.assertEqual(received, expected)
+
+    def test_p_data_queued_when_transport_is_closed(self):
+        sock, peer = socket.socketpair()
+        self.addCleanup(peer.close)
+        provider = netdicom2.dulprovider.DULServiceProvider(sock)
+        self.addCleanup(sock.close)
+        self.addCleanup(provider.kill)
+        while provider.state_machine.current_state != 'Sta2':
+            time.sleep(0.01)
+        item = netdicom2.pdu.PresentationDataValueItem(1, b'\x02data')
+        with provider._write_lock:
+            # remote end closed connection, event is not processed yet
+            provider.state_machine.current_state = 'Sta6'
+            provider.dul_socket = None
+            self.assertFalse(provider._write_directly(
+                netdicom2.pdu.PDataTfPDU([item])))
+            provider.dul_socket = sock
+
+
+def p_data(size):
+    item = netdicom2.pdu.PresentationDataValueItem(1, b'\x02' + b'x' * size)
+    return netdicom2.pdu.PDataTfPDU([item])
+
+
+class PDUQueueTestCase(unittest.TestCase):
+    def test_size_in_bytes(self):
+        q = netdicom2.dulprovider.PDUQueue(high_water=100)
+        q.put(netdicom2.pdu.AReleaseRqPDU())
+        q.put(p_data(50))
+        self.assertEqual(q.nbytes, p_data(50).pdu_length)
+        self.assertFalse(q.full())
+        q.put(p_data(50))
+        self.assertTrue(q.full())
+        with self.assertRaises(netdicom2.dulprovider.queue.Full):
+            q.put(p_data(1), timeout=0.01)
+        # control PDUs are not held back
+        q.put(netdicom2.pdu.AAbortPDU(source=0, reason_diag=0), False)
+
+    def test_large_pdu_in_empty_queue(self):
+        q = netdicom2.dulprovider.PDUQueue(high_water=100)
+        q.put(p_data(1000), False)
+        self.assertTrue(q.full())
+        q.get()
+        self.assertEqual(q.nbytes, 0)
+
+    def test_space_callback(self):
+        calls = []
+        q = netdicom2.dulprovider.PDUQueue(high_water=100)
+        q.space_callback = lambda: calls.append(q.nbytes)
+        q.put(p_data(60))
+        q.put(p_data(60))
+        q.get()
+        q.get()
+        self.assertEqual(calls, [p_data(60).pdu_length])
+
+    def test_unbound(self):
+        q = netdicom2.dulprovider.PDUQueue(high_water=100)
+        q.put(p_data(200))
+        threading.Timer(0.05, q.unbound).start()
+        q.put(p_data(200), timeout=5)
+        self.assertEqual(q.qsize(), 2)
+
+
+class IncomingQueueTestCase(unittest.TestCase):
+    def test_late_deadline_marker_is_ignored(self):
+        provider = netdicom2.dulprovider.DULServiceProvider()
+        self.addCleanup(provider.kill)
+        # deadline expired while its receive was already returning
+        provider.to_service_user.put(netdicom2.dulprovider._Deadline(0))
+        self.assertFalse(provider.has_incoming_pdu())
+        provider.to_service_user.put(netdicom2.pdu.AReleaseRqPDU())
+        self.assertTrue(provider.has_incoming_pdu())
+
+
+class BackpressureTestCase(unittest.TestCase):
+    def check_reading_is_paused(self, provider_class):
+        class Provider(provider_class):
+            incoming_high_water = 10000
+
+        sock, peer = socket.socketpair()
+        self.addCleanup(peer.close)
+        provider = Provider(sock)
+        self.addCleanup(sock.close)
+        self.addCleanup(provider.kill)
+        while provider.state_machine.current_state != 'Sta2':
+            time.sleep(0.01)  # wait for transport connection indication
+        with provider._write_lock:
+            provider.state_machine.current_state = 'Sta6'
+
+        pdus = [p_data(1000) for _ in range(100)]
+        sender = threading.Thread(
+            target=peer.sendall, args=(b''.join(p.encode() for p in pdus),))
+        sender.daemon = True
+        sender.start()
+        time.sleep(0.3)
+        # service user is not reading, so provider should stop at the mark
+        self.assertTrue(provider.to_service_user.full())
+        self.assertLess(provider.to_service_user.nbytes,
+                        10000 + pdus[0].pdu_length)
+
+        for _ in pdus:
+            provider.receive(5)
+        sender.join(5)
+        self.assertEqual(provider.to_service_user.nbytes, 0)
+
+    def test_polling_provider(self):
+        self.check_reading_is_paused(netdicom2.dulprovider.DULServiceProvider)
+
+    def test_event_driven_provider(self):
+        self.check_reading_is_paused(
+            netdicom2.dulprovider.EventDrivenDULServiceProvider)
+
+
+if __name__ == '__main__':
+    unittest.main()
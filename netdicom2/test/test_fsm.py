@@ -0,0 +1,68 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+import unittest
+
+import netdicom2.applicationentity as ae
+import netdicom2.fsm as fsm
+import netdicom2.sopclass as sc
+
+
+class CompiledTableTestCase(unittest.TestCase):
+    def test_all_transitions_are_compiled(self):
+        for (event, state), action in fsm.TransitionTable.items():
+            index = fsm.event_code(event) * fsm.STATE_COUNT + \
+                fsm.state_code(state)
+            self.assertIs(fsm.Transitions[index], action)
+        self.assertEqual(sum(1 for a in fsm.Transitions if a is not None),
+                         len(fsm.TransitionTable))
+
+    def test_unknown_transition(self):
+        machine = fsm.StateMachine(None)
+        with self.assertRaises(KeyError):
+            machine.action(fsm.EVT9, None)
+        self.assertEqual(machine.current_state, 'Sta1')
+
+    def test_state_names(self):
+        machine = fsm.StateMachine(None)
+        machine.current_state = 'Sta13'
+        self.assertEqual(machine.state, fsm.STA13)
+
+
+class TransitionStatisticsTestCase(unittest.TestCase):
+    def tearDown(self):
+        fsm.disable_statistics()
+
+    def test_statistics(self):
+        statistics = fsm.enable_statistics()
+        statistics.reset()
+        server = ae.AE('AET2', 11119).add_scp(sc.verification_scp)
+        client = ae.ClientAE('AET1').add_scu(sc.verification_scu)
+        remote_ae = dict(address='127.0.0.1', port=11119, aet='AET2')
+        with server:
+            with client.request_association(remote_ae) as assoc:
+                service = assoc.get_scu(sc.VERIFICATION_SOP_CLASS)
+                for i in range(3):
+                    service(i + 1)
+
+        transitions = statistics.transitions()
+        # C-ECHO request and response on both sides
+        count, last = transitions[('Evt9', 'Sta6')]
+        self.assertEqual(count, 6)
+        self.assertIsNotNone(last)
+        self.assertEqual(transitions[('Evt10', 'Sta6')][0], 6)
+        self.assertEqual(transitions[('Evt1', 'Sta1')][0], 1)
+        self.assertGreater(statistics.time_in_states()['Sta6'], 0)
+
+        fsm.disable_statistics()
+        statistics.reset()
+        server = ae.AE('AET2', 11119).add_scp(sc.verification_scp)
+        with server:
+            with client.request_association(remote_ae) as assoc:
+                assoc.get_scu(sc.VERIFICATION_SOP_CLASS)(1)
+        self.assertEqual(statistics.transitions(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
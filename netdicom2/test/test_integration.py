@@ -1,5 +1,11 @@
 __author__ = 'Blane'
 
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 
 from six.moves import range
@@ -17,7 +23,9 @@ except ImportError:
     from dicom import datadict
 
 import netdicom2.applicationentity as ae
+import netdicom2.dulprovider as dulprovider
 import netdicom2.sopclass as sc
+import netdicom2.uids as uids
 
 from netdicom2 import statuses
 
@@ -39,6 +47,21 @@ class CEchoTestCase(unittest.TestCase):
                 self.assertTrue(result.is_success)
 
 
+class CEchoEventDrivenTestCase(unittest.TestCase):
+    def test_c_echo_positive(self):
+        ae1 = ae.ClientAE('AET1').add_scu(sc.verification_scu)
+        ae1.dul_provider = dulprovider.EventDrivenDULServiceProvider
+        ae2 = ae.AE('AET2', 11112).add_scp(sc.verification_scp)
+        ae2.dul_provider = dulprovider.EventDrivenDULServiceProvider
+        with ae2:
+            remote_ae = dict(address='127.0.0.1', port=11112, aet='AET2')
+            with ae1.request_association(remote_ae) as assoc:
+                service = assoc.get_scu(sc.VERIFICATION_SOP_CLASS)
+                for i in range(10):
+                    result = service(i + 1)
+                    self.assertTrue(result.is_success)
+
+
 class CFindServerAE(ae.AE):
     def __init__(self, test_name, test, *args, **kwargs):
         super(CFindServerAE, self).__init__(*args, **kwargs)
@@ -124,6 +147,26 @@ class CStoreTestCase(unittest.TestCase):
                 status = service(rq, 1)
                 self.assertEqual(status, statuses.SUCCESS)
 
+    def test_c_store_digests(self):
+        file_name = 'test_sr.dcm'
+        rq = dicom.read_file(file_name)
+
+        ae1 = ae.ClientAE('AET1', [uid.ExplicitVRLittleEndian])\
+            .add_scu(sc.storage_scu, [sc.COMPREHENSIVE_SR_STORAGE])
+        ae1.digest_algorithms = ('sha256',)
+        ae2 = CStoreAE(self, rq, 'AET2', 11112).add_scp(sc.storage_scp)
+        with ae2:
+            remote_ae = dict(address='127.0.0.1', port=11112, aet='AET2')
+            with ae1.request_association(remote_ae) as assoc:
+                service = assoc.get_scu(sc.COMPREHENSIVE_SR_STORAGE)
+                status = service(file_name, 1)
+                self.assertEqual(status, statuses.SUCCESS)
+
+        with open(file_name, 'rb') as f:
+            sc._read_file_uids(f)  # skips file meta information
+            expected = hashlib.sha256(f.read()).hexdigest()
+        self.assertEqual(status.digests, {'sha256': expected})
+
     def test_c_store_from_file(self):
         file_name = 'test_sr.dcm'
         rq = dicom.read_file(file_name)
@@ -140,7 +183,299 @@ class CStoreTestCase(unittest.TestCase):
                 self.assertEqual(status, statuses.SUCCESS)
 
 
-import threading
+class StoreHeaderAE(ae.AE):
+    def __init__(self, directory, *args, **kwargs):
+        ae.AE.__init__(self, *args, **kwargs)
+        self.directory = directory
+        self.headers = []
+        self.stored = []
+
+    def on_store_header(self, context, command_set, header):
+        self.headers.append(header)
+        if header.PatientID == 'Rejected':
+            return statuses.C_STORE_OUT_OF_RESOURCES
+        if header.PatientID == 'Skipped':
+            return statuses.SUCCESS
+        if header.PatientID == 'Redirected':
+            fp = open(os.path.join(self.directory, header.SOPInstanceUID),
+                      'w+b')
+            start = fp.tell()
+            ae.write_meta(fp, command_set, context.supported_ts)
+            return fp, start
+        return None
+
+    def on_receive_store(self, context, ds):
+        self.stored.append(dicom.read_file(ds))
+        return statuses.SUCCESS
+
+
+class StoreHeaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.ae2 = StoreHeaderAE(self.directory, 'AET2', 11112)\
+            .add_scp(sc.storage_scp)
+        self.ae1 = ae.ClientAE('AET1').add_scu(sc.storage_scu,
+                                               [sc.CT_IMAGE_STORAGE])
+
+    def store(self, patient_id):
+        rq = dataset.Dataset()
+        rq.PatientID = patient_id
+        rq.SOPInstanceUID = uid.generate_uid()
+        rq.SOPClassUID = sc.CT_IMAGE_STORAGE
+        rq.BitsAllocated = 8
+        rq.PixelData = b'\x00' * 200000
+        remote_ae = dict(address='127.0.0.1', port=11112, aet='AET2')
+        with self.ae2:
+            with self.ae1.request_association(remote_ae) as assoc:
+                service = assoc.get_scu(sc.CT_IMAGE_STORAGE)
+                return service(rq, 1)
+
+    def test_accepted(self):
+        self.assertEqual(self.store('Accepted'), statuses.SUCCESS)
+        self.assertNotIn('PixelData', self.ae2.headers[0])
+        self.assertEqual(len(self.ae2.stored), 1)
+        self.assertEqual(len(self.ae2.stored[0].PixelData), 200000)
+
+    def test_rejected(self):
+        self.assertEqual(self.store('Rejected'),
+                         statuses.C_STORE_OUT_OF_RESOURCES)
+        self.assertEqual(self.ae2.stored, [])
+
+    def test_skipped(self):
+        self.assertEqual(self.store('Skipped'), statuses.SUCCESS)
+        self.assertEqual(self.ae2.stored, [])
+
+    def test_redirected(self):
+        self.assertEqual(self.store('Redirected'), statuses.SUCCESS)
+        stored = self.ae2.stored[0]
+        self.assertEqual(len(stored.PixelData), 200000)
+        stored_file = dicom.read_file(os.path.join(self.directory,
+                                                   stored.SOPInstanceUID))
+        self.assertEqual(stored_file.PatientID, 'Redirected')
+
+
+class DeflatedStoreAE(ae.AE):
+    def __init__(self, *args, **kwargs):
+        ae.AE.__init__(self, *args, **kwargs)
+        self.received = []
+
+    def on_receive_store(self, context, ds):
+        self.received.append((context.supported_ts, dicom.read_file(ds)))
+        ds.close()
+        return statuses.SUCCESS
+
+
+class StoreFilesMixin(object):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.rq = dataset.Dataset()
+        self.rq.PatientID = 'Deflated'
+        self.rq.SOPInstanceUID = uid.generate_uid()
+        self.rq.SOPClassUID = sc.CT_IMAGE_STORAGE
+        self.rq.BitsAllocated = 8
+        self.rq.PixelData = b'\x00' * 200000
+
+    def save(self, ts):
+        path = os.path.join(self.directory, ts)
+        self.rq.file_meta = dataset.FileMetaDataset()
+        self.rq.file_meta.MediaStorageSOPClassUID = self.rq.SOPClassUID
+        self.rq.file_meta.MediaStorageSOPInstanceUID = self.rq.SOPInstanceUID
+        self.rq.file_meta.TransferSyntaxUID = ts
+        self.rq.is_implicit_VR = ts == uid.ImplicitVRLittleEndian
+        self.rq.is_little_endian = True
+        self.rq.save_as(path, write_like_original=False)
+        return path
+
+
+class DeflatedStoreTestCase(StoreFilesMixin, unittest.TestCase):
+    supported_ts = [uids.DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN,
+                    uid.ExplicitVRLittleEndian, uid.ImplicitVRLittleEndian]
+
+    def store(self, datasets, store_deflated=False):
+        ae1 = ae.ClientAE('AET1', self.supported_ts)\
+            .add_scu(sc.storage_scu, [sc.CT_IMAGE_STORAGE])
+        ae2 = DeflatedStoreAE('AET2', 11122, self.supported_ts)\
+            .add_scp(sc.storage_scp)
+        ae2.store_deflated = store_deflated
+        remote_ae = dict(address='127.0.0.1', port=11122, aet='AET2')
+        with ae2:
+            with ae1.request_association(remote_ae) as assoc:
+                self.assertEqual(
+                    assoc.sop_classes_as_scu[sc.CT_IMAGE_STORAGE][1],
+                    uids.DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN)
+                service = assoc.get_scu(sc.CT_IMAGE_STORAGE)
+                for i, ds in enumerate(datasets):
+                    status = service(ds, i + 1)
+                    self.assertEqual(status, statuses.SUCCESS)
+        return ae2.received
+
+    def test_dataset_and_files(self):
+        received = self.store([
+            self.rq,
+            self.save(uid.ExplicitVRLittleEndian),
+            self.save(uids.DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN)])
+        self.assertEqual(len(received), 3)
+        for ts, ds in received:
+            self.assertEqual(ts, uids.DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN)
+            # data set was inflated as it was received
+            self.assertEqual(ds.file_meta.TransferSyntaxUID,
+                             uid.ExplicitVRLittleEndian)
+            self.assertEqual(ds.PatientID, 'Deflated')
+            self.assertEqual(ds.PixelData, self.rq.PixelData)
+
+    def test_stored_deflated(self):
+        (_, ds), = self.store([self.rq], store_deflated=True)
+        self.assertEqual(ds.file_meta.TransferSyntaxUID,
+                         uids.DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN)
+        self.assertEqual(ds.PixelData, self.rq.PixelData)
+
+
+class MoveFilesAE(ae.AE):
+    def __init__(self, files, destination, *args, **kwargs):
+        ae.AE.__init__(self, *args, **kwargs)
+        self.files = files
+        self.destination = destination
+
+    def on_receive_move(self, context, ds, destination):
+        return self.destination, len(self.files), iter(self.files)
+
+
+class TranscodingTestCase(StoreFilesMixin, unittest.TestCase):
+    # receiver only accepts syntax that files are not stored in
+    receiver_ts = [uid.ExplicitVRBigEndian]
+
+    def files(self):
+        self.rq.AcquisitionMatrix = [1, 2, 3, 4]
+        self.rq.BitsAllocated = 16
+        self.rq.PixelData = b'\x00\x01' * 1000
+        return [self.save(uid.ImplicitVRLittleEndian),
+                self.save(uid.ExplicitVRLittleEndian),
+                self.save(uids.DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN)]
+
+    def check_received(self, received):
+        self.assertEqual(len(received), 3)
+        for ts, ds in received:
+            self.assertEqual(ts, uid.ExplicitVRBigEndian)
+            self.assertEqual(ds.PatientID, 'Deflated')
+            self.assertEqual(ds.AcquisitionMatrix, [1, 2, 3, 4])
+            self.assertEqual(ds.PixelData, b'\x01\x00' * 1000)
+
+    def test_storage_scu(self):
+        files = self.files()
+        ae1 = ae.ClientAE('AET1')\
+            .add_scu(sc.storage_scu, [sc.CT_IMAGE_STORAGE])
+        ae2 = DeflatedStoreAE('AET2', 11123, self.receiver_ts)\
+            .add_scp(sc.storage_scp)
+        remote_ae = dict(address='127.0.0.1', port=11123, aet='AET2')
+        with ae2:
+            with ae1.request_association(remote_ae) as assoc:
+                service = assoc.get_scu(sc.CT_IMAGE_STORAGE)
+                for i, path in enumerate(files):
+                    self.assertEqual(service(path, i + 1), statuses.SUCCESS)
+            self.check_received(ae2.received)
+            ae2.received = []
+            with ae1.request_association(remote_ae) as assoc:
+                statuses_ = [status for _, status in
+                             sc.pipelined_storage_scu(assoc, files)]
+                self.assertEqual(statuses_, [statuses.SUCCESS] * 3)
+            self.check_received(ae2.received)
+
+    def test_move_scp(self):
+        remote_ae = dict(address='127.0.0.1', port=11123, aet='AET2')
+        destination = dict(address='127.0.0.1', port=11124, aet='AET3')
+        ae1 = ae.ClientAE('AET1').add_scu(sc.qr_move_scu)
+        ae2 = MoveFilesAE(self.files(), destination, 'AET2', 11123)\
+            .add_scp(sc.qr_move_scp)\
+            .add_scu(sc.storage_scu, [sc.CT_IMAGE_STORAGE])
+        ae3 = DeflatedStoreAE('AET3', 11124, self.receiver_ts)\
+            .add_scp(sc.storage_scp)
+        with ae3, ae2:
+            with ae1.request_association(remote_ae) as assoc:
+                service = assoc.get_scu(sc.STUDY_ROOT_MOVE_SOP_CLASS)
+                rq = dataset.Dataset()
+                rq.QueryRetrieveLevel = 'STUDY'
+                for status, _ in service(rq, 'AET3', 1):
+                    self.assertTrue(status.is_pending)
+        self.check_received(ae3.received)
+
+
+class PipelinedStoreAE(ae.AE):
+    def __init__(self, *args, **kwargs):
+        ae.AE.__init__(self, *args, **kwargs)
+        self.received = []
+        self.in_progress = 0
+        self.max_in_progress = 0
+        self.counter_lock = threading.Lock()
+
+    def on_receive_store(self, context, ds):
+        with self.counter_lock:
+            self.in_progress += 1
+            self.max_in_progress = max(self.max_in_progress,
+                                       self.in_progress)
+        time.sleep(0.05)
+        with self.counter_lock:
+            self.in_progress -= 1
+            self.received.append(dicom.read_file(ds).SOPInstanceUID)
+        return statuses.SUCCESS
+
+
+class PipelinedCStoreTestCase(unittest.TestCase):
+    def make_datasets(self, count):
+        datasets = []
+        for i in range(count):
+            ds = dataset.Dataset()
+            ds.PatientName = 'Patient^Name^Test'
+            ds.SOPInstanceUID = '1.2.3.4.5.1.{0}'.format(i + 1)
+            ds.SOPClassUID = sc.BASIC_TEXT_SR_STORAGE
+            datasets.append(ds)
+        return datasets
+
+    def test_operations_window_negotiation(self):
+        ae1 = ae.ClientAE('AET1').add_scu(sc.verification_scu)
+        ae1.max_ops_invoked = 8
+        ae2 = ae.AE('AET2', 11112).add_scp(sc.verification_scp)
+        ae2.max_ops_performed = 4
+        with ae2:
+            remote_ae = dict(address='127.0.0.1', port=11112, aet='AET2')
+            with ae1.request_association(remote_ae) as assoc:
+                self.assertEqual(assoc.max_ops_invoked, 4)
+                self.assertEqual(assoc.max_ops_performed, 1)
+
+    def test_pipelined_c_store(self):
+        datasets = self.make_datasets(10)
+        ae1 = ae.ClientAE('AET1').add_scu(sc.storage_scu,
+                                          [sc.BASIC_TEXT_SR_STORAGE])
+        ae1.max_ops_invoked = 4
+        ae2 = PipelinedStoreAE('AET2', 11112).add_scp(sc.storage_scp)
+        ae2.max_ops_performed = 4
+        with ae2:
+            remote_ae = dict(address='127.0.0.1', port=11112, aet='AET2')
+            with ae1.request_association(remote_ae) as assoc:
+                results = list(sc.pipelined_storage_scu(assoc, datasets))
+
+        self.assertEqual(len(results), len(datasets))
+        self.assertTrue(all(status == statuses.SUCCESS
+                            for _, status in results))
+        self.assertEqual(set(ds.SOPInstanceUID for ds, _ in results),
+                         set(ds.SOPInstanceUID for ds in datasets))
+        self.assertEqual(len(ae2.received), len(datasets))
+        self.assertGreater(ae2.max_in_progress, 1)
+        self.assertLessEqual(ae2.max_in_progress, 4)
+
+    def test_pipelined_c_store_without_window(self):
+        datasets = self.make_datasets(3)
+        ae1 = ae.ClientAE('AET1').add_scu(sc.storage_scu,
+                                          [sc.BASIC_TEXT_SR_STORAGE])
+        ae2 = PipelinedStoreAE('AET2', 11112).add_scp(sc.storage_scp)
+        with ae2:
+            remote_ae = dict(address='127.0.0.1', port=11112, aet='AET2')
+            with ae1.request_association(remote_ae) as assoc:
+                results = list(sc.pipelined_storage_scu(assoc, datasets))
+
+        self.assertEqual([ds for ds, _ in results], datasets)
+        self.assertEqual(ae2.max_in_progress, 1)
 
 
 class CommitmentAE(ae.AE):
@@ -35,6 +35,33 @@ class TestPDUEncoding(unittest.TestCase):
                                             variable_items=[])
         self.decode_and_compare(pdu)
 
+    def test_p_data_tf_pdu(self):
+        items = [netdicom2.pdu.PresentationDataValueItem(1, b'\x03command'),
+                 netdicom2.pdu.PresentationDataValueItem(3, b'\x02data')]
+        raw_pdu = bytearray(netdicom2.pdu.PDataTfPDU(items).encode())
+        pdu = netdicom2.pdu.PDataTfPDU.decode(raw_pdu)
+        self.assertEqual(len(pdu.data_value_items), 2)
+        for item, decoded in zip(items, pdu.data_value_items):
+            self.assertEqual(decoded.context_id, item.context_id)
+            self.assertIsInstance(decoded.data_value, memoryview)
+            self.assertEqual(bytes(decoded.data_value), item.data_value)
+        self.assertEqual(pdu.data_value_items[0].control_header, 3)
+        self.assertEqual(bytes(pdu.data_value_items[1].fragment), b'data')
+
+        # data values reference raw PDU instead of copying it
+        raw_pdu[-4:] = b'DATA'
+        self.assertEqual(bytes(pdu.data_value_items[1].fragment), b'DATA')
+
+    def test_p_data_tf_pdu_buffers(self):
+        fragment = bytearray(b'fragment')
+        item = netdicom2.pdu.PresentationDataValueFragment(1, 2, fragment)
+        pdu = netdicom2.pdu.PDataTfPDU([item])
+        buffers = pdu.encode_buffers()
+        self.assertIs(buffers[-1], fragment)
+        expected = netdicom2.pdu.PDataTfPDU(
+            [netdicom2.pdu.PresentationDataValueItem(1, b'\x02fragment')])
+        self.assertEqual(b''.join(buffers), expected.encode())
+
 
 class TestSubItemEncoding(unittest.TestCase):
     def decode_and_compare_sub_item(self, item):
@@ -0,0 +1,82 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+from pydicom import dataset
+
+import netdicom2.applicationentity as ae
+import netdicom2.processpool as processpool
+import netdicom2.sopclass as sc
+
+from netdicom2 import statuses
+
+
+REMOTE_AE = dict(address='127.0.0.1', port=11116, aet='AET2')
+
+
+def make_echo_ae():
+    return ae.AE('AET2', 11116).add_scp(sc.verification_scp)
+
+
+def mark_processed(file_name):
+    with open(file_name + '.done', 'w'):
+        pass
+
+
+def echo():
+    client = ae.ClientAE('AET1').add_scu(sc.verification_scu)
+    with client.request_association(REMOTE_AE) as assoc:
+        service = assoc.get_scu(sc.VERIFICATION_SOP_CLASS)
+        return service(1).is_success
+
+
+class ProcessPoolServerTestCase(unittest.TestCase):
+    def test_pre_fork(self):
+        with processpool.ProcessPoolServer(make_echo_ae, processes=2) as server:
+            self.assertEqual(len(server.workers), 2)
+            for _ in range(4):
+                self.assertTrue(echo())
+        self.assertEqual(server.workers, [])
+
+    @unittest.skipUnless(hasattr(socket, 'SO_REUSEPORT'),
+                         'SO_REUSEPORT is not supported')
+    def test_reuse_port(self):
+        with processpool.ProcessPoolServer(make_echo_ae, processes=2,
+                                           reuse_port=True):
+            for _ in range(4):
+                self.assertTrue(echo())
+        self.assertFalse(ae.AE.reuse_port)
+
+
+class PostProcessingStorageAETestCase(unittest.TestCase):
+    def setUp(self):
+        self.storage_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.storage_dir)
+
+    def test_post_processing(self):
+        rq = dataset.Dataset()
+        rq.PatientName = 'Patient^Name^Test'
+        rq.SOPInstanceUID = '1.2.3.4.5.1.1'
+        rq.SOPClassUID = sc.BASIC_TEXT_SR_STORAGE
+
+        client = ae.ClientAE('AET1').add_scu(sc.storage_scu,
+                                             [sc.BASIC_TEXT_SR_STORAGE])
+        server = processpool.PostProcessingStorageAE(
+            mark_processed, self.storage_dir, 'AET2', 11116, max_workers=1)
+        server.add_scp(sc.storage_scp)
+        with server:
+            with client.request_association(REMOTE_AE) as assoc:
+                service = assoc.get_scu(sc.BASIC_TEXT_SR_STORAGE)
+                self.assertEqual(service(rq, 1), statuses.SUCCESS)
+        marker = os.path.join(self.storage_dir, rq.SOPInstanceUID + '.dcm.done')
+        self.assertTrue(os.path.exists(marker))
+
+
+if __name__ == '__main__':
+    unittest.main()
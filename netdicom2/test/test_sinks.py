@@ -0,0 +1,177 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import pydicom
+from pydicom import dataset
+from pydicom import uid
+
+import netdicom2.applicationentity as ae
+import netdicom2.sinks as sinks
+import netdicom2.sopclass as sc
+
+from netdicom2 import statuses
+
+
+REMOTE_AE = dict(address='127.0.0.1', port=11120, aet='AET2')
+
+
+class StatusSink(sinks.Sink):
+    def __init__(self, status):
+        self.status = status
+        self.chunks = []
+        self.aborted = False
+
+    def chunk(self, data):
+        self.chunks.append(bytes(data))
+
+    def end(self):
+        return self.status
+
+    def abort(self):
+        self.aborted = True
+
+
+class TeeSinkTestCase(unittest.TestCase):
+    def test_chunks_are_passed_to_all_sinks(self):
+        first, second = StatusSink(0), StatusSink(0)
+        tee = sinks.TeeSink([first, second])
+        tee.begin(None, None, None)
+        tee.chunk(b'abc')
+        tee.chunk(memoryview(b'def'))
+        self.assertEqual(tee.end(), statuses.SUCCESS)
+        self.assertEqual(first.chunks, [b'abc', b'def'])
+        self.assertEqual(second.chunks, first.chunks)
+
+    def test_most_severe_status(self):
+        tee = sinks.TeeSink([StatusSink(statuses.SUCCESS),
+                             StatusSink(statuses.C_STORE_ELEMENTS_DISCARDED),
+                             StatusSink(statuses.C_STORE_OUT_OF_RESOURCES)])
+        self.assertEqual(tee.end(), statuses.C_STORE_OUT_OF_RESOURCES)
+        tee = sinks.TeeSink([StatusSink(statuses.SUCCESS),
+                             StatusSink(statuses.C_STORE_ELEMENTS_DISCARDED)])
+        self.assertEqual(tee.end(), statuses.C_STORE_ELEMENTS_DISCARDED)
+
+    def test_abort(self):
+        first, second = StatusSink(0), StatusSink(0)
+        tee = sinks.TeeSink([first, second])
+        tee.begin(None, None, None)
+        tee.abort()
+        self.assertTrue(first.aborted)
+        self.assertTrue(second.aborted)
+
+
+class DirectoryObjectStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.store = sinks.DirectoryObjectStore(self.directory)
+
+    def test_object_is_visible_after_complete(self):
+        upload = self.store.upload('a/b/object')
+        upload.write(b'data')
+        self.assertFalse(os.path.exists(self.store.path('a/b/object')))
+        upload.complete()
+        with self.store.open('a/b/object') as f:
+            self.assertEqual(f.read(), b'data')
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'a', 'b')),
+                         ['object'])
+
+    def test_abort(self):
+        upload = self.store.upload('object')
+        upload.write(b'data')
+        upload.abort()
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class SinkAE(ae.AE):
+    def __init__(self, store, *args, **kwargs):
+        super(SinkAE, self).__init__(*args, **kwargs)
+        self.store = store
+        self.received = []
+
+    def get_sink(self, context, command_set, header):
+        key = lambda command_set, header: '{}/{}.dcm'.format(
+            header.PatientID, command_set.AffectedSOPInstanceUID)
+        return sinks.TeeSink([sinks.FileSink(self),
+                              sinks.ObjectStoreSink(self.store, key)])
+
+    def on_receive_store(self, context, ds):
+        self.received.append(pydicom.dcmread(ds))
+        return statuses.SUCCESS
+
+
+class FailingSink(StatusSink):
+    def end(self):
+        raise IOError('upload failed')
+
+
+class FailingSinkAE(ae.AE):
+    def __init__(self, *args, **kwargs):
+        super(FailingSinkAE, self).__init__(*args, **kwargs)
+        self.sinks = []
+
+    def get_sink(self, context, command_set, header):
+        sink = FailingSink(statuses.SUCCESS)
+        self.sinks.append(sink)
+        return sink
+
+
+class SinkIntegrationTestCase(unittest.TestCase):
+    def test_dataset_is_streamed_to_sinks(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        store = sinks.DirectoryObjectStore(directory)
+
+        rq = dataset.Dataset()
+        rq.PatientID = 'TestID'
+        rq.SOPInstanceUID = uid.generate_uid()
+        rq.SOPClassUID = sc.CT_IMAGE_STORAGE
+        rq.BitsAllocated = 8
+        rq.PixelData = b'\x01' * 300000
+
+        ae1 = ae.ClientAE('AET1').add_scu(sc.storage_scu,
+                                          [sc.CT_IMAGE_STORAGE])
+        ae2 = SinkAE(store, 'AET2', 11120).add_scp(sc.storage_scp)
+        with ae2:
+            with ae1.request_association(REMOTE_AE) as assoc:
+                service = assoc.get_scu(sc.CT_IMAGE_STORAGE)
+                self.assertEqual(service(rq, 1), statuses.SUCCESS)
+
+        self.assertEqual(len(ae2.received), 1)
+        self.assertEqual(ae2.received[0].PixelData, rq.PixelData)
+        with store.open('TestID/{}.dcm'.format(rq.SOPInstanceUID)) as f:
+            stored = pydicom.dcmread(f)
+        self.assertEqual(stored.SOPInstanceUID, rq.SOPInstanceUID)
+        self.assertEqual(stored.PixelData, rq.PixelData)
+        self.assertEqual(stored.file_meta.MediaStorageSOPInstanceUID,
+                         rq.SOPInstanceUID)
+
+    def test_sink_failure_is_reported(self):
+        rq = dataset.Dataset()
+        rq.PatientID = 'TestID'
+        rq.SOPInstanceUID = uid.generate_uid()
+        rq.SOPClassUID = sc.CT_IMAGE_STORAGE
+
+        ae1 = ae.ClientAE('AET1').add_scu(sc.storage_scu,
+                                          [sc.CT_IMAGE_STORAGE])
+        ae2 = FailingSinkAE('AET2', 11120).add_scp(sc.storage_scp)
+        with ae2:
+            with ae1.request_association(REMOTE_AE) as assoc:
+                service = assoc.get_scu(sc.CT_IMAGE_STORAGE)
+                # association stays usable after failure
+                for msg_id in (1, 2):
+                    self.assertEqual(service(rq, msg_id),
+                                     statuses.C_STORE_OUT_OF_RESOURCES)
+
+        self.assertEqual(len(ae2.sinks), 2)
+        self.assertTrue(all(sink.aborted for sink in ae2.sinks))
+
+
+if __name__ == '__main__':
+    unittest.main()
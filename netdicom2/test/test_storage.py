@@ -0,0 +1,275 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import pydicom
+from pydicom import dataset
+from pydicom import uid
+
+import netdicom2
+import netdicom2.applicationentity as ae
+import netdicom2.sopclass as sc
+import netdicom2.storage as storage
+
+from netdicom2 import exceptions
+from netdicom2 import statuses
+
+
+REMOTE_AE = dict(address='127.0.0.1', port=11121, aet='AET2')
+
+
+def command_set(instance_uid):
+    ds = dataset.Dataset()
+    ds.AffectedSOPInstanceUID = instance_uid
+    return ds
+
+
+def header(patient_id='Test/ID', study='1.2.3', series=None):
+    ds = dataset.Dataset()
+    ds.PatientID = patient_id
+    ds.StudyInstanceUID = study
+    if series is not None:
+        ds.SeriesInstanceUID = series
+    return ds
+
+
+class LayoutTestCase(unittest.TestCase):
+    def test_flat(self):
+        self.assertEqual(storage.flat_layout(command_set('1.2'), header()),
+                         ['1.2.dcm'])
+
+    def test_hierarchical(self):
+        self.assertEqual(
+            storage.hierarchical_layout(command_set('1.2'), header()),
+            ['Test_ID', '1.2.3', storage.UNKNOWN, '1.2.dcm'])
+
+    def test_unsafe_values(self):
+        self.assertEqual(storage.path_component('..'), storage.UNKNOWN)
+        self.assertEqual(storage.path_component(' '), storage.UNKNOWN)
+        self.assertEqual(storage.path_component('a\\b:c'), 'a_b_c')
+
+    def test_hashed(self):
+        layout = storage.HashedLayout(levels=3, width=1)
+        path = layout(command_set('1.2'), header())
+        self.assertEqual(len(path), 4)
+        self.assertTrue(all(len(p) == 1 for p in path[:3]))
+        self.assertEqual(path, layout(command_set('1.2'), None))
+        self.assertNotEqual(path, layout(command_set('1.3'), None))
+
+
+class FileNamingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_create_file(self):
+        names = []
+        for _ in range(3):
+            with storage.create_file(self.directory, '1.2.dcm') as f:
+                names.append(os.path.basename(f.name))
+        self.assertEqual(names, ['1.2.dcm', '1.2_1.dcm', '1.2_2.dcm'])
+
+    def test_link_file(self):
+        paths = []
+        for _ in range(2):
+            fd, temp_path = tempfile.mkstemp(dir=self.directory)
+            os.close(fd)
+            paths.append(storage.link_file(
+                temp_path, os.path.join(self.directory, '1.2.dcm')))
+        self.assertEqual([os.path.basename(p) for p in paths],
+                         ['1.2.dcm', '1.2_1.dcm'])
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['1.2.dcm', '1.2_1.dcm'])
+
+
+class StoringAE(netdicom2.StorageAE):
+    failures = 0
+
+    def __init__(self, *args, **kwargs):
+        super(StoringAE, self).__init__(*args, **kwargs)
+        self.stored = []
+
+    def on_receive_store(self, context, ds):
+        if self.failures:
+            self.failures -= 1
+            raise exceptions.EventHandlingError()
+        self.stored.append(ds.name)
+        return statuses.SUCCESS
+
+
+class StorageAETestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.rq = dataset.Dataset()
+        self.rq.PatientID = 'TestID'
+        self.rq.StudyInstanceUID = '1.2.3'
+        self.rq.SeriesInstanceUID = '1.2.3.4'
+        self.rq.SOPInstanceUID = uid.generate_uid()
+        self.rq.SOPClassUID = sc.CT_IMAGE_STORAGE
+        self.rq.BitsAllocated = 8
+        self.rq.PixelData = b'\x01' * 100000
+
+    def store(self, layout=storage.flat_layout, count=1,
+              duplicates=storage.DUPLICATE_KEEP, status=statuses.SUCCESS,
+              write_behind=None):
+        ae1 = ae.ClientAE('AET1').add_scu(sc.storage_scu,
+                                          [sc.CT_IMAGE_STORAGE])
+        ae2 = StoringAE(self.directory, 'AET2', 11121, layout=layout,
+                        duplicates=duplicates,
+                        write_behind=write_behind).add_scp(sc.storage_scp)
+        with ae2:
+            with ae1.request_association(REMOTE_AE) as assoc:
+                service = assoc.get_scu(sc.CT_IMAGE_STORAGE)
+                self.assertEqual(service(self.rq, 1), statuses.SUCCESS)
+                for i in range(1, count):
+                    self.assertEqual(service(self.rq, i + 1), status)
+        return ae2.stored
+
+    def test_hierarchical_layout(self):
+        stored = self.store(storage.hierarchical_layout)
+        expected = os.path.join(self.directory, 'TestID', '1.2.3', '1.2.3.4',
+                                self.rq.SOPInstanceUID + '.dcm')
+        self.assertEqual(stored, [expected])
+        ds = pydicom.dcmread(expected)
+        self.assertEqual(ds.PixelData, self.rq.PixelData)
+        self.assertEqual(os.listdir(os.path.dirname(expected)),
+                         [os.path.basename(expected)])
+
+    def test_duplicates_are_kept(self):
+        stored = self.store(storage.HashedLayout(), count=2)
+        self.assertEqual(len(set(stored)), 2)
+        self.assertTrue(stored[1].endswith('_1.dcm'))
+        self.assertEqual(sorted(os.listdir(os.path.dirname(stored[0]))),
+                         sorted(os.path.basename(p) for p in stored))
+
+    def test_duplicates_are_discarded(self):
+        stored = self.store(count=2, duplicates=storage.DUPLICATE_DISCARD)
+        self.assertEqual(len(stored), 1)
+        # index survives AE restart
+        stored = self.store(duplicates=storage.DUPLICATE_DISCARD)
+        self.assertEqual(stored, [])
+        self.assertEqual(
+            [f for f in os.listdir(self.directory) if f.endswith('.dcm')],
+            [self.rq.SOPInstanceUID + '.dcm'])
+
+    def test_failed_instance_is_not_recorded(self):
+        ae1 = ae.ClientAE('AET1').add_scu(sc.storage_scu,
+                                          [sc.CT_IMAGE_STORAGE])
+        ae2 = StoringAE(self.directory, 'AET2', 11121,
+                        duplicates=storage.DUPLICATE_DISCARD)\
+            .add_scp(sc.storage_scp)
+        ae2.failures = 1
+        with ae2:
+            with ae1.request_association(REMOTE_AE) as assoc:
+                service = assoc.get_scu(sc.CT_IMAGE_STORAGE)
+                self.assertEqual(service(self.rq, 1),
+                                 statuses.C_STORE_CANNON_UNDERSTAND)
+                self.assertNotIn(self.rq.SOPInstanceUID, ae2.index)
+                self.assertEqual(
+                    [f for f in os.listdir(self.directory)
+                     if f.endswith('.dcm')], [])
+                # retried instance is stored
+                self.assertEqual(service(self.rq, 2), statuses.SUCCESS)
+        self.assertEqual(len(ae2.stored), 1)
+        self.assertEqual(pydicom.dcmread(ae2.stored[0]).PixelData,
+                         self.rq.PixelData)
+
+    def test_duplicate_warning(self):
+        stored = self.store(count=2, duplicates=storage.DUPLICATE_WARN,
+                            status=netdicom2.StorageAE.duplicate_status)
+        self.assertEqual(len(stored), 1)
+
+    def test_duplicates_are_overwritten(self):
+        stored = self.store(storage.hierarchical_layout)
+        self.rq.PatientID = 'Changed'
+        stored += self.store(storage.hierarchical_layout,
+                             duplicates=storage.DUPLICATE_OVERWRITE)
+        self.assertEqual(stored[0], stored[1])
+        self.assertEqual(pydicom.dcmread(stored[0]).PatientID, 'Changed')
+
+    def test_write_behind(self):
+        write_behind = storage.WriteBehind(latency=0)
+        stored = self.store(storage.hierarchical_layout, count=3,
+                            write_behind=write_behind)
+        self.assertEqual(len(stored), 3)
+        for path in stored:
+            ds = pydicom.dcmread(path)
+            self.assertEqual(ds.PixelData, self.rq.PixelData)
+        stats = write_behind.stats()
+        self.assertEqual(stats['instances'], 3)
+        self.assertGreater(stats['bytes_written'], 300000)
+        self.assertEqual(
+            [f for f in os.listdir(os.path.dirname(stored[0]))
+             if f.endswith('.part')], [])
+
+
+class WriteBehindTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.write_behind = storage.WriteBehind(latency=0.2)
+        self.addCleanup(self.write_behind.close)
+
+    def commit(self, name, linked):
+        f = open(os.path.join(self.directory, name), 'wb')
+        self.write_behind.write(f, b'data')
+        self.write_behind.commit(f, lambda: linked.append(name) or
+                                 self.directory)
+
+    def test_group_commit(self):
+        linked = []
+        threads = [threading.Thread(target=self.commit, args=(str(i), linked))
+                   for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(sorted(linked), [str(i) for i in range(5)])
+        stats = self.write_behind.stats()
+        self.assertEqual(stats['instances'], 5)
+        self.assertEqual(stats['bytes_written'], 20)
+        # one batch: all files and their directory
+        self.assertEqual(stats['batches'], 1)
+        self.assertEqual(stats['fsyncs'], 6)
+        for i in range(5):
+            with open(os.path.join(self.directory, str(i)), 'rb') as f:
+                self.assertEqual(f.read(), b'data')
+
+    def test_write_error(self):
+        path = os.path.join(self.directory, 'file')
+        open(path, 'wb').close()
+        f = open(path, 'rb')
+        self.addCleanup(f.close)
+        self.write_behind.write(f, b'data')
+        with self.assertRaises(IOError):
+            self.write_behind.drain(f)
+
+
+class InstanceIndexTestCase(unittest.TestCase):
+    def test_persistence(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'index.sqlite')
+        index = storage.InstanceIndex(path)
+        index.add('1.2.3', '1.2', '/a/b.dcm')
+        self.assertIn('1.2.3', index)
+        self.assertNotIn('1.2.4', index)
+        index.close()
+
+        index = storage.InstanceIndex(path)
+        self.assertEqual(index.get('1.2.3'), '/a/b.dcm')
+        self.assertEqual(len(index), 1)
+        index.remove('1.2.3')
+        self.assertEqual(len(index), 0)
+        index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
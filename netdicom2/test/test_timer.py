@@ -0,0 +1,109 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+import threading
+import time
+import unittest
+
+import netdicom2.applicationentity as ae
+import netdicom2.sopclass as sc
+import netdicom2.timer as timer
+
+from netdicom2 import exceptions
+
+
+class TimerWheelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.wheel = timer.TimerWheel(tick=0.001, slots=8, levels=3)
+
+    def schedule(self, delay, fired):
+        event = threading.Event()
+
+        def callback():
+            fired.append((delay, time.time()))
+            event.set()
+        return self.wheel.schedule(delay, callback), event
+
+    def test_timers_expire_in_order(self):
+        fired = []
+        start = time.time()
+        delays = [0.3, 0.005, 0.05, 0.02, 0]
+        events = [self.schedule(d, fired)[1] for d in delays]
+        for event in events:
+            self.assertTrue(event.wait(5))
+        self.assertEqual([d for d, _ in fired], sorted(delays))
+        for delay, fired_at in fired:
+            self.assertGreaterEqual(fired_at - start, delay - 0.001)
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_timer_beyond_last_level(self):
+        # 8 ** 3 ticks is 0.512 seconds
+        fired = []
+        _, event = self.schedule(0.6, fired)
+        start = time.time()
+        self.assertTrue(event.wait(5))
+        self.assertGreaterEqual(time.time() - start, 0.55)
+
+    def test_cancel(self):
+        fired = []
+        handle, event = self.schedule(0.05, fired)
+        self.assertTrue(handle.cancel())
+        self.assertFalse(handle.cancel())
+        self.assertFalse(event.wait(0.1))
+        self.assertEqual(fired, [])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_artim_timer(self):
+        expired = threading.Event()
+        artim = timer.Timer(0.01, self.wheel, expired.set)
+        artim.start()
+        self.assertTrue(expired.wait(5))
+        self.assertFalse(artim.check())
+        artim.stop()
+        self.assertTrue(artim.check())
+
+    def test_stale_callback_after_restart(self):
+        expired = threading.Event()
+        artim = timer.Timer(10, self.wheel, expired.set)
+        artim.start()
+        stale = artim._handle.callback
+        artim.restart()
+        # callback of the first start was already running when timer
+        # was restarted
+        stale()
+        self.assertTrue(artim.check())
+        self.assertFalse(expired.is_set())
+        self.assertIsNotNone(artim._handle)
+        artim.stop()
+
+
+class AssociationTimeoutsTestCase(unittest.TestCase):
+    def test_idle_association_is_released(self):
+        server = ae.AE('AET2', 11118).add_scp(sc.verification_scp)
+        server.idle_timeout = 0.1
+        client = ae.ClientAE('AET1').add_scu(sc.verification_scu)
+        remote_ae = dict(address='127.0.0.1', port=11118, aet='AET2')
+        with server:
+            with self.assertRaises(exceptions.AssociationReleasedError):
+                with client.request_association(remote_ae) as assoc:
+                    assoc.get_dul_message(5)
+
+    def test_dimse_timeout(self):
+        server = ae.AE('AET2', 11118).add_scp(sc.verification_scp)
+        client = ae.ClientAE('AET1').add_scu(sc.verification_scu)
+        client.dimse_timeout = 0.1
+        remote_ae = dict(address='127.0.0.1', port=11118, aet='AET2')
+        with server:
+            with client.request_association(remote_ae) as assoc:
+                start = time.time()
+                with self.assertRaises(exceptions.TimeoutError):
+                    assoc.get_dul_message()
+                self.assertLess(time.time() - start, 1)
+                # association is still usable
+                service = assoc.get_scu(sc.VERIFICATION_SOP_CLASS)
+                self.assertTrue(service(1).is_success)
+
+
+if __name__ == '__main__':
+    unittest.main()
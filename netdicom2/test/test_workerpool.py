@@ -0,0 +1,100 @@
+# Copyright (c) 2014 Pavel 'Blane' Tuchin
+# This file is part of pynetdicom2, released under a modified MIT license.
+#    See the file license.txt included with this distribution.
+
+import socket
+import time
+import unittest
+
+import netdicom2.applicationentity as ae
+import netdicom2.sopclass as sc
+
+from netdicom2 import exceptions
+
+
+REMOTE_AE = dict(address='127.0.0.1', port=11117, aet='AET2')
+
+
+class WorkerPoolAETestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ae.WorkerPoolAE('AET2', 11117, workers=1,
+                                      max_associations=2)\
+            .add_scp(sc.verification_scp)
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.client = ae.ClientAE('AET1').add_scu(sc.verification_scu)
+
+    def echo(self):
+        with self.client.request_association(REMOTE_AE) as assoc:
+            service = assoc.get_scu(sc.VERIFICATION_SOP_CLASS)
+            return service(1).is_success
+
+    def wait_for(self, condition):
+        deadline = time.time() + 5
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_associations_are_handled_by_workers(self):
+        for _ in range(3):
+            self.assertTrue(self.echo())
+        self.assertEqual(self.server.accepted_associations, 3)
+        self.assertEqual(self.server.rejected_associations, 0)
+        self.wait_for(lambda: self.server.active_associations == 0)
+        self.assertEqual(self.server.active_associations, 0)
+
+    def test_limit_exceeded(self):
+        with self.client.request_association(REMOTE_AE):
+            self.assertEqual(self.server.busy_workers, 1)
+
+            # second connection is admitted, but waits for a free worker
+            waiting = socket.create_connection((REMOTE_AE['address'],
+                                                REMOTE_AE['port']))
+            self.addCleanup(waiting.close)
+            self.wait_for(lambda: self.server.queue_depth == 1)
+            self.assertEqual(self.server.queue_depth, 1)
+            self.assertEqual(self.server.active_associations, 2)
+
+            start = time.time()
+            with self.assertRaises(exceptions.AssociationRejectedError) as cm:
+                self.echo()
+            self.assertLess(time.time() - start, self.client.timeout)
+            self.assertEqual(cm.exception.result, 2)
+            self.assertEqual(cm.exception.source, 3)
+            self.assertEqual(cm.exception.diagnostic, 2)
+            self.assertEqual(self.server.rejected_associations, 1)
+
+    def test_silent_connection_does_not_delay_reject(self):
+        with self.client.request_association(REMOTE_AE):
+            waiting = socket.create_connection((REMOTE_AE['address'],
+                                                REMOTE_AE['port']))
+            self.addCleanup(waiting.close)
+            self.wait_for(lambda: self.server.queue_depth == 1)
+
+            # connection over the limit that never sends A-ASSOCIATE-RQ
+            silent = socket.create_connection((REMOTE_AE['address'],
+                                               REMOTE_AE['port']))
+            self.addCleanup(silent.close)
+            self.wait_for(lambda: self.server.rejected_associations == 1)
+
+            start = time.time()
+            with self.assertRaises(exceptions.AssociationRejectedError):
+                self.echo()
+            self.assertLess(time.time() - start, self.server.reject_timeout)
+            self.assertEqual(self.server.rejected_associations, 2)
+
+    def test_bad_socket_does_not_stop_rejects(self):
+        bad = socket.socket()
+        bad.close()
+        self.server.handle_error = lambda request, client_address: None
+        self.server._rejects.put(bad)
+        with self.client.request_association(REMOTE_AE):
+            waiting = socket.create_connection((REMOTE_AE['address'],
+                                                REMOTE_AE['port']))
+            self.addCleanup(waiting.close)
+            self.wait_for(lambda: self.server.queue_depth == 1)
+            with self.assertRaises(exceptions.AssociationRejectedError):
+                self.echo()
+
+
+if __name__ == '__main__':
+    unittest.main()
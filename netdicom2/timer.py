@@ -4,29 +4,275 @@
 #    See the file license.txt included with this distribution, also
 #    available at http://pynetdicom.googlecode.com
 
+"""
+Timers used by DUL service providers and associations.
 
+:class:`~netdicom2.timer.TimerWheel` is a hierarchical timing wheel that keeps
+deadlines of all associations of an application entity. Arming and cancelling
+timer costs O(1) regardless of number of pending timers, and wheel thread
+sleeps until the next occupied slot, so idle associations are never polled.
+
+:class:`~netdicom2.timer.Timer` is an ARTIM timer (PS 3.8 9.1.5) of the DUL
+service provider. It either tracks its deadline by itself (and has to be
+checked by the service) or is scheduled on the wheel and notifies the service
+when it expires.
+
+All timers use monotonic clock, so they are not affected by system clock
+changes.
+"""
+
+import functools
+import threading
 import time
 
 
+monotonic = getattr(time, 'monotonic', time.time)  # Python 2.7 fallback
+
+
 class Timer(object):
+    """ARTIM timer.
 
-    def __init__(self, max_seconds):
+    :param max_seconds: timer timeout in seconds
+    :param wheel: :class:`~netdicom2.timer.TimerWheel` that keeps timer
+                  deadline. If wheel is not provided timer should be checked
+                  with :meth:`~netdicom2.timer.Timer.check`.
+    :param callback: callable that is called (from the wheel thread) when
+                     timer scheduled on the wheel expires
+    """
+
+    def __init__(self, max_seconds, wheel=None, callback=None):
         self._max_seconds = max_seconds
         self._start_time = None
+        self.wheel = wheel
+        self._callback = callback
+        self._handle = None
+        self._run = None
+        self._expired = False
+        self._lock = threading.Lock()
 
     def start(self):
-        self._start_time = time.time()
+        if self.wheel is None:
+            self._start_time = monotonic()
+            return
+        with self._lock:
+            self._cancel()
+            self._expired = False
+            # callback knows which start it belongs to, so callback of the
+            # stopped timer that is already running does not expire the
+            # restarted one
+            self._run = object()
+            self._handle = self.wheel.schedule(
+                self._max_seconds, functools.partial(self._expire, self._run))
 
     def stop(self):
-        self._start_time = None
+        if self.wheel is None:
+            self._start_time = None
+            return
+        with self._lock:
+            self._cancel()
+            self._expired = False
 
     def restart(self):
         self.stop()
         self.start()
 
     def check(self):
+        if self.wheel is not None:
+            return not self._expired
         if self._start_time and \
-                (time.time() - self._start_time > self._max_seconds):
+                (monotonic() - self._start_time > self._max_seconds):
             return False
         else:
             return True
+
+    def remaining(self):
+        """Returns number of seconds left until timer expires.
+
+        :return: ``None`` if timer is not running or is scheduled on the
+                 wheel, otherwise non-negative number of seconds.
+        """
+        if self._start_time is None:
+            return None
+        elapsed = monotonic() - self._start_time
+        return max(0.0, self._max_seconds - elapsed)
+
+    def _cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+            self._run = None
+
+    def _expire(self, run):
+        with self._lock:
+            if run is not self._run:
+                return  # timer was stopped while callback was pending
+            self._handle = None
+            self._run = None
+            self._expired = True
+        if self._callback is not None:
+            self._callback()
+
+
+class TimerHandle(object):
+    """Timer scheduled on the :class:`~netdicom2.timer.TimerWheel`.
+
+    :ivar deadline: wheel tick when timer expires
+    :ivar cancelled: ``True`` if timer was cancelled
+    """
+
+    __slots__ = ('wheel', 'deadline', 'callback', 'cancelled', '_slot')
+
+    def __init__(self, wheel, deadline, callback):
+        self.wheel = wheel
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+        self._slot = None
+
+    def cancel(self):
+        """Cancels timer.
+
+        :return: ``True`` if timer was cancelled before it expired
+        """
+        return self.wheel.cancel(self)
+
+
+class TimerWheel(object):
+    """Hierarchical timing wheel.
+
+    Time is divided into ticks of ``tick`` seconds. Level 0 of the wheel has
+    a slot per tick, every next level has a slot per full rotation of the
+    previous level. Timer is put into the slot of the lowest level that covers
+    its deadline and is moved to the lower level when that slot comes up.
+
+    Expired timers are called from the wheel thread, so callbacks should be
+    short and should not block. Thread is started when the first timer is
+    scheduled and exits when the wheel stays empty for ``linger`` seconds.
+
+    :param tick: tick duration in seconds
+    :param slots: number of slots on every level
+    :param levels: number of levels. Timers that do not fit into the wheel
+                   are kept on the last level and are moved around until they
+                   expire.
+    """
+
+    linger = 5
+    """Number of seconds idle wheel thread waits for new timers."""
+
+    def __init__(self, tick=0.01, slots=256, levels=4):
+        self.tick = tick
+        self.slots = slots
+        self._wheels = [[set() for _ in range(slots)] for _ in range(levels)]
+        self._spans = [slots ** level for level in range(levels + 1)]
+        self._condition = threading.Condition()
+        self._origin = monotonic()
+        self._now = 0  # last processed tick
+        self._count = 0
+        self._thread = None
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, delay, callback):
+        """Schedules ``callback`` to be called in ``delay`` seconds.
+
+        :param delay: number of seconds
+        :param callback: callable without arguments
+        :return: :class:`~netdicom2.timer.TimerHandle` instance
+        """
+        with self._condition:
+            deadline = int((monotonic() - self._origin + delay) / self.tick)
+            handle = TimerHandle(self, max(deadline, self._now + 1), callback)
+            self._insert(handle)
+            self._count += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            else:
+                self._condition.notify()
+            return handle
+
+    def cancel(self, handle):
+        """Cancels scheduled timer.
+
+        :param handle: :class:`~netdicom2.timer.TimerHandle` instance
+        :return: ``True`` if timer was cancelled before it expired
+        """
+        with self._condition:
+            if handle._slot is None:
+                return False  # already expired or cancelled
+            handle._slot.discard(handle)
+            handle._slot = None
+            handle.cancelled = True
+            self._count -= 1
+            return True
+
+    def _insert(self, handle):
+        delta = handle.deadline - self._now
+        level = 0
+        while level < len(self._wheels) - 1 and \
+                delta >= self._spans[level + 1]:
+            level += 1
+        span = self._spans[level]
+        # timers beyond the last level are parked at its farthest slot
+        tick = min(handle.deadline, self._now + self._spans[level + 1] - span)
+        handle._slot = self._wheels[level][(tick // span) % self.slots]
+        handle._slot.add(handle)
+
+    def _advance(self, target):
+        expired = []
+        while self._now < target:
+            self._now += 1
+            for level in range(len(self._wheels) - 1, 0, -1):
+                span = self._spans[level]
+                if self._now % span == 0:
+                    slot = self._wheels[level][(self._now // span) %
+                                               self.slots]
+                    cascaded = list(slot)
+                    slot.clear()
+                    for handle in cascaded:
+                        self._insert(handle)
+            slot = self._wheels[0][self._now % self.slots]
+            for handle in slot:
+                handle._slot = None
+            expired.extend(slot)
+            self._count -= len(slot)
+            slot.clear()
+        return expired
+
+    def _next_tick(self):
+        # next occupied slot of the current level 0 rotation, or the start of
+        # the next rotation, when timers from upper levels are cascaded
+        rotation_end = self._now - self._now % self.slots + self.slots
+        for tick in range(self._now + 1, rotation_end):
+            if self._wheels[0][tick % self.slots]:
+                return tick
+        return rotation_end
+
+    def _run(self):
+        with self._condition:
+            while True:
+                now = int((monotonic() - self._origin) / self.tick)
+                expired = self._advance(now)
+                if expired:
+                    self._condition.release()
+                    try:
+                        for handle in expired:
+                            try:
+                                handle.callback()
+                            except Exception:
+                                pass  # callback errors should not stop wheel
+                    finally:
+                        self._condition.acquire()
+                    continue
+                if not self._count:
+                    self._condition.wait(self.linger)
+                    if not self._count:
+                        self._thread = None
+                        return
+                    continue
+                timeout = self._next_tick() * self.tick + self._origin - \
+                    monotonic()
+                if timeout > 0:
+                    self._condition.wait(timeout)
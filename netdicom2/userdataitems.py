@@ -460,3 +460,27 @@ class GenericUserDataSubItem(object):
         item_type, reserved, item_length = cls.header.unpack(stream.read(4))
         user_data = stream.read(int(item_length))
         return cls(item_type=item_type, user_data=user_data, reserved=reserved)
+
+
+class EncodedSubItems(object):
+    """Sequence of user information sub-items that is already encoded.
+
+    Used by association requester to reuse sub-items that depend only on
+    application entity configuration (see
+    :func:`~netdicom2.asceprovider.build_request_template`).
+
+    :param data: encoded sub-items
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def __repr__(self):
+        return 'EncodedSubItems(length={0})'.format(len(self.data))
+
+    @property
+    def total_length(self):
+        return len(self.data)
+
+    def encode(self):
+        return self.data